@@ -4,33 +4,33 @@
 import sys
 import json
 
-def main(kindCfg, mininetCfg, sdnController):
+def main(kindCfg, mininetCfg, sdnController, warmPool=False, record=None, profile=False, backends=None, handoverLookahead=None, migrationDrain=None):
 
     if '1_POC_Replication' in kindCfg:
         print("Running POC Replication scenario...")
         from scenarios.POCReplication import POCReplication
-        scenario = POCReplication(kindCfg, mininetCfg, sdnController)
+        scenario = POCReplication(kindCfg, mininetCfg, sdnController, warm_pool=warmPool)
         scenario.run()
 
     elif '2_POC_Migration' in kindCfg:
         print("Running POC Migration scenario...")
         from scenarios.POCMigration import POCMigration
-        scenario = POCMigration(kindCfg, mininetCfg, sdnController)
+        scenario = POCMigration(kindCfg, mininetCfg, sdnController, warm_pool=warmPool, migration_drain=migrationDrain)
         scenario.run()
     elif '3_StreamingService' in kindCfg:
         print("Running Streaming Service scenario...")
         from scenarios.StreamingService import StreamingService
-        scenario = StreamingService(kindCfg, mininetCfg, sdnController)
+        scenario = StreamingService(kindCfg, mininetCfg, sdnController, warm_pool=warmPool, migration_drain=migrationDrain)
         scenario.run()
     elif '4_LoadBalancing' in kindCfg:
         print("Running Load Balancing scenario...")
         from scenarios.LoadBalancing import LoadBalancing
-        scenario = LoadBalancing(kindCfg, mininetCfg, sdnController)
+        scenario = LoadBalancing(kindCfg, mininetCfg, sdnController, warm_pool=warmPool, record=record, profile=profile, backends=backends)
         scenario.run()
     elif '5_MobilityStrategy' in kindCfg:
         print("Running Mobility Strategy scenario...")
         from scenarios.MobilityStrategy import MobilityStrategy
-        scenario = MobilityStrategy(kindCfg, mininetCfg, sdnController)
+        scenario = MobilityStrategy(kindCfg, mininetCfg, sdnController, warm_pool=warmPool, record=record, profile=profile, backends=backends, handover_lookahead=handoverLookahead, migration_drain=migrationDrain)
         scenario.run()
     else:
         print(f"Invalid config file! Scenario not found.")
@@ -70,12 +70,30 @@ def configReader(configPath):
             print(f"File '{config_json[key]}' not found!")
             sys.exit(1)
 
-    return config_json["kind-config"], config_json["mininet-config"], config_json["sdn-controller"]
+    # Optional: reuse a warm kind cluster between runs (reset to baseline instead of recreated)
+    warmPool = bool(config_json.get('warm-pool', False))
+
+    # Optional: path of a trace of the controller inputs, for replays (scenarios 4 and 5)
+    record = config_json.get('record', None)
+
+    # Optional: per-tick phase timings of the control loop, written to profile.json (scenarios 4 and 5)
+    profile = bool(config_json.get('profile', False))
+
+    # Optional: fake SDN / Kubernetes backends with latency, jitter and failure injection (scenarios 4 and 5), see scenarios.Backends
+    backends = config_json.get('backends', None)
+
+    # Optional: look-ahead window in seconds of the event-driven handover scheduler (scenario 5), see scenarios.HandoverScheduler
+    handoverLookahead = config_json.get('handover-lookahead', None)
+
+    # Optional: seconds the old deployment keeps serving after a migration moved the traffic off it (scenarios 2, 3 and 5), see scenarios.MigrationExecutor
+    migrationDrain = config_json.get('migration-drain', None)
+
+    return config_json["kind-config"], config_json["mininet-config"], config_json["sdn-controller"], warmPool, record, profile, backends, handoverLookahead, migrationDrain
 
 if __name__ == '__main__':
     if len(sys.argv) != 2:
         print("Usage: python3 app.py <config file path>")
         sys.exit(1)
     else:
-        kindCfg, mininetnCfg, sdnController = configReader(sys.argv[1])
-        main(kindCfg, mininetnCfg, sdnController)
+        kindCfg, mininetnCfg, sdnController, warmPool, record, profile, backends, handoverLookahead, migrationDrain = configReader(sys.argv[1])
+        main(kindCfg, mininetnCfg, sdnController, warmPool, record, profile, backends, handoverLookahead, migrationDrain)
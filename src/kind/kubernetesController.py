@@ -1,16 +1,242 @@
 # Author: Rúben Santos
 # Date  : 30/03/2024
 #
+import os
 import yaml
 import json
+import time
+import hashlib
+import tempfile
+import threading
 import subprocess
-from kubernetes import client, config
+from contextlib import contextmanager
+from kubernetes import client, config, watch
 from kubernetes.client.rest import ApiException
 
+class DeploymentCache:
+    #
+    # Informer-style cache of the deployments and pods of a namespace.
+    # Lists both once, then follows the API server through watch streams and keeps
+    # them indexed by (nodeName, appLabel), so existence/readiness checks are local lookups.
+    #
+    WATCH_TIMEOUT = 60
+
+    def __init__(self, appsV1, coreV1, namespace='default'):
+        self.appsV1 = appsV1
+        self.coreV1 = coreV1
+        self.namespace = namespace
+
+        self.cond = threading.Condition()
+        self.synced = False
+        self.running = False
+        self.threads = []
+
+        self.deployments = {} # {deploymentName: (nodeName, appName, ready)}
+        self.pods = {} # {podName: (nodeName, appName, ready, podIP)}
+        self.deploymentsByNodeApp = {} # {(nodeName, appName): set(deploymentName)}
+        self.readyPodsByNodeApp = {} # {(nodeName, appName): set(podName)}
+        self.readyListeners = [] # callback(nodeName, appName, podIP, t), called when a pod becomes Ready
+
+    @staticmethod
+    def __deploymentEntry(deployment):
+        spec = deployment.spec.template.spec
+        labels = deployment.spec.template.metadata.labels or {}
+        ready = (deployment.status is not None and (deployment.status.ready_replicas or 0) > 0)
+        return (spec.node_name, labels.get('app', None), ready)
+
+    @staticmethod
+    def __podEntry(pod):
+        labels = pod.metadata.labels or {}
+        ready = False
+        if pod.metadata.deletion_timestamp is None and pod.status is not None and pod.status.conditions:
+            for condition in pod.status.conditions:
+                if condition.type == 'Ready':
+                    ready = condition.status == 'True'
+        podIP = pod.status.pod_ip if pod.status is not None else None
+        return (pod.spec.node_name, labels.get('app', None), ready, podIP)
+
+    @staticmethod
+    def __index(index, key, name, add):
+        names = index.setdefault(key, set())
+        if add:
+            names.add(name)
+        else:
+            names.discard(name)
+            if len(names) == 0:
+                del index[key]
+
+    def __setDeployment(self, name, entry):
+        previous = self.deployments.pop(name, None)
+        if previous is not None:
+            self.__index(self.deploymentsByNodeApp, previous[0:2], name, False)
+        if entry is not None:
+            self.deployments[name] = entry
+            self.__index(self.deploymentsByNodeApp, entry[0:2], name, True)
+
+    def __setPod(self, name, entry):
+        previous = self.pods.pop(name, None)
+        if previous is not None and previous[2]:
+            self.__index(self.readyPodsByNodeApp, previous[0:2], name, False)
+        if entry is not None:
+            self.pods[name] = entry
+            if entry[2]:
+                self.__index(self.readyPodsByNodeApp, entry[0:2], name, True)
+
+    def assumeDeployment(self, deployment):
+        # Record a deployment we just created, before its watch event arrives
+        with self.cond:
+            if deployment.metadata.name not in self.deployments:
+                self.__setDeployment(deployment.metadata.name, self.__deploymentEntry(deployment))
+            self.cond.notify_all()
+
+    def forgetDeployment(self, deploymentName):
+        # Drop a deployment we just deleted, before its watch event arrives
+        with self.cond:
+            self.__setDeployment(deploymentName, None)
+            self.cond.notify_all()
+
+    def __listDeployments(self):
+        result = self.appsV1.list_namespaced_deployment(namespace=self.namespace)
+        with self.cond:
+            for name in list(self.deployments.keys()):
+                self.__setDeployment(name, None)
+            for deployment in result.items:
+                self.__setDeployment(deployment.metadata.name, self.__deploymentEntry(deployment))
+            self.cond.notify_all()
+        return result.metadata.resource_version
+
+    def __listPods(self):
+        result = self.coreV1.list_namespaced_pod(namespace=self.namespace)
+        with self.cond:
+            for name in list(self.pods.keys()):
+                self.__setPod(name, None)
+            for pod in result.items:
+                self.__setPod(pod.metadata.name, self.__podEntry(pod))
+            self.cond.notify_all()
+        return result.metadata.resource_version
+
+    def __onDeploymentEvent(self, eventType, deployment):
+        with self.cond:
+            entry = None if eventType == 'DELETED' else self.__deploymentEntry(deployment)
+            self.__setDeployment(deployment.metadata.name, entry)
+            self.cond.notify_all()
+
+    def __onPodEvent(self, eventType, pod):
+        with self.cond:
+            entry = None if eventType == 'DELETED' else self.__podEntry(pod)
+            previous = self.pods.get(pod.metadata.name, None)
+            self.__setPod(pod.metadata.name, entry)
+            self.cond.notify_all()
+        if entry is not None and entry[2] and (previous is None or not previous[2]):
+            # Outside the lock, listeners may query the cache
+            t = time.time()
+            for listener in list(self.readyListeners):
+                listener(entry[0], entry[1], entry[3], t)
+
+    def addReadyListener(self, listener):
+        self.readyListeners.append(listener)
+
+    def __watch(self, listFunction, relist, onEvent, resourceVersion):
+        while self.running:
+            try:
+                stream = watch.Watch()
+                for event in stream.stream(listFunction, namespace=self.namespace,
+                                           resource_version=resourceVersion, timeout_seconds=self.WATCH_TIMEOUT):
+                    if not self.running:
+                        stream.stop()
+                        break
+                    if event['type'] == 'ERROR':
+                        # Usually 410 Gone: our resource version is too old, list again
+                        resourceVersion = relist()
+                        break
+                    resourceVersion = event['object'].metadata.resource_version
+                    onEvent(event['type'], event['object'])
+            except ApiException as e:
+                if e.status == 410:
+                    resourceVersion = relist()
+                else:
+                    print(f"Error watching the cluster: {e}")
+                    time.sleep(1)
+            except Exception as e:
+                print(f"Error watching the cluster: {e}")
+                time.sleep(1)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        deploymentsVersion = self.__listDeployments()
+        podsVersion = self.__listPods()
+        with self.cond:
+            self.synced = True
+
+        self.threads = [
+            threading.Thread(target=self.__watch, daemon=True, name='deployment-watch',
+                             args=(self.appsV1.list_namespaced_deployment, self.__listDeployments, self.__onDeploymentEvent, deploymentsVersion)),
+            threading.Thread(target=self.__watch, daemon=True, name='pod-watch',
+                             args=(self.coreV1.list_namespaced_pod, self.__listPods, self.__onPodEvent, podsVersion)),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.running = False
+        with self.cond:
+            self.synced = False
+
+    def hasDeployment(self, deploymentName):
+        with self.cond:
+            return deploymentName in self.deployments
+
+    def isDeployedAt(self, nodeName, appName):
+        with self.cond:
+            return (nodeName, appName) in self.deploymentsByNodeApp
+
+    def isReadyAt(self, nodeName, appName):
+        with self.cond:
+            return (nodeName, appName) in self.readyPodsByNodeApp
+
+    def getDeployedApps(self):
+        # {nodeName: [appName]} of the deployments that exist in the cluster
+        with self.cond:
+            deployed = {}
+            for (nodeName, appName) in self.deploymentsByNodeApp.keys():
+                deployed.setdefault(nodeName, []).append(appName)
+            return deployed
+
+    def getPodIPs(self, nodeName, appName):
+        # IPs of the Ready pods of appName on nodeName
+        with self.cond:
+            return [self.pods[name][3] for name in self.readyPodsByNodeApp.get((nodeName, appName), ())]
+
+    def getReadyNodes(self, appName):
+        with self.cond:
+            return [nodeName for (nodeName, app) in self.readyPodsByNodeApp.keys() if app == appName]
+
+    def waitForReady(self, nodeName, appName, timeout=None):
+        # Block until a Ready pod of appName runs on nodeName. Returns False on timeout.
+        with self.cond:
+            return self.cond.wait_for(lambda: (nodeName, appName) in self.readyPodsByNodeApp, timeout)
+
+    def waitForDeployment(self, deploymentName, timeout=None):
+        # Block until the deployment itself reports a Ready replica (several deployments of an app
+        # can share a node, a Ready pod of the app does not tell which). Returns False on timeout.
+        with self.cond:
+            return self.cond.wait_for(lambda: deploymentName in self.deployments and self.deployments[deploymentName][2], timeout)
+
 class KubernetesController:
+
+    NAMESPACE = 'default'
+    CONNECTION_POOL_SIZE = 8
+
+    # Every object created by the scenarios carries this label, so a run can be undone with one bulk delete
+    MANAGED_LABEL = ('app.kubernetes.io/managed-by', 'vanet-scenario')
+    MANAGED_SELECTOR = f'{MANAGED_LABEL[0]}={MANAGED_LABEL[1]}'
+    WARM_POOL_DIR = os.path.join(tempfile.gettempdir(), 'kind-warm-pool')
     
-    def __init__(self, configPath, debug=False):
+    def __init__(self, configPath, debug=False, warmPool=False):
         self.configPath = configPath
+        self.warmPool = warmPool
         
         # Load configuration from file (YAML)
         with open(self.configPath, 'r') as file:
@@ -20,60 +246,224 @@ class KubernetesController:
         self.clusterName = 'kind' if 'name' not in self.config else self.config['name']
         self.numNodes = len(self.config['nodes'])
 
+        if self.warmPool:
+            # One long-lived cluster per kind config: a changed config (e.g. node count) gets its own cluster
+            self.configHash = hashlib.sha256(yaml.safe_dump(self.config, sort_keys=True).encode()).hexdigest()
+            self.clusterName = f'{self.clusterName}-{self.configHash[:8]}'
+            self.configPath = self.__writeWarmPoolConfig()
+
+        # kind names the kubeconfig context after the cluster; select it explicitly, several clusters may exist
+        self.kubeContext = f'kind-{self.clusterName}'
+
         # Save deployment objects. Use dictionary of { nodeName -> {deploymentName -> deploymentObject} }
         self.deployments = {}
 
+        # API clients, created on first use (the kubeconfig only exists once the cluster is up)
+        self.apiClient = None
+        self.appsV1 = None
+        self.coreV1 = None
+
+        # Watch-based view of the deployments and pods, see startCache()
+        self.cache = None
+
+        # Per operation timings: { operation -> [count, total_seconds, max_seconds] }
+        self.timings = {}
+
+        # The bootstrap pipeline calls the controller from several threads
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def timed(self, operation):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                timing = self.timings.setdefault(operation, [0, 0.0, 0.0])
+                timing[0] += 1
+                timing[1] += elapsed
+                timing[2] = max(timing[2], elapsed)
+
+    def getTimings(self):
+        # { operation -> {count, total_ms, mean_ms, max_ms} }
+        with self.lock:
+            timings = {operation: list(timing) for operation, timing in self.timings.items()}
+        return {operation: {'count': count,
+                            'total_ms': 1000 * total,
+                            'mean_ms': 1000 * total / count,
+                            'max_ms': 1000 * maximum}
+                for operation, (count, total, maximum) in timings.items()}
+
+    def __connect(self):
+        # Load the kubeconfig once and keep one API client (and its connection pool) for every call
+        with self.lock:
+            if self.apiClient is None:
+                configuration = client.Configuration()
+                config.load_kube_config(context=self.kubeContext, client_configuration=configuration)
+                configuration.connection_pool_maxsize = self.CONNECTION_POOL_SIZE
+                apiClient = client.ApiClient(configuration)
+                self.appsV1 = client.AppsV1Api(apiClient)
+                self.coreV1 = client.CoreV1Api(apiClient)
+                self.apiClient = apiClient
+
+    def startCache(self):
+        # List the deployments and pods once and follow them with watches from now on
+        with self.timed('startCache'):
+            self.__connect()
+            if self.cache is None:
+                self.cache = DeploymentCache(self.appsV1, self.coreV1, self.NAMESPACE)
+            self.cache.start()
+        return self.cache
+
+    def isCacheSynced(self):
+        return self.cache is not None and self.cache.synced
+
+    def __disconnect(self):
+        # The kubeconfig changes when the cluster is (re)created
+        if self.cache is not None:
+            self.cache.stop()
+            self.cache = None
+        if self.apiClient is not None:
+            self.apiClient.close()
+        self.apiClient = None
+        self.appsV1 = None
+        self.coreV1 = None
+
     def __runCommandReturnOutput(self, commands, debug=False):
         return subprocess.run(commands, stdout=subprocess.PIPE).stdout.decode('utf-8')
 
+    def __forgetDeployment(self, deploymentName):
+        for nodeDeployments in self.deployments.values():
+            nodeDeployments.pop(deploymentName, None)
+        if self.cache is not None:
+            self.cache.forgetDeployment(deploymentName)
+
     def deleteDeployment(self, deploymentName):
-        return self.__runCommandReturnOutput(['kubectl', 'delete', 'deployment', deploymentName])
+        with self.timed('deleteDeployment'):
+            try:
+                self.__connect()
+                self.appsV1.delete_namespaced_deployment(name=deploymentName, namespace=self.NAMESPACE)
+                self.__forgetDeployment(deploymentName)
+                print(f"Deployment {deploymentName} deleted!")
+                return 0
+            except ApiException as e:
+                if e.status == 404:
+                    self.__forgetDeployment(deploymentName)
+                    print(f"Deployment {deploymentName} does not exist.")
+                    return 1
+                print(f"Error deleting deployment {deploymentName}: {e}")
+                return 2
+            except Exception as e:
+                print(f"Error deleting deployment {deploymentName}: {e}")
+                return 3
 
     def getClusters(self):
         return self.__runCommandReturnOutput(['kind', 'get', 'clusters'])
 
     def getNodeInfo(self):
-        kubectl_output = self.__runCommandReturnOutput(['kubectl', 'get', 'nodes', '-o', 'json'])
-        nodes_info = json.loads(kubectl_output)['items']
-
-        node_info_list = {}
-        for node in nodes_info:
-            name = node['metadata']['name']
-            if 'control-plane' in name:
-                continue
-            ip = node['status']['addresses'][0]['address']
-            node_info_list[name] = ip
-
-        return node_info_list
+        with self.timed('getNodeInfo'):
+            self.__connect()
+            nodes_info = self.coreV1.list_node().items
+
+            node_info_list = {}
+            for node in nodes_info:
+                name = node.metadata.name
+                if 'control-plane' in name:
+                    continue
+                ip = node.status.addresses[0].address
+                node_info_list[name] = ip
+
+            return node_info_list
     
-    def clearPreviousDeployments(self):
+    def __writeWarmPoolConfig(self):
+        # Same config under the pool cluster name, without the fixed API server port (kind picks a free one)
+        warmConfig = dict(self.config, name=self.clusterName)
+        if 'networking' in warmConfig:
+            warmConfig['networking'] = {key: value for key, value in warmConfig['networking'].items() if key != 'apiServerPort'}
+        os.makedirs(self.WARM_POOL_DIR, exist_ok=True)
+        path = os.path.join(self.WARM_POOL_DIR, f'{self.clusterName}.yaml')
+        with open(path, 'w') as file:
+            yaml.safe_dump(warmConfig, file)
+        return path
+
+    def clearPreviousDeployments(self, labelSelector=None):
+        # Delete the deployments of the namespace (only the ones matching labelSelector, if given) in one request
         print("Clearing previous deployments...")
-        deployments_command_output = self.__runCommandReturnOutput(['kubectl', 'get', 'deployments', '-o', 'json'])
-        deployment_objects = json.loads(deployments_command_output)['items']
-        for deployment in deployment_objects:
-            deployment_name = deployment['metadata']['name']
-            print(f"Deleting deployment {deployment_name}...")
-            self.deleteDeployment(deployment_name)
+        with self.timed('clearPreviousDeployments'):
+            self.__connect()
+            self.appsV1.delete_collection_namespaced_deployment(namespace=self.NAMESPACE,
+                                                                label_selector=labelSelector,
+                                                                propagation_policy='Background')
+            self.deployments = {}
+
+    def resetToBaseline(self):
+        # Bring a warm cluster back to its state right after creation: no deployments of ours.
+        # Services are kept, they only select pods and are reused by the next run.
+        with self.timed('resetToBaseline'):
+            self.clearPreviousDeployments(self.MANAGED_SELECTOR)
 
     def startCluster(self, force_restart=False):
-        # Check if cluster exists with same name...
-        if self.clusterName + '\n' in self.getClusters():
-            print(f"Cluster with name {self.clusterName} was already created!")
-            if force_restart:
-                print(f"Force restarting cluster {self.clusterName}...")
-                self.deleteCluster()
-            else:
-                print(f"Use force_restart=True to restart the cluster.")
-                self.clearPreviousDeployments()
-                return 1
-
-        return self.__runCommandReturnOutput(['kind', 'create', 'cluster', '--config', str(self.configPath)])
+        with self.timed('startCluster'):
+            # Check if cluster exists with same name...
+            if self.clusterName + '\n' in self.getClusters():
+                print(f"Cluster with name {self.clusterName} was already created!")
+                if force_restart:
+                    print(f"Force restarting cluster {self.clusterName}...")
+                    self.deleteCluster()
+                elif self.warmPool:
+                    print(f"Reusing warm cluster {self.clusterName}...")
+                    self.resetToBaseline()
+                    return 1
+                else:
+                    print(f"Use force_restart=True to restart the cluster.")
+                    self.clearPreviousDeployments()
+                    return 1
+
+            self.__disconnect()
+            return self.__runCommandReturnOutput(['kind', 'create', 'cluster', '--config', str(self.configPath)])
     
     def deleteCluster(self):
+        self.__disconnect()
         return self.__runCommandReturnOutput(['kind', 'delete', 'cluster', '--name', self.clusterName])
 
-    def loadDockerImages(self, imageName):
-        return self.__runCommandReturnOutput(['kind', 'load', 'docker-image', imageName, '--name', self.clusterName])
+    def getKindNodes(self):
+        return self.__runCommandReturnOutput(['kind', 'get', 'nodes', '--name', self.clusterName]).split()
+
+    def getLocalImageId(self, imageName):
+        # Image id (digest of the image config) in the local docker daemon, None if unknown
+        result = subprocess.run(['docker', 'image', 'inspect', '--format', '{{.Id}}', imageName], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        if result.returncode != 0:
+            return None
+        return result.stdout.decode('utf-8').strip()
+
+    def getNodeImageId(self, nodeName, imageName):
+        # Image id of imageName in the containerd store of a kind node, None if not present
+        result = subprocess.run(['docker', 'exec', nodeName, 'crictl', 'inspecti', '-o', 'json', imageName], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        if result.returncode != 0:
+            return None
+        try:
+            return json.loads(result.stdout)['status']['id']
+        except (ValueError, KeyError):
+            return None
+
+    def getNodesMissingImage(self, imageName, nodes=None):
+        # Nodes that do not have the same image (by id) as the local docker daemon
+        imageId = self.getLocalImageId(imageName)
+        nodes = self.getKindNodes() if nodes is None else nodes
+        if imageId is None:
+            # Cannot compare, let kind decide
+            return nodes
+        return [node for node in nodes if self.getNodeImageId(node, imageName) != imageId]
+
+    def loadDockerImages(self, imageName, nodes=None):
+        # Load a local docker image into the nodes (all by default) that do not have it yet
+        with self.timed('loadDockerImages'):
+            missing = self.getNodesMissingImage(imageName, nodes)
+            if len(missing) == 0:
+                print(f"Image {imageName} is already present on all nodes.")
+                return ''
+            return self.__runCommandReturnOutput(['kind', 'load', 'docker-image', imageName, '--name', self.clusterName, '--nodes', ','.join(missing)])
 
     def createDeploymentObject(self,
                                containerName,
@@ -98,7 +488,7 @@ class KubernetesController:
         # Create the pod template
         #
         template = client.V1PodTemplateSpec(
-            metadata=client.V1ObjectMeta(labels={"app": appName}),
+            metadata=client.V1ObjectMeta(labels={"app": appName, self.MANAGED_LABEL[0]: self.MANAGED_LABEL[1]}),
             spec=client.V1PodSpec(containers=[container], node_name=nodeName)
         )
 
@@ -117,7 +507,7 @@ class KubernetesController:
         deployment = client.V1Deployment(
             api_version="apps/v1",
             kind="Deployment",
-            metadata=client.V1ObjectMeta(name=deploymentName),
+            metadata=client.V1ObjectMeta(name=deploymentName, labels={self.MANAGED_LABEL[0]: self.MANAGED_LABEL[1]}),
             spec=spec
         )
 
@@ -136,36 +526,57 @@ class KubernetesController:
             print(f"Deployment {deploymentName} already exists in node {nodeName}!")
 
     def createDeployment(self, deployment):
-        try:
-            config.load_kube_config()
-            apps_v1 = client.AppsV1Api()
-
-            # Check if the deployment exists
+        with self.timed('createDeployment'):
             try:
-                existing_deployment = apps_v1.read_namespaced_deployment(
-                    name=deployment.metadata.name,
-                    namespace="default"
-                )
-                print(f"Deployment {deployment.metadata.name} already exists.")
-                return 1
-            except ApiException as e:
-                if e.status == 404:
-                    # Deployment does not exist, create it
-                    apps_v1.create_namespaced_deployment(
-                        body=deployment,
-                        namespace="default"
-                    )
+                self.__connect()
+
+                if self.isCacheSynced():
+                    # The cache already knows what exists, create without reading first
+                    if self.cache.hasDeployment(deployment.metadata.name):
+                        print(f"Deployment {deployment.metadata.name} already exists.")
+                        return 1
+                    try:
+                        self.appsV1.create_namespaced_deployment(
+                            body=deployment,
+                            namespace=self.NAMESPACE
+                        )
+                    except ApiException as e:
+                        if e.status == 409:
+                            print(f"Deployment {deployment.metadata.name} already exists.")
+                            return 1
+                        print(f"Error creating deployment {deployment.metadata.name}: {e}")
+                        return 2
                     self.__saveDeployment(deployment)
+                    self.cache.assumeDeployment(deployment)
                     print(f"Deployment {deployment.metadata.name} created!")
                     return 0
-                else:
-                    # An error occurred while trying to read the deployment
-                    print(f"Error checking if deployment exists: {e}")
-                    return 2
 
-        except Exception as e:
-            print(f"Error creating deployment {deployment.metadata.name}: {e}")
-            return 3
+                # Check if the deployment exists
+                try:
+                    existing_deployment = self.appsV1.read_namespaced_deployment(
+                        name=deployment.metadata.name,
+                        namespace=self.NAMESPACE
+                    )
+                    print(f"Deployment {deployment.metadata.name} already exists.")
+                    return 1
+                except ApiException as e:
+                    if e.status == 404:
+                        # Deployment does not exist, create it
+                        self.appsV1.create_namespaced_deployment(
+                            body=deployment,
+                            namespace=self.NAMESPACE
+                        )
+                        self.__saveDeployment(deployment)
+                        print(f"Deployment {deployment.metadata.name} created!")
+                        return 0
+                    else:
+                        # An error occurred while trying to read the deployment
+                        print(f"Error checking if deployment exists: {e}")
+                        return 2
+
+            except Exception as e:
+                print(f"Error creating deployment {deployment.metadata.name}: {e}")
+                return 3
     
     def createServiceObject(self, serviceName, serviceType, appName, port, targetPort, nodePort):
         #
@@ -174,7 +585,7 @@ class KubernetesController:
         service = client.V1Service(
             api_version="v1",
             kind="Service",
-            metadata=client.V1ObjectMeta(name=serviceName),
+            metadata=client.V1ObjectMeta(name=serviceName, labels={self.MANAGED_LABEL[0]: self.MANAGED_LABEL[1]}),
             spec=client.V1ServiceSpec(
                 selector={"app": appName},
                 ports=[client.V1ServicePort(app_protocol="TCP", port=port, target_port=targetPort, node_port=nodePort)],
@@ -186,32 +597,32 @@ class KubernetesController:
         return service
     
     def createService(self, service):
-        try:
-            config.load_kube_config()
-            v1 = client.CoreV1Api()
-
-            # Check if the service exists
+        with self.timed('createService'):
             try:
-                existing_service = v1.read_namespaced_service(
-                    name=service.metadata.name,
-                    namespace="default"
-                )
-                print(f"Service {service.metadata.name} already exists.")
-                return 1
-            except ApiException as e:
-                if e.status == 404:
-                    # Service does not exist, create it
-                    v1.create_namespaced_service(
-                        body=service,
-                        namespace="default"
+                self.__connect()
+
+                # Check if the service exists
+                try:
+                    existing_service = self.coreV1.read_namespaced_service(
+                        name=service.metadata.name,
+                        namespace=self.NAMESPACE
                     )
-                    print(f"Service {service.metadata.name} created!")
-                    return 0
-                else:
-                    # An error occurred while trying to read the service
-                    print(f"Error checking if service exists: {e}")
-                    return 2
+                    print(f"Service {service.metadata.name} already exists.")
+                    return 1
+                except ApiException as e:
+                    if e.status == 404:
+                        # Service does not exist, create it
+                        self.coreV1.create_namespaced_service(
+                            body=service,
+                            namespace=self.NAMESPACE
+                        )
+                        print(f"Service {service.metadata.name} created!")
+                        return 0
+                    else:
+                        # An error occurred while trying to read the service
+                        print(f"Error checking if service exists: {e}")
+                        return 2
 
-        except Exception as e:
-            print(f"Error creating service {service.metadata.name}: {e}")
-            return 3
+            except Exception as e:
+                print(f"Error creating service {service.metadata.name}: {e}")
+                return 3
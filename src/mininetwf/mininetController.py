@@ -20,6 +20,21 @@ class MininetController:
             print(f"Using config file: {configPath}")
             self.config = json.load(file)
         
+    def hasLoop(self, linkTo) -> bool:
+        # Union-find over the links, a link between two already connected APs closes a loop
+        parent = {}
+        def root(ap):
+            while parent.setdefault(ap, ap) != ap:
+                ap = parent[ap]
+            return ap
+        for ap1, links in linkTo.items():
+            for ap2 in str(links).split(','):
+                r1, r2 = root(int(ap1)), root(int(ap2.strip()))
+                if r1 == r2:
+                    return True
+                parent[r1] = r2
+        return False
+
     def startNetwork(self) -> bool:
         info( '*** Creating network\n' )
         net = Mininet_wifi(link=wmediumd, wmediumd_mode=interference)
@@ -31,8 +46,10 @@ class MininetController:
         info("*** Creating vehicles\n")
         if 'cars' in self.config and 'count' in self.config['cars']:
             for id in range(0, self.config['cars']['count']):
-                mac = '02:00:00:00:%02x:00' % (id+1)
-                net.addCar('car%s' % (id+1), ip=f'10.0.0.{id+1}/8', mac=mac)
+                # Past 255 cars the addresses carry into the next octets (see Scenario.getCarIPFromID)
+                n = id + 1
+                mac = '02:00:00:%02x:%02x:00' % ((n >> 8) & 0xff, n & 0xff)
+                net.addCar('car%s' % n, ip=f'10.{(n >> 16) & 0xff}.{(n >> 8) & 0xff}.{n & 0xff}/8', mac=mac)
         else:
             print("Error: Missing 'cars' or 'count' in config file!")
             return False
@@ -42,7 +59,7 @@ class MininetController:
         if 'aps' in self.config:
             for apCfg in self.config['aps']:
                 apID = int(apCfg['id'])
-                ap = net.addAccessPoint(f"ap{apID}", mac=f'00:00:00:00:00:0{apID}', channel=apCfg['channel'],
+                ap = net.addAccessPoint(f"ap{apID}", mac='00:00:00:00:%02x:%02x' % ((apID >> 8) & 0xff, apID & 0xff), channel=apCfg['channel'],
                                     position=apCfg['position'], cls=OVSAP)
                 
                 if 'linkTo' in apCfg:
@@ -67,10 +84,16 @@ class MininetController:
         info("*** Configuring nodes\n")
         net.configureWifiNodes()
 
+        # The backhaul is bridged by the OVSAPs without STP, a loop floods broadcasts forever
+        if self.hasLoop(linkTo):
+            print("Error: The 'linkTo' links form a loop, only loop-free backhauls (chain, tree) can be started!")
+            return False
+
         info( '*** Add links\n')
-        for ap1, ap2 in linkTo.items():
-            # Get ap with name 'ap{ap1}' and link it to ap with name 'ap{ap2}'
-            net.addLink(net.getNodeByName(f"ap{ap1}"), net.getNodeByName(f"ap{ap2}"))
+        for ap1, links in linkTo.items():
+            # Link ap with name 'ap{ap1}' to every ap of its linkTo ('2' or '2,5')
+            for ap2 in str(links).split(','):
+                net.addLink(net.getNodeByName(f"ap{ap1}"), net.getNodeByName(f"ap{ap2.strip()}"))
 
         if 'sumoConfig' in self.config:
             info( '*** Starting SUMO\n' )
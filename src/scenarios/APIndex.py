@@ -0,0 +1,126 @@
+#
+# Spatial index over the access points of a scenario.
+#
+# The AP positions are parsed once and bucketed in a uniform grid, so the geometry
+# helpers of the Scenario can answer nearest/in-range queries without scanning every AP.
+#
+import math
+
+class APIndex:
+
+    def __init__(self, accessPoints, cellSize=300):
+        self.cellSize = float(cellSize)
+
+        self.ids = [] # [ap_id] in config order
+        self.nodes = [] # [kindNode] in config order
+        self.positions = [] # [(x, y)] in config order
+        self.byId = {} # {ap_id: index}
+        self.byNode = {} # {kindNode: [ap_id]}
+
+        for i, ap in enumerate(accessPoints):
+            apId = str(ap['id'])
+            x, y = [float(c) for c in ap['position'].split(',')[0:2]]
+            self.ids.append(apId)
+            self.nodes.append(ap.get('kindNode'))
+            self.positions.append((x, y))
+            self.byId[apId] = i
+            self.byNode.setdefault(str(ap.get('kindNode')), []).append(apId)
+
+        # Uniform grid: {(cx, cy): [index]}
+        self.grid = {}
+        for i, (x, y) in enumerate(self.positions):
+            self.grid.setdefault(self.cellOf(x, y), []).append(i)
+
+        if self.grid:
+            cells = self.grid.keys()
+            self.minCx = min(c[0] for c in cells)
+            self.maxCx = max(c[0] for c in cells)
+            self.minCy = min(c[1] for c in cells)
+            self.maxCy = max(c[1] for c in cells)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def cellOf(self, x, y):
+        return (math.floor(x / self.cellSize), math.floor(y / self.cellSize))
+
+    def indexOf(self, apId):
+        if apId is None:
+            return None
+        return self.byId.get(str(apId), None)
+
+    def position(self, apId):
+        i = self.indexOf(apId)
+        return None if i is None else self.positions[i]
+
+    def node(self, apId):
+        i = self.indexOf(apId)
+        return None if i is None else self.nodes[i]
+
+    def apsOfNode(self, nodeId):
+        return self.byNode.get(str(nodeId), [])
+
+    def __ringCells(self, cx, cy, r):
+        # Cells at Chebyshev distance r from (cx, cy), clipped to the occupied bounding box
+        if r == 0:
+            yield (cx, cy)
+            return
+        xs = range(max(cx - r, self.minCx), min(cx + r, self.maxCx) + 1)
+        for y in (cy - r, cy + r):
+            if self.minCy <= y <= self.maxCy:
+                for x in xs:
+                    yield (x, y)
+        ys = range(max(cy - r + 1, self.minCy), min(cy + r - 1, self.maxCy) + 1)
+        for x in (cx - r, cx + r):
+            if self.minCx <= x <= self.maxCx:
+                for y in ys:
+                    yield (x, y)
+
+    def nearest(self, x, y, exclude=None, predicate=None):
+        # Return the index of the closest AP to (x, y), or None.
+        # Ties are resolved towards the AP that comes last in the config, as the linear scans did.
+        if not self.grid:
+            return None
+        excludeIdx = self.indexOf(exclude)
+
+        cx, cy = self.cellOf(x, y)
+        rStart = max(0, self.minCx - cx, cx - self.maxCx, self.minCy - cy, cy - self.maxCy)
+        rEnd = max(cx - self.minCx, self.maxCx - cx, cy - self.minCy, self.maxCy - cy)
+
+        best = None
+        bestDistance = None
+        for r in range(rStart, rEnd + 1):
+            for cell in self.__ringCells(cx, cy, r):
+                for i in self.grid.get(cell, ()):
+                    if i == excludeIdx:
+                        continue
+                    if predicate is not None and not predicate(i):
+                        continue
+                    distance = math.dist((x, y), self.positions[i])
+                    if best is None or distance < bestDistance or (distance == bestDistance and i > best):
+                        best = i
+                        bestDistance = distance
+            # Everything outside ring r is at least r cells away
+            if best is not None and bestDistance < r * self.cellSize:
+                break
+
+        return best
+
+    def inRange(self, x, y, radius=300):
+        # Return the indexes (in config order) of the APs within radius of (x, y)
+        if not self.grid:
+            return []
+        minCx, minCy = self.cellOf(x - radius, y - radius)
+        maxCx, maxCy = self.cellOf(x + radius, y + radius)
+        found = []
+        for gx in range(max(minCx, self.minCx), min(maxCx, self.maxCx) + 1):
+            for gy in range(max(minCy, self.minCy), min(maxCy, self.maxCy) + 1):
+                for i in self.grid.get((gx, gy), ()):
+                    if math.dist((x, y), self.positions[i]) <= radius:
+                        found.append(i)
+        found.sort()
+        return found
+
+    def nearestId(self, x, y, exclude=None, predicate=None):
+        i = self.nearest(x, y, exclude, predicate)
+        return None if i is None else self.ids[i]
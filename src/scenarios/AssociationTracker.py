@@ -0,0 +1,151 @@
+#
+# Station (car) to AP association map shared by every car lookup.
+#
+# The map is rebuilt from one 'iw dev apN-wlan1 station dump' per AP (all APs dumped concurrently)
+# at most once per refresh interval. When 'iw event' is available, the nl80211 new/del station
+# events keep the map current between dumps, and once events are coming in the dumps only run every
+# resync interval to catch missed events. Events received while a dump runs are applied on top of
+# its result. Looking up a car is a dictionary access either way.
+#
+import re
+import time
+import threading
+import subprocess
+
+STATION_LINE = re.compile(r'^Station ([0-9a-f:]{17})', re.MULTILINE)
+EVENT_LINE = re.compile(r'^(\S+) \(phy #\d+\): (new|del) station ([0-9a-f:]{17})')
+
+class AssociationTracker:
+
+    def __init__(self, apIds, interfaceFormat='ap{ap}-wlan1', refreshInterval=1.0, resyncInterval=10.0, useEvents=True):
+        self.interfaces = [(ap_id, interfaceFormat.format(ap=ap_id)) for ap_id in apIds] # In config order
+        self.apByInterface = {interface: ap_id for (ap_id, interface) in self.interfaces}
+        self.refreshInterval = refreshInterval
+        self.resyncInterval = resyncInterval
+        self.useEvents = useEvents
+
+        self.lock = threading.Lock()
+        self.refreshLock = threading.Lock() # One dump at a time, concurrent lookups wait for it
+        self.macToAp = {} # {mac: ap_id}
+        self.lastRefresh = 0
+        self.dumpEvents = None # [(kind, mac, ap_id)] received while a dump runs
+
+        self.eventProcess = None
+        self.eventThread = None
+        self.started = False
+
+        # Metrics
+        self.dumps = 0
+        self.events = 0
+
+    @staticmethod
+    def carMac(car_id):
+        return '02:00:00:%02x:%02x:00' % ((car_id >> 8) & 0xff, car_id & 0xff)
+
+    def start(self):
+        # Subscribe to association events; without them every lookup relies on the per-tick dumps
+        self.started = True
+        if not self.useEvents:
+            return
+        try:
+            self.eventProcess = subprocess.Popen(['iw', 'event'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        except OSError as e:
+            print(f"Could not subscribe to association events, polling the APs instead: {e}")
+            self.eventProcess = None
+            return
+        self.eventThread = threading.Thread(target=self.__readEvents, name='association-events', daemon=True)
+        self.eventThread.start()
+
+    def __readEvents(self):
+        for line in self.eventProcess.stdout:
+            match = EVENT_LINE.search(line)
+            if match is None:
+                continue
+            interface, kind, mac = match.groups()
+            ap_id = self.apByInterface.get(interface, None)
+            if ap_id is None:
+                continue
+            with self.lock:
+                self.events += 1
+                self.__applyEvent(self.macToAp, kind, mac, ap_id)
+                if self.dumpEvents is not None:
+                    self.dumpEvents.append((kind, mac, ap_id))
+
+    @staticmethod
+    def __applyEvent(macToAp, kind, mac, ap_id):
+        if kind == 'new':
+            macToAp[mac] = ap_id
+        elif macToAp.get(mac, None) == ap_id:
+            # Only drop it if the car did not already roam to another AP
+            del macToAp[mac]
+
+    @property
+    def eventsActive(self):
+        # The events only replace the per-tick dumps once some were actually applied
+        return self.eventProcess is not None and self.eventProcess.poll() is None and self.events > 0
+
+    def refresh(self):
+        # Dump the station table of every AP (concurrently) and replace the map
+        with self.lock:
+            self.dumpEvents = []
+        processes = []
+        for ap_id, interface in self.interfaces:
+            try:
+                process = subprocess.Popen(['iw', 'dev', interface, 'station', 'dump'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+            except OSError:
+                continue
+            processes.append((ap_id, process))
+
+        macToAp = {}
+        for ap_id, process in processes:
+            output, _ = process.communicate()
+            if process.returncode != 0:
+                continue
+            for mac in STATION_LINE.findall(output):
+                # Keep the first AP (in config order) if a car shows up in two station tables
+                macToAp.setdefault(mac, ap_id)
+
+        with self.lock:
+            # The events received meanwhile are newer than the dump
+            for kind, mac, ap_id in self.dumpEvents:
+                self.__applyEvent(macToAp, kind, mac, ap_id)
+            self.dumpEvents = None
+            self.macToAp = macToAp
+            self.lastRefresh = time.monotonic()
+            self.dumps += 1
+
+    def __refreshIfStale(self):
+        interval = self.resyncInterval if self.eventsActive else self.refreshInterval
+        if time.monotonic() - self.lastRefresh < interval:
+            return
+        with self.refreshLock:
+            # Another lookup may have refreshed while we waited
+            if time.monotonic() - self.lastRefresh >= interval:
+                self.refresh()
+
+    def getAP(self, mac):
+        if not self.started:
+            self.start()
+        self.__refreshIfStale()
+        with self.lock:
+            return self.macToAp.get(mac, None)
+
+    def getAssociatedAP(self, car_id):
+        return self.getAP(self.carMac(car_id))
+
+    def getAssociations(self):
+        # Copy of the whole {mac: ap_id} map
+        if not self.started:
+            self.start()
+        self.__refreshIfStale()
+        with self.lock:
+            return dict(self.macToAp)
+
+    def getMetrics(self):
+        with self.lock:
+            return {'dumps': self.dumps, 'events': self.events, 'stations': len(self.macToAp), 'events_active': self.eventsActive}
+
+    def close(self):
+        if self.eventProcess is not None:
+            self.eventProcess.terminate()
+            self.eventProcess = None
@@ -0,0 +1,269 @@
+#
+# Pluggable SDN and Kubernetes backends of the scenarios, selected from the scenario config:
+#   "backends": {
+#       "sdn": {"type": "fake", "latency": {"flowRequest": 0.01, "flowMod": 0.002}, "jitter": 0.005, "failure-rate": 0.01},
+#       "kubernetes": {"type": "fake", "latency": {"createDeployment": 0.3, "podReady": 4.0}, "jitter": 0.5,
+#                      "failure-rate": {"createDeployment": 0.05}, "seed": 1}
+#   }
+# SDN types:
+#   ryu       ofctl_rest on localhost:8080, launched with ryu-manager (default)
+#   fake      in-process flow table (FakeSDNClient over a FlowStore), no controller
+#   fake-http FakeSDNServer serving the /stats/flowentry/* contract on localhost:<port>, used
+#             through the real SDNFlowClient (HTTP, batching and fallbacks included)
+# Kubernetes types:
+#   kind      KubernetesController on a kind cluster (default)
+#   fake      FakeKubernetesController on wall time: same calls and return codes, no cluster
+#
+# "latency" overrides the seconds of scenarios.Simulation.LATENCIES, "jitter" adds up to that
+# many seconds either way to every latency, and "failure-rate" is the probability that an
+# operation fails (one rate for every operation or one per operation: createService,
+# createDeployment, deleteDeployment, flowRequest, flowMod). The fake backends spend their
+# latencies on the wall clock, so a slow API is slow for the control loop too.
+#
+import json
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from kind.kubernetesController import KubernetesController
+from scenarios.SDNFlowClient import SDNFlowClient
+from scenarios.Simulation import LATENCIES, WallClock, FakeKubernetesController, FakeSDNClient
+
+class FaultModel:
+
+    def __init__(self, jitter=0.0, failureRate=0.0, seed=None):
+        self.jitterSeconds = jitter
+        self.failureRate = failureRate # float, or {operation: float}
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.injected = {} # {operation: count}
+
+    @classmethod
+    def fromConfig(cls, config):
+        return cls(float(config.get('jitter', 0.0)), config.get('failure-rate', 0.0), config.get('seed', None))
+
+    def jitter(self, seconds):
+        if self.jitterSeconds <= 0:
+            return seconds
+        with self.lock:
+            return max(0.0, seconds + self.random.uniform(-self.jitterSeconds, self.jitterSeconds))
+
+    def fails(self, operation):
+        rate = self.failureRate.get(operation, 0.0) if isinstance(self.failureRate, dict) else self.failureRate
+        if rate <= 0:
+            return False
+        with self.lock:
+            if self.random.random() >= rate:
+                return False
+            self.injected[operation] = self.injected.get(operation, 0) + 1
+            return True
+
+    def getMetrics(self):
+        with self.lock:
+            return {'injected_failures': dict(self.injected)}
+
+class FlowStore:
+    # Flow entries of every switch, with the semantics of ofctl_rest's /stats/flowentry/* commands.
+    # apply() returns the HTTP status ofctl_rest would answer for the entry.
+
+    COMMANDS = ('add', 'modify', 'modify_strict', 'delete', 'delete_strict')
+
+    def __init__(self, dpids=None):
+        self.dpids = None if dpids is None else set(dpids) # Connected switches, any dpid if None
+        self.lock = threading.Lock()
+        self.flows = {} # {dpid: {(priority, match key): flow}}
+
+    @staticmethod
+    def __matchKey(match):
+        return json.dumps(match or {}, sort_keys=True)
+
+    @staticmethod
+    def __covers(match, flowMatch):
+        # Non-strict commands: every field of match is set to the same value in the flow's match
+        return all(flowMatch.get(field, None) == value for field, value in (match or {}).items())
+
+    def apply(self, cmd, flow):
+        try:
+            dpid = int(str(flow.get('dpid')), 0)
+        except ValueError:
+            return 400
+        if self.dpids is not None and dpid not in self.dpids:
+            return 404
+        if cmd not in FlowStore.COMMANDS:
+            return 404
+
+        priority = int(flow.get('priority', 0))
+        match = flow.get('match', {})
+        key = (priority, FlowStore.__matchKey(match))
+        with self.lock:
+            table = self.flows.setdefault(dpid, {})
+            if cmd == 'add':
+                table[key] = {'priority': priority, 'match': dict(match), 'actions': list(flow.get('actions', [])),
+                              'idle_timeout': flow.get('idle_timeout', 0), 'hard_timeout': flow.get('hard_timeout', 0)}
+            elif cmd == 'modify_strict':
+                if key in table:
+                    table[key]['actions'] = list(flow.get('actions', []))
+            elif cmd == 'modify':
+                for entry in table.values():
+                    if FlowStore.__covers(match, entry['match']):
+                        entry['actions'] = list(flow.get('actions', []))
+            elif cmd == 'delete_strict':
+                table.pop(key, None)
+            elif cmd == 'delete':
+                for entryKey in [entryKey for entryKey, entry in table.items() if FlowStore.__covers(match, entry['match'])]:
+                    del table[entryKey]
+        return 200
+
+    def clear(self, dpid):
+        with self.lock:
+            self.flows.pop(int(str(dpid), 0), None)
+
+    def getFlows(self, dpid):
+        with self.lock:
+            return [dict(entry) for entry in self.flows.get(int(str(dpid), 0), {}).values()]
+
+    def __len__(self):
+        with self.lock:
+            return sum(len(table) for table in self.flows.values())
+
+class FakeSDNServer:
+    # The flow entry endpoints of ofctl_rest over HTTP, on a FlowStore:
+    #   POST /stats/flowentry/{add,modify,modify_strict,delete,delete_strict}
+    #   POST /stats/flowentry/batch          (JSON list of the HTTP status of each entry)
+    #   DELETE /stats/flowentry/clear/<dpid>
+    #   GET /stats/flow/<dpid>
+    # Injected request failures answer 503, injected flow mod failures 503 for that entry.
+
+    def __init__(self, store=None, latencies=None, faults=None, host='127.0.0.1', port=8080):
+        self.store = FlowStore() if store is None else store
+        self.latencies = dict(LATENCIES, **(latencies or {}))
+        self.faults = faults
+        self.clock = WallClock()
+        self.server = ThreadingHTTPServer((host, port), self.__handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def baseUrl(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def spend(self, flowMods):
+        seconds = self.latencies['flowRequest'] + self.latencies['flowMod'] * flowMods
+        if self.faults is not None:
+            seconds = self.faults.jitter(seconds)
+        self.clock.spend(seconds)
+
+    def fails(self, operation):
+        return self.faults is not None and self.faults.fails(operation)
+
+    def modFlow(self, cmd, flow):
+        if self.fails('flowMod'):
+            return 503
+        return self.store.apply(cmd, flow)
+
+    def __handler(self):
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, format, *args):
+                pass # One line per flow mod would drown the scenario's output
+
+            def __reply(self, status, body=None):
+                data = b'' if body is None else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def __body(self):
+                length = int(self.headers.get('Content-Length', 0))
+                return json.loads(self.rfile.read(length).decode('utf-8')) if length > 0 else None
+
+            def do_POST(self):
+                parts = self.path.strip('/').split('/')
+                if len(parts) != 3 or parts[:2] != ['stats', 'flowentry']:
+                    return self.__reply(404)
+                try:
+                    body = self.__body()
+                except ValueError:
+                    return self.__reply(400)
+
+                if parts[2] == 'batch':
+                    if not isinstance(body, list):
+                        return self.__reply(400)
+                    backend.spend(len(body))
+                    if backend.fails('flowRequest'):
+                        return self.__reply(503)
+                    return self.__reply(200, [backend.modFlow(flow.pop('cmd', 'add'), flow) for flow in map(dict, body)])
+
+                if not isinstance(body, dict):
+                    return self.__reply(400)
+                backend.spend(1)
+                if backend.fails('flowRequest'):
+                    return self.__reply(503)
+                return self.__reply(backend.modFlow(parts[2], body))
+
+            def do_DELETE(self):
+                parts = self.path.strip('/').split('/')
+                if len(parts) != 4 or parts[:3] != ['stats', 'flowentry', 'clear']:
+                    return self.__reply(404)
+                try:
+                    backend.store.clear(parts[3])
+                except ValueError:
+                    return self.__reply(400)
+                return self.__reply(200)
+
+            def do_GET(self):
+                parts = self.path.strip('/').split('/')
+                if len(parts) != 3 or parts[:2] != ['stats', 'flow']:
+                    return self.__reply(404)
+                try:
+                    flows = backend.store.getFlows(parts[2])
+                except ValueError:
+                    return self.__reply(400)
+                return self.__reply(200, {parts[2]: flows})
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"Fake SDN controller serving the flow entry API on {self.baseUrl}")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def sdnType(config):
+    return (config or {}).get('type', 'ryu')
+
+def kubernetesType(config):
+    return (config or {}).get('type', 'kind')
+
+def createSDNClient(config=None):
+    # Client for the SDN backend of the config (None: ryu)
+    config = config or {}
+    backend = sdnType(config)
+    if backend == 'ryu':
+        return SDNFlowClient()
+    faults = FaultModel.fromConfig(config)
+    if backend == 'fake':
+        return FakeSDNClient(WallClock(), config.get('latency', None), faults, FlowStore())
+    if backend == 'fake-http':
+        server = FakeSDNServer(latencies=config.get('latency', None), faults=faults, port=int(config.get('port', 8080))).start()
+        return SDNFlowClient(server.baseUrl)
+    raise ValueError(f"Unknown SDN backend '{backend}', expected ryu, fake or fake-http")
+
+def createKubernetesController(kindCfg, config=None, warmPool=False):
+    # Controller for the Kubernetes backend of the config (None: kind)
+    config = config or {}
+    backend = kubernetesType(config)
+    if backend == 'kind':
+        return KubernetesController(kindCfg, warmPool=warmPool)
+    if backend == 'fake':
+        return FakeKubernetesController(kindCfg, WallClock(), config.get('latency', None), FaultModel.fromConfig(config))
+    raise ValueError(f"Unknown Kubernetes backend '{backend}', expected kind or fake")
@@ -0,0 +1,295 @@
+#
+# Control plane scalability benchmarks.
+#
+# Every case runs on a synthetic layout (a square grid of APs 400 m apart, backhaul links to the
+# right and lower neighbours, APs split into contiguous blocks over up to 9 workers) with a
+# synthetic fleet (cars driving along the grid axes at 5-15 m/s, bouncing off its edges):
+#   geometry     Scenario geometry helpers over every car (closest AP, leaving, next AP, distances)
+#   reactive     MobilityStrategy.controllerStep with decideReactive, on the headless engine
+#   predictive   MobilityStrategy.controllerStep with decidePredictive, on the headless engine
+#   scheduled    the same with the handover scheduler (2 s look-ahead): only the cars near an AP crossing
+#   loadbalance  LoadBalancing.controllerStep, on the headless engine
+# and measures, after some warmup ticks:
+#   setup_s        scenario construction (configs parsed, AP index and topology built)
+#   tick_ms        per-tick latency of the case (count, mean, p50, p90, p99, max)
+#   ingest_ms      per-tick time to hand every car's sample to onTelemetrySample
+#   alloc_peak_kb  peak memory allocated by one tick (tracemalloc, a few extra ticks)
+#   alloc_net_kb   memory still allocated after that tick
+#   peak_rss_mb    peak RSS of the process (each case runs in a fresh process)
+# Every case runs REPEATS times, each in a fresh process, and keeps the run with the lowest median
+# tick (tick_p50_runs_ms lists the medians of all runs): the slower runs are mostly the machine.
+#
+# Results are written as JSON, and compared with a baseline results file when one is given: any
+# case whose best median tick grew by more than the tolerance and by more than MIN_DELTA_MS, or
+# whose peak RSS grew by more than the tolerance, is a regression, and the run exits with 1. Cases
+# whose ticks are well under MIN_DELTA_MS cannot regress on time, their variation is noise.
+# benchmarks/baseline-quick.json holds the quick preset of the code it was last refreshed on.
+#
+#   python3 -m scenarios.Benchmark <quick|full> [results.json] [baseline.json]
+#   python3 -m scenarios.Benchmark quick benchmark-quick.json benchmarks/baseline-quick.json
+#
+import os
+import sys
+import json
+import math
+import time
+import yaml
+import platform
+import resource
+import tempfile
+import tracemalloc
+import contextlib
+import subprocess
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from scenarios.TickProfiler import Histogram
+
+CASES = ['geometry', 'reactive', 'predictive', 'scheduled', 'loadbalance']
+
+# (cars, APs) of every size; the fleet grows at 100 APs and the AP grid grows at 1000 cars,
+# then both together up to 50,000 cars and 5,000 APs
+PRESETS = {
+    'quick': [(100, 9), (1000, 9), (1000, 100)],
+    'full': [(100, 9), (1000, 100), (10000, 100), (50000, 100),
+             (1000, 9), (1000, 1000), (1000, 5000),
+             (10000, 1000), (50000, 5000)],
+}
+
+WARMUP_TICKS = 10
+TICKS = 50
+ALLOC_TICKS = 3
+REPEATS = 3 # Runs of every case, the best median is kept
+TOLERANCE = 1.25 # Ratio over the baseline that counts as a regression
+MIN_DELTA_MS = 2.0 # Smaller tick differences are noise (the best medians of sub-ms cases still vary by ~1 ms)
+
+AP_SPACING = 400
+SCHEDULER_LOOKAHEAD = 2.0
+MAX_WORKERS = 9 # Kept at the worker count of the baseline, so results stay comparable
+
+def writeLayout(numAps, numCars, directory):
+    # Kind and mininet configs of a grid of numAps APs, named so scenarioClassFor can tell the scenario
+    side = math.ceil(math.sqrt(numAps))
+    workers = min(MAX_WORKERS, numAps)
+    aps = []
+    for i in range(numAps):
+        row, col = divmod(i, side)
+        links = [str(j + 1) for j in (i + 1 if col + 1 < side else None, i + side) if j is not None and j < numAps]
+        ap = {'id': str(i + 1), 'position': f'{col * AP_SPACING},{row * AP_SPACING},0', 'channel': str([1, 6, 11][i % 3]),
+              'kindNode': str(i * workers // numAps + 1)}
+        if len(links) > 0:
+            ap['linkTo'] = ','.join(links)
+        aps.append(ap)
+    mininetConfig = {'cars': {'count': numCars}, 'aps': aps}
+
+    paths = {}
+    for scenario in ('4_LoadBalancing', '5_MobilityStrategy'):
+        clusterName = 'load-balancing' if scenario == '4_LoadBalancing' else 'mobility-strategy'
+        kindConfig = {'kind': 'Cluster', 'apiVersion': 'kind.x-k8s.io/v1alpha4', 'name': clusterName,
+                      'nodes': [{'role': 'control-plane'}] + [{'role': 'worker'} for _ in range(workers)]}
+        kindPath = os.path.join(directory, f'{scenario}-{numAps}aps.yaml')
+        mininetPath = os.path.join(directory, f'{scenario}-{numAps}aps.json')
+        with open(kindPath, 'w') as file:
+            yaml.safe_dump(kindConfig, file, sort_keys=False)
+        with open(mininetPath, 'w') as file:
+            json.dump(mininetConfig, file)
+        paths[scenario] = (kindPath, mininetPath)
+    return paths, (side - 1) * AP_SPACING
+
+def syntheticFleet(numCars, numTicks, extent, seed=1):
+    # (ticks, cars, 2) positions of cars driving along the x or y axis, bouncing off the layout edges
+    rng = np.random.default_rng(seed)
+    extent = max(extent, 1.0)
+    start = rng.uniform(0, extent, (numCars, 2))
+    speed = rng.uniform(5, 15, numCars) * rng.choice([-1, 1], numCars)
+    velocity = np.zeros((numCars, 2))
+    axis = rng.integers(0, 2, numCars)
+    velocity[np.arange(numCars), axis] = speed
+    # Reflection: fold the straight path into [0, extent]
+    path = start[None] + np.arange(numTicks, dtype=float)[:, None, None] * velocity[None]
+    path = np.mod(path, 2 * extent)
+    return np.where(path > extent, 2 * extent - path, path)
+
+def summary(histogram):
+    result = histogram.summary()
+    return {key.replace('_ms', ''): value for key, value in result.items()}
+
+def allocations(function):
+    # Peak and net memory allocated by one call, in KB
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    function()
+    current, peak = tracemalloc.get_traced_memory()
+    return (peak - before) / 1024, (current - before) / 1024
+
+def geometryTick(scenario, positions, directions):
+    # Every geometry helper over every car, as the controllers use them
+    from scenarios.Scenario import Scenario
+    apIndexes = np.array([scenario.apIndex.nearest(x, y) for (x, y) in positions.tolist()], dtype=np.int64)
+    Scenario.isLeavingAPBatch(scenario, positions, directions, apIndexes)
+    Scenario.nextApInDirectionBatch(scenario, positions, directions, apIndexes)
+    Scenario.distanceInRangeBatch(scenario, positions, directions, apIndexes)
+
+def runCase(case, numCars, numAps):
+    # Runs in a fresh worker process
+    from scenarios.Simulation import HeadlessSimulation
+    from scenarios.Scenario import Scenario
+    from scenarios.LoadBalancing import LoadBalancing
+    from scenarios.MobilityStrategy import MobilityStrategy
+
+    numTicks = WARMUP_TICKS + TICKS + ALLOC_TICKS
+    ticks = Histogram()
+    ingest = Histogram()
+    allocPeak = []
+    allocNet = []
+
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        layouts, extent = writeLayout(numAps, numCars, directory)
+        trace = syntheticFleet(numCars, numTicks + 1, extent)
+        outputDir = os.path.join(directory, 'output')
+
+        start = time.perf_counter()
+        if case == 'geometry':
+            kindCfg, mininetCfg = layouts['5_MobilityStrategy']
+            scenario = Scenario(kindCfg, mininetCfg, None, output_dir=outputDir)
+        else:
+            scenarioClass = LoadBalancing if case == 'loadbalance' else MobilityStrategy
+            kindCfg, mininetCfg = layouts['4_LoadBalancing' if case == 'loadbalance' else '5_MobilityStrategy']
+            parameters = {'HANDOVER_LOOKAHEAD': SCHEDULER_LOOKAHEAD} if case == 'scheduled' else None
+            simulation = HeadlessSimulation(kindCfg, mininetCfg, trace, strategy='reactive' if case == 'reactive' else 'predictive',
+                                            output_dir=outputDir, scenarioClass=scenarioClass, parameters=parameters)
+        setup = time.perf_counter() - start
+
+        if case == 'geometry':
+            feed = lambda k: None
+
+            def tick(k):
+                positions = trace[k + 1]
+                directions = positions - trace[k]
+                geometryTick(scenario, positions, directions)
+        else:
+            simulation.start()
+            simulation.scenarioClass.startController(simulation.scenario)
+            t0 = simulation.clock.now()
+            feed = lambda k: simulation.feed(k, t0 + k * simulation.tick)
+            tick = lambda k: simulation.step()
+
+        for k in range(numTicks):
+            begin = time.perf_counter_ns()
+            feed(k)
+            if WARMUP_TICKS <= k < WARMUP_TICKS + TICKS and case != 'geometry':
+                ingest.record((time.perf_counter_ns() - begin) // 1000)
+            if k < WARMUP_TICKS + TICKS:
+                begin = time.perf_counter_ns()
+                tick(k)
+                if k >= WARMUP_TICKS:
+                    ticks.record((time.perf_counter_ns() - begin) // 1000)
+            else:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                peak, net = allocations(lambda: tick(k))
+                allocPeak.append(peak)
+                allocNet.append(net)
+        tracemalloc.stop()
+
+        if case == 'geometry':
+            scenario.flowQueue.stop()
+            scenario.migrationExecutor.stop()
+            scenario.associationTracker.close()
+        else:
+            simulation.scenarioClass.closeOutputs(simulation.scenario)
+
+    result = {
+        'case': case,
+        'cars': numCars,
+        'aps': numAps,
+        'setup_s': setup,
+        'tick_ms': summary(ticks),
+        'alloc_peak_kb': max(allocPeak),
+        'alloc_net_kb': max(allocNet),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    if ingest.count > 0:
+        result['ingest_ms'] = summary(ingest)
+    return result
+
+def caseKey(result):
+    return f"{result['case']}/{result['cars']}cars/{result['aps']}aps"
+
+def metadata(preset):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {'preset': preset, 'commit': commit or None, 'python': platform.python_version(), 'numpy': np.__version__,
+            'machine': platform.machine(), 'processor': platform.processor(), 'cpus': os.cpu_count(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'warmup_ticks': WARMUP_TICKS, 'ticks': TICKS, 'repeats': REPEATS}
+
+def bestRun(case, numCars, numAps, repeats=REPEATS):
+    # One process per run, so the peak RSS is the case's own; keeps the run with the lowest median tick
+    runs = []
+    for _ in range(repeats):
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            runs.append(executor.submit(runCase, case, numCars, numAps).result())
+    result = min(runs, key=lambda run: run['tick_ms']['p50'])
+    result['tick_p50_runs_ms'] = [run['tick_ms']['p50'] for run in runs]
+    result['peak_rss_mb'] = min(run['peak_rss_mb'] for run in runs)
+    return result
+
+def runBenchmarks(preset='quick', cases=None):
+    results = {}
+    for (numCars, numAps) in PRESETS[preset]:
+        for case in cases or CASES:
+            try:
+                result = bestRun(case, numCars, numAps)
+            except Exception as e:
+                print(f"{case} with {numCars} cars and {numAps} APs failed: {e}")
+                continue
+            results[caseKey(result)] = result
+            print(f"{caseKey(result):32} setup {result['setup_s']:8.3f}s  tick p50 {result['tick_ms']['p50']:9.3f} ms  "
+                  f"p99 {result['tick_ms']['p99']:9.3f} ms  alloc {result['alloc_peak_kb']:9.1f} KB  rss {result['peak_rss_mb']:7.1f} MB")
+    return {'meta': metadata(preset), 'results': results}
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    # Ratios of the current results over the baseline's, returns the regressions
+    regressions = []
+    print(f"Compared with the baseline of {baseline['meta'].get('commit', None)} ({baseline['meta'].get('date', None)}):")
+    for key, result in results['results'].items():
+        reference = baseline['results'].get(key, None)
+        if reference is None:
+            print(f"  {key:32} not in the baseline")
+            continue
+        # Only the best median gates, the tail is too noisy
+        ratios = {}
+        worse = []
+        for name in ('p50', 'p90'):
+            current, previous = result['tick_ms'][name], reference['tick_ms'][name]
+            ratios[name] = current / max(previous, 1e-3)
+            if name == 'p50' and ratios[name] > tolerance and current - previous > MIN_DELTA_MS:
+                worse.append(name)
+        ratios['rss'] = result['peak_rss_mb'] / max(reference['peak_rss_mb'], 1e-3)
+        if ratios['rss'] > tolerance:
+            worse.append('rss')
+        if len(worse) > 0:
+            regressions.append((key, worse))
+        print(f"  {key:32} " + '  '.join(f"{name} x{ratio:.2f}" for name, ratio in ratios.items()) + ('  REGRESSION' if worse else ''))
+    return regressions
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in PRESETS:
+        print(f"Usage: python3 -m scenarios.Benchmark <{'|'.join(PRESETS)}> [results.json] [baseline.json]")
+        sys.exit(1)
+    resultsPath = sys.argv[2] if len(sys.argv) > 2 else f'benchmark-{sys.argv[1]}.json'
+
+    results = runBenchmarks(sys.argv[1])
+    with open(resultsPath, 'w') as file:
+        json.dump(results, file, indent=4)
+    print(f"Results written to {resultsPath}")
+
+    if len(sys.argv) > 3:
+        with open(sys.argv[3], 'r') as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline)
+        if len(regressions) > 0:
+            print(f"{len(regressions)} regression(s) over x{TOLERANCE:.2f} of the baseline")
+            sys.exit(1)
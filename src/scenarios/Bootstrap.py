@@ -0,0 +1,141 @@
+#
+# Dependency-ordered, concurrent start-up of an experiment.
+#
+# Tasks are named '<phase>:<item>' (e.g. 'image:app:latest', 'deployment:app-deployment-1') and
+# declare the tasks they depend on. Every task whose dependencies are done runs right away on a
+# thread pool, so image loads, service creation and deployment creation overlap instead of running
+# one after another. Tasks may add new tasks while the pipeline runs (e.g. once the cluster is up).
+#
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+class BootstrapTask:
+
+    def __init__(self, name, function, dependsOn):
+        self.name = name
+        self.phase = name.split(':', 1)[0]
+        self.function = function
+        self.dependsOn = list(dependsOn)
+        self.result = None
+        self.error = None
+        self.skipped = False
+        self.start = None
+        self.end = None
+
+    @property
+    def elapsed(self):
+        if self.start is None or self.end is None:
+            return 0.0
+        return self.end - self.start
+
+class BootstrapPipeline:
+
+    def __init__(self, workers=8):
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.tasks = {} # {name: BootstrapTask}, in insertion order
+        self.start = None
+        self.end = None
+
+    def add(self, name, function, dependsOn=()):
+        # function() is called once every task in dependsOn finished without error
+        with self.lock:
+            if name in self.tasks:
+                raise ValueError(f"Duplicated bootstrap task: {name}")
+            self.tasks[name] = BootstrapTask(name, function, dependsOn)
+
+    def __run(self, task):
+        task.start = time.perf_counter()
+        try:
+            task.result = task.function()
+        except Exception as e:
+            task.error = e
+        finally:
+            task.end = time.perf_counter()
+        return task
+
+    def __nextTasks(self, started):
+        # Tasks whose dependencies are done; tasks depending on a failed/skipped task are skipped
+        ready = []
+        with self.lock:
+            changed = True
+            while changed:
+                # Skipping a task may in turn skip the tasks depending on it
+                changed = False
+                for task in self.tasks.values():
+                    if task.name in started:
+                        continue
+                    dependencies = [self.tasks.get(name, None) for name in task.dependsOn]
+                    if any(dependency is None for dependency in dependencies):
+                        # Not added yet, a running task may still add it
+                        continue
+                    failed = [dependency.name for dependency in dependencies if dependency.error is not None]
+                    if len(failed) > 0:
+                        task.skipped = True
+                        task.error = RuntimeError(f"Dependency failed: {failed}")
+                        started.add(task.name)
+                        changed = True
+                    elif all(dependency.end is not None for dependency in dependencies):
+                        started.add(task.name)
+                        ready.append(task)
+        return ready
+
+    def run(self):
+        # Run every task (including the ones added on the way) and wait for all of them.
+        # Returns the list of failed or skipped tasks.
+        self.start = time.perf_counter()
+        started = set()
+        running = set()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bootstrap') as executor:
+            while True:
+                for task in self.__nextTasks(started):
+                    running.add(executor.submit(self.__run, task))
+                if len(running) == 0:
+                    # Nothing left that can make progress
+                    with self.lock:
+                        for task in self.tasks.values():
+                            if task.name not in started:
+                                task.skipped = True
+                                task.error = RuntimeError(f"Unresolved dependencies: {task.dependsOn}")
+                    break
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                running = set(running)
+                for future in done:
+                    task = future.result()
+                    if task.error is not None:
+                        print(f"Bootstrap task {task.name} failed: {task.error}")
+        self.end = time.perf_counter()
+
+        with self.lock:
+            return [task for task in self.tasks.values() if task.error is not None]
+
+    def getTimings(self):
+        # { 'total_ms', 'phases': { phase -> {tasks, wall_ms, busy_ms, max_ms} }, 'tasks': { name -> ms } }
+        with self.lock:
+            tasks = [task for task in self.tasks.values() if task.start is not None]
+        phases = {}
+        for task in tasks:
+            phase = phases.setdefault(task.phase, {'tasks': 0, 'start': task.start, 'end': task.end, 'busy': 0.0, 'max': 0.0})
+            phase['tasks'] += 1
+            phase['start'] = min(phase['start'], task.start)
+            phase['end'] = max(phase['end'], task.end)
+            phase['busy'] += task.elapsed
+            phase['max'] = max(phase['max'], task.elapsed)
+
+        return {
+            'total_ms': 0.0 if self.start is None or self.end is None else 1000 * (self.end - self.start),
+            # wall_ms: first start to last end of the phase; busy_ms: sum of its task durations
+            'phases': {name: {'tasks': phase['tasks'],
+                              'wall_ms': 1000 * (phase['end'] - phase['start']),
+                              'busy_ms': 1000 * phase['busy'],
+                              'max_ms': 1000 * phase['max']}
+                       for name, phase in phases.items()},
+            'tasks': {task.name: 1000 * task.elapsed for task in tasks},
+        }
+
+    def printTimings(self):
+        timings = self.getTimings()
+        print(f"Bootstrap finished in {timings['total_ms'] / 1000:.1f}s")
+        for name, phase in timings['phases'].items():
+            print(f"  {name:<12} {phase['tasks']:>3} task(s)  wall {phase['wall_ms'] / 1000:7.2f}s  busy {phase['busy_ms'] / 1000:7.2f}s  max {phase['max_ms'] / 1000:7.2f}s")
@@ -0,0 +1,181 @@
+#
+# Asynchronous flow programming queue in front of the SDNFlowClient.
+#
+# Controllers enqueue flow intents and return immediately; a small pool of worker threads
+# sends them to the SDN controller in batches. A newer intent for the same (dpid, priority, match)
+# replaces the pending one, whose callback then gets the newer intent's result. Intents of the same
+# switch are applied in the order they were enqueued, and a switch never has more than one batch
+# in flight.
+#
+import json
+import time
+import threading
+from collections import OrderedDict, deque
+
+class FlowIntent:
+
+    def __init__(self, cmd, payload, onDone=None):
+        self.cmd = cmd
+        self.payload = payload
+        self.onDone = onDone # callback(ok)
+        self.superseded = [] # callbacks of the pending intents this one replaced, called with its result
+        self.dpid = payload['dpid']
+        self.key = (self.dpid, payload.get('priority', 0), json.dumps(payload.get('match', {}), sort_keys=True))
+        self.enqueuedAt = time.perf_counter()
+
+class FlowQueue:
+
+    LATENCY_SAMPLES = 1024
+
+    def __init__(self, sdnClient, workers=4, batchSize=64):
+        self.sdnClient = sdnClient
+        self.batchSize = batchSize
+
+        self.cond = threading.Condition()
+        self.pending = OrderedDict() # {key: FlowIntent}, in enqueue order
+        self.inFlightDpids = set()
+        self.inFlight = 0
+        self.running = True
+
+        # Metrics
+        self.enqueued = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.failed = 0
+        self.batches = 0
+        self.latencies = deque(maxlen=self.LATENCY_SAMPLES) # seconds from enqueue to reply
+
+        self.threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self.__worker, name=f'flow-queue-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def enqueue(self, cmd, payload, onDone=None):
+        intent = FlowIntent(cmd, payload, onDone)
+        with self.cond:
+            previous = self.pending.pop(intent.key, None)
+            if previous is not None:
+                # Superseded before being sent: it is never sent, its callback waits for the newer intent
+                self.coalesced += 1
+                intent.superseded = previous.superseded + ([previous.onDone] if previous.onDone is not None else [])
+            self.pending[intent.key] = intent
+            self.enqueued += 1
+            self.cond.notify()
+
+    def enqueueMany(self, flowMods, onDone=None):
+        # Enqueue a list of (cmd, payload); onDone(ok) is called once, after all of them complete
+        if onDone is None:
+            for (cmd, payload) in flowMods:
+                self.enqueue(cmd, payload)
+            return
+
+        remaining = [len(flowMods), True]
+        lock = threading.Lock()
+        def done(ok):
+            with lock:
+                remaining[0] -= 1
+                remaining[1] = remaining[1] and ok
+                finished = remaining[0] == 0
+            if finished:
+                onDone(remaining[1])
+
+        if len(flowMods) == 0:
+            onDone(True)
+        for (cmd, payload) in flowMods:
+            self.enqueue(cmd, payload, done)
+
+    def __takeBatch(self):
+        # Intents of switches without a batch in flight, keeping the per-switch order
+        batch = []
+        skippedDpids = set()
+        for key, intent in list(self.pending.items()):
+            if intent.dpid in self.inFlightDpids or intent.dpid in skippedDpids:
+                skippedDpids.add(intent.dpid)
+                continue
+            batch.append(intent)
+            del self.pending[key]
+            if len(batch) == self.batchSize:
+                # Whatever is left of this switch must wait for the batch
+                break
+        dpids = set(intent.dpid for intent in batch)
+        self.inFlightDpids.update(dpids)
+        return batch, dpids
+
+    def __worker(self):
+        while True:
+            with self.cond:
+                batch = []
+                while self.running:
+                    batch, dpids = self.__takeBatch()
+                    if len(batch) > 0:
+                        break
+                    self.cond.wait()
+                if len(batch) == 0:
+                    return
+                self.inFlight += len(batch)
+
+            try:
+                results = self.sdnClient.modFlows([(intent.cmd, intent.payload) for intent in batch])
+            except Exception as e:
+                print(f"Error programming {len(batch)} flows: {e}")
+                results = [False] * len(batch)
+
+            now = time.perf_counter()
+            with self.cond:
+                self.batches += 1
+                self.inFlight -= len(batch)
+                self.inFlightDpids.difference_update(dpids)
+                for intent, ok in zip(batch, results):
+                    self.latencies.append(now - intent.enqueuedAt)
+                    if ok:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+                self.cond.notify_all()
+
+            for intent, ok in zip(batch, results):
+                if intent.onDone is not None:
+                    intent.onDone(ok)
+                for onDone in intent.superseded:
+                    onDone(ok)
+
+    def flush(self, timeout=None):
+        # Wait until every enqueued intent has been answered. Returns False on timeout.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while len(self.pending) > 0 or self.inFlight > 0:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+        return True
+
+    def getMetrics(self):
+        with self.cond:
+            latencies = sorted(self.latencies)
+            metrics = {
+                'enqueued': self.enqueued,
+                'coalesced': self.coalesced,
+                'completed': self.completed,
+                'failed': self.failed,
+                'pending': len(self.pending),
+                'in_flight': self.inFlight,
+                'batches': self.batches,
+            }
+        if len(latencies) > 0:
+            metrics['latency_ms'] = {
+                'mean': 1000 * sum(latencies) / len(latencies),
+                'p50': 1000 * latencies[len(latencies) // 2],
+                'p95': 1000 * latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                'max': 1000 * latencies[-1],
+            }
+        return metrics
+
+    def stop(self, timeout=5):
+        self.flush(timeout)
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
@@ -0,0 +1,172 @@
+#
+# Model of the flows installed on the AP switches, kept in step with the SDN calls in Scenario.
+#
+# Two kinds of flows exist on an AP switch (dpid):
+#   - AP redirect flows (priority 10): all traffic of the AP goes to one node. A new redirect
+#     replaces the previous one, so an AP has at most one.
+#   - Vehicle flows (priority 100): traffic of one car at that AP goes to one node. A new flow
+#     for the same car and AP replaces the previous one.
+# Deleting the flows of an AP (non-strict delete on in_port) removes both kinds from its switch.
+# Node ids and AP ids are kept as strings, car ids as ints.
+#
+import threading
+
+class FlowTable:
+
+    def __init__(self, getDpid):
+        self.getDpid = getDpid # ap_id -> dpid
+        self.lock = threading.Lock()
+
+        self.apFlows = {} # {ap_id: node_id}
+        self.apsByNode = {} # {node_id: set(ap_id)}
+        self.vehicleFlows = {} # {car_id: {ap_id: node_id}}
+        self.carsByAp = {} # {ap_id: set(car_id)}
+        self.apByDpid = {} # {dpid: ap_id}
+
+    def __len__(self):
+        with self.lock:
+            return len(self.apFlows) + sum(len(flows) for flows in self.vehicleFlows.values())
+
+    def __track(self, ap_id):
+        self.apByDpid[self.getDpid(ap_id)] = ap_id
+
+    def __setApFlow(self, ap_id, node_id):
+        previous = self.apFlows.get(ap_id, None)
+        if previous is not None:
+            self.apsByNode[previous].discard(ap_id)
+            if len(self.apsByNode[previous]) == 0:
+                del self.apsByNode[previous]
+        self.apFlows[ap_id] = node_id
+        self.apsByNode.setdefault(node_id, set()).add(ap_id)
+        self.__track(ap_id)
+        return previous
+
+    def __removeApFlow(self, ap_id, node_id=None):
+        current = self.apFlows.get(ap_id, None)
+        if current is None or (node_id is not None and current != node_id):
+            return False
+        del self.apFlows[ap_id]
+        self.apsByNode[current].discard(ap_id)
+        if len(self.apsByNode[current]) == 0:
+            del self.apsByNode[current]
+        return True
+
+    def __setVehicleFlow(self, car_id, ap_id, node_id):
+        flows = self.vehicleFlows.setdefault(car_id, {})
+        previous = flows.get(ap_id, None)
+        flows[ap_id] = node_id
+        self.carsByAp.setdefault(ap_id, set()).add(car_id)
+        self.__track(ap_id)
+        return previous
+
+    def __removeVehicleFlow(self, car_id, ap_id, node_id=None):
+        flows = self.vehicleFlows.get(car_id, {})
+        current = flows.get(ap_id, None)
+        if current is None or (node_id is not None and current != node_id):
+            return False
+        del flows[ap_id]
+        if len(flows) == 0:
+            del self.vehicleFlows[car_id]
+        self.carsByAp[ap_id].discard(car_id)
+        if len(self.carsByAp[ap_id]) == 0:
+            del self.carsByAp[ap_id]
+        return True
+
+    def setApFlow(self, ap_id, node_id):
+        # Returns the node the AP was redirected to before (None if it was not)
+        with self.lock:
+            return self.__setApFlow(str(ap_id), str(node_id))
+
+    def setVehicleFlow(self, car_id, ap_id, node_id):
+        # Returns the node of the car's previous flow at the AP (None if it had none)
+        with self.lock:
+            return self.__setVehicleFlow(car_id, str(ap_id), str(node_id))
+
+    def removeApFlow(self, ap_id, node_id=None):
+        # Remove the redirect of an AP (only if it still points to node_id, when given)
+        with self.lock:
+            return self.__removeApFlow(str(ap_id), None if node_id is None else str(node_id))
+
+    def removeVehicleFlow(self, car_id, ap_id, node_id=None):
+        with self.lock:
+            return self.__removeVehicleFlow(car_id, str(ap_id), None if node_id is None else str(node_id))
+
+    def restoreApFlow(self, ap_id, node_id, previous):
+        # Undo setApFlow(ap_id, node_id) that the switch refused: back to the previous node (None: no
+        # redirect), only if the entry still points to node_id
+        ap_id = str(ap_id)
+        with self.lock:
+            if self.apFlows.get(ap_id, None) != str(node_id):
+                return False
+            if previous is None:
+                return self.__removeApFlow(ap_id)
+            self.__setApFlow(ap_id, str(previous))
+            return True
+
+    def restoreVehicleFlow(self, car_id, ap_id, node_id, previous):
+        # Same as restoreApFlow, for setVehicleFlow
+        ap_id = str(ap_id)
+        with self.lock:
+            if self.vehicleFlows.get(car_id, {}).get(ap_id, None) != str(node_id):
+                return False
+            if previous is None:
+                return self.__removeVehicleFlow(car_id, ap_id)
+            self.__setVehicleFlow(car_id, ap_id, str(previous))
+            return True
+
+    def getApFlows(self, ap_id):
+        # (redirect node or None, {car_id: node_id}) of the AP, see clearAp
+        ap_id = str(ap_id)
+        with self.lock:
+            return (self.apFlows.get(ap_id, None),
+                    {car_id: self.vehicleFlows[car_id][ap_id] for car_id in self.carsByAp.get(ap_id, ())})
+
+    def clearAp(self, ap_id, flows=None):
+        # Every flow of the AP's switch was deleted. With flows (getApFlows when the delete was sent),
+        # only those are removed: the flows set since then were installed after the delete.
+        ap_id = str(ap_id)
+        with self.lock:
+            if flows is None:
+                flows = (self.apFlows.get(ap_id, None), {car_id: None for car_id in self.carsByAp.get(ap_id, ())})
+            node_id, vehicles = flows
+            if node_id is not None:
+                self.__removeApFlow(ap_id, node_id)
+            for car_id, car_node_id in vehicles.items():
+                self.__removeVehicleFlow(car_id, ap_id, car_node_id)
+
+    def getApNode(self, ap_id, default=None):
+        # Node the AP's traffic is redirected to
+        with self.lock:
+            return self.apFlows.get(str(ap_id), default)
+
+    def hasApFlow(self, ap_id, node_id):
+        with self.lock:
+            return self.apFlows.get(str(ap_id), None) == str(node_id)
+
+    def getApsOfNode(self, node_id):
+        with self.lock:
+            return sorted(self.apsByNode.get(str(node_id), ()))
+
+    def getVehicleFlows(self, car_id):
+        # [{'ap': ap_id, 'node': node_id}], in installation order
+        with self.lock:
+            return [{'ap': ap_id, 'node': node_id} for ap_id, node_id in self.vehicleFlows.get(car_id, {}).items()]
+
+    def getCarsAtAp(self, ap_id):
+        with self.lock:
+            return sorted(self.carsByAp.get(str(ap_id), ()))
+
+    def getFlowsOfDpid(self, dpid):
+        # {'ap': ap_id, 'node': redirect node or None, 'vehicles': {car_id: node_id}}
+        with self.lock:
+            ap_id = self.apByDpid.get(dpid, None)
+            if ap_id is None:
+                return None
+            return {'ap': ap_id,
+                    'node': self.apFlows.get(ap_id, None),
+                    'vehicles': {car_id: self.vehicleFlows[car_id][ap_id] for car_id in self.carsByAp.get(ap_id, ())}}
+
+    def toDict(self):
+        with self.lock:
+            return {'aps': dict(self.apFlows),
+                    'vehicles': {car_id: dict(flows) for car_id, flows in self.vehicleFlows.items()}}
@@ -0,0 +1,56 @@
+#
+# Closed-form ray/circle geometry used to find where a moving car leaves an AP's coverage disc.
+#
+# A car at p moving along d leaves the disc (c, r) at p + t*u, with u = d/|d| and t the
+# positive root of |p + t*u - c| = r:  t = -b + sqrt(b^2 - k),  b = (p-c).u,  k = |p-c|^2 - r^2
+#
+import math
+import numpy as np
+
+def rayCircleExit(x, y, dx, dy, cx, cy, radius):
+    # Returns (distance, (exit_x, exit_y)) for a single car.
+    # A car outside the disc gets distance 0; a car that is not moving gets the
+    # distance left to the border (radius - distance to the centre) and its own position.
+    rx = x - cx
+    ry = y - cy
+    speed = math.hypot(dx, dy)
+    if speed == 0:
+        return (radius - math.hypot(rx, ry), (x, y))
+
+    k = rx * rx + ry * ry - radius * radius
+    if k > 0:
+        return (0, (x, y))
+
+    ux = dx / speed
+    uy = dy / speed
+    b = rx * ux + ry * uy
+    t = -b + math.sqrt(b * b - k)
+    return (t, (x + t * ux, y + t * uy))
+
+def rayCircleExitBatch(positions, directions, centers, radius):
+    # Vectorised rayCircleExit for all cars at once.
+    # positions, directions and centers are (N, 2) arrays; rows with a NaN in any of them
+    # (car without a position, a direction or a known AP) get distance 0.
+    # Returns (distances (N,), exit_points (N, 2)).
+    p = np.asarray(positions, dtype=float).reshape(-1, 2)
+    d = np.asarray(directions, dtype=float).reshape(-1, 2)
+    c = np.asarray(centers, dtype=float).reshape(-1, 2)
+
+    rel = p - c
+    speed = np.hypot(d[:, 0], d[:, 1])
+    moving = speed > 0
+    u = np.divide(d, speed[:, None], out=np.zeros_like(d), where=moving[:, None])
+
+    b = np.einsum('ij,ij->i', rel, u)
+    k = np.einsum('ij,ij->i', rel, rel) - radius * radius
+    inside = k <= 0
+    t = -b + np.sqrt(np.maximum(b * b - k, 0))
+
+    distances = np.where(moving, np.where(inside, t, 0.0), radius - np.sqrt(np.maximum(k + radius * radius, 0)))
+    unknown = np.isnan(p).any(axis=1) | np.isnan(d).any(axis=1) | np.isnan(c).any(axis=1)
+    distances = np.where(unknown, 0.0, distances)
+
+    step = np.where(moving & inside, t, 0.0)
+    exitPoints = p + u * np.nan_to_num(step)[:, None]
+
+    return (distances, exitPoints)
@@ -0,0 +1,232 @@
+#
+# Event-driven handover scheduling for the MobilityStrategy controllers.
+#
+# Every telemetry sample gives the car's velocity (displacement over the time since its previous
+# sample). From its position, velocity and AP the scheduler predicts the time the car starts leaving
+# the AP's disc (less than threshold * range ahead, as Scenario.isLeavingAP) and keeps the predicted
+# crossings in a priority queue. A car's prediction is only recomputed when:
+#   - it changes AP
+#   - its velocity changes by more than velocityChange (relative to the predicted velocity)
+#   - it drifts from the predicted track by more than half the look-ahead distance
+#   - its crossing is inside the look-ahead window (near cars are followed sample by sample)
+# At every tick decidePredictive then only evaluates the near cars (crossing within the look-ahead
+# window, or passed while the car is still on that AP). Between ticks the controllers wake up at the
+# next predicted crossing (predictive) or as soon as a car changes AP (reactive), and only evaluate
+# the cars that just crossed or changed AP.
+#
+import copy
+import math
+import time
+import heapq
+import threading
+import numpy as np
+
+from scenarios.Geometry import rayCircleExit
+
+class HandoverScheduler:
+
+    WAKE_MARGIN = 0.01 # Seconds past a predicted crossing to wake up at, so the car is over the threshold
+    MIN_SPEED = 1.0 # m/s, floor of the speed the velocity change and drift tolerances are relative to
+
+    def __init__(self, apCenters, numCars, range=300, threshold=0.20, lookahead=2.0, velocityChange=0.25, clock=time.time):
+        self.apCenters = [tuple(center) for center in np.asarray(apCenters, dtype=float).reshape(-1, 2).tolist()]
+        self.range = range
+        self.threshold = threshold
+        self.lookahead = lookahead
+        self.velocityChange = velocityChange
+        self.clock = clock
+        self.crossings = False # Wake up at the predicted crossings instead of the handovers, set once a strategy asks for the near cars
+
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+
+        # Per car (row = car_id - 1), plain lists: one sample costs a few scalar lookups
+        self.sample = [None] * numCars # (t, x, y) of the last sample
+        self.velocity = [None] * numCars # (vx, vy) in m/s, from the last two samples
+        self.ap = [-1] * numCars
+        self.prediction = [None] * numCars # (t, x, y, vx, vy) the crossing was predicted from
+        self.generation = [0] * numCars
+
+        self.queue = [] # [(crossing, generation, row)], stale entries are skipped when popped
+        self.near = {} # {row: crossing}
+        self.handedOver = set() # Rows of the cars that changed AP since the last decision
+        self.handover = False # A car changed AP since the last decision, wake up
+        self.lastDue = -math.inf
+        self.nearDue = np.zeros(0, dtype=np.int64) # Rows the current decision evaluates
+        self.handoversDue = None # Rows of the handovers a react evaluates, None at ticks (every car)
+
+        self.samples = 0
+        self.predictions = 0
+        self.evaluations = 0
+        self.decisions = 0
+
+    def onSample(self, car_id, t, x, y, apIndex):
+        # New position of a car that moved, with its AP index (-1 or None if unknown)
+        row = car_id - 1
+        apIndex = -1 if apIndex is None else int(apIndex)
+        with self.lock:
+            self.samples += 1
+            previous = self.sample[row]
+            if previous is not None and t > previous[0]:
+                self.velocity[row] = ((x - previous[1]) / (t - previous[0]), (y - previous[2]) / (t - previous[0]))
+            self.sample[row] = (t, x, y)
+
+            if apIndex != self.ap[row]:
+                self.ap[row] = apIndex
+                self.near.pop(row, None)
+                if not self.crossings:
+                    self.handedOver.add(row)
+                    self.handover = True
+                    self.wakeup.set()
+                self.__predict(row, t)
+            elif row in self.near or self.__drifted(row, t):
+                self.__predict(row, t)
+
+    def __drifted(self, row, t):
+        # The prediction no longer holds: new velocity, or off the predicted track
+        velocity = self.velocity[row]
+        if velocity is None:
+            return False
+        prediction = self.prediction[row]
+        if prediction is None or prediction[3] is None:
+            return True
+        pt, px, py, pvx, pvy = prediction
+        tolerance = max(math.hypot(pvx, pvy), HandoverScheduler.MIN_SPEED)
+        if math.hypot(velocity[0] - pvx, velocity[1] - pvy) > self.velocityChange * tolerance:
+            return True
+        _, x, y = self.sample[row]
+        return math.hypot(x - px - pvx * (t - pt), y - py - pvy * (t - pt)) > tolerance * self.lookahead / 2
+
+    def __crossingTime(self, row, t):
+        # Time the car starts leaving its AP (t if it is already leaving), inf if it never does
+        ap = self.ap[row]
+        velocity = self.velocity[row]
+        if ap < 0 or velocity is None:
+            return math.inf
+        vx, vy = velocity
+        _, x, y = self.sample[row]
+        cx, cy = self.apCenters[ap]
+        distance, _ = rayCircleExit(x, y, vx, vy, cx, cy, self.range)
+        limit = self.threshold * self.range
+        if 0 < distance <= limit:
+            return t
+        speed = math.hypot(vx, vy)
+        if distance > limit and speed > 0:
+            return t + (distance - limit) / speed
+        return math.inf
+
+    def __predict(self, row, t):
+        self.predictions += 1
+        _, x, y = self.sample[row]
+        velocity = self.velocity[row] or (None, None)
+        self.prediction[row] = (t, x, y, velocity[0], velocity[1])
+        crossing = self.__crossingTime(row, t)
+        self.generation[row] += 1
+
+        if crossing <= t + self.lookahead:
+            wasNear = self.near.get(row, math.inf)
+            if crossing == t and wasNear <= t:
+                crossing = wasNear # Still leaving, since then
+            self.near[row] = crossing
+            if self.crossings and self.lastDue < crossing < wasNear:
+                self.wakeup.set() # Earlier than what the controller waits for
+        else:
+            self.near.pop(row, None)
+            if crossing < math.inf:
+                heapq.heappush(self.queue, (crossing, self.generation[row], row))
+                if len(self.queue) > 4 * len(self.generation) + 64:
+                    self.__compact()
+
+    def __compact(self):
+        # Drop the stale entries
+        self.queue = [entry for entry in self.queue if entry[1] == self.generation[entry[2]]]
+        heapq.heapify(self.queue)
+
+    def __validTop(self):
+        while len(self.queue) > 0 and self.queue[0][1] != self.generation[self.queue[0][2]]:
+            heapq.heappop(self.queue)
+        return self.queue[0] if len(self.queue) > 0 else None
+
+    def due(self, now=None, react=False):
+        # Start of a decision: the crossings inside the look-ahead window become near. A tick evaluates
+        # every near car, a react only the ones that crossed and the handovers since the last decision.
+        now = self.clock() if now is None else now
+        with self.lock:
+            top = self.__validTop()
+            while top is not None and top[0] <= now + self.lookahead:
+                heapq.heappop(self.queue)
+                self.near[top[2]] = top[0]
+                top = self.__validTop()
+            if react:
+                rows = [row for row, crossing in self.near.items() if self.lastDue < crossing <= now]
+                self.handoversDue = np.array(sorted(self.handedOver), dtype=np.int64)
+            else:
+                rows = list(self.near.keys())
+                self.handoversDue = None
+            self.nearDue = np.array(sorted(rows), dtype=np.int64)
+            self.handedOver.clear()
+            self.handover = False
+            self.lastDue = now
+
+    def nearRows(self):
+        # Rows of the near cars the current decision evaluates, ascending
+        with self.lock:
+            self.crossings = True
+            self.evaluations += len(self.nearDue)
+            return self.nearDue
+
+    def handoverRows(self):
+        # Rows of the cars that changed AP a react evaluates, None at ticks (every car)
+        with self.lock:
+            if self.handoversDue is not None:
+                self.evaluations += len(self.handoversDue)
+            return self.handoversDue
+
+    def extrapolate(self, snapshot, now=None):
+        # Copy of the snapshot with the near cars moved from their last sample along their velocity to now.
+        # The snapshot itself keeps the measured positions (the state writer serialises it later).
+        now = self.clock() if now is None else now
+        with self.lock:
+            moved = [(row, self.sample[row], self.velocity[row]) for row in self.near if self.velocity[row] is not None]
+        moved = [(row, sample, velocity) for row, sample, velocity in moved if now > sample[0]]
+        if len(moved) == 0:
+            return snapshot
+        snapshot = copy.copy(snapshot)
+        snapshot.position = snapshot.position.copy()
+        for row, (t, x, y), (vx, vy) in moved:
+            snapshot.position[row] = (x + vx * (now - t), y + vy * (now - t))
+        return snapshot
+
+    def nextWakeup(self):
+        # Time of the next decision the controller should make between ticks, None if none is due
+        with self.lock:
+            if self.handover:
+                return -math.inf
+            if not self.crossings:
+                return None
+            upcoming = [crossing for crossing in self.near.values() if crossing > self.lastDue]
+            top = self.__validTop()
+            if top is not None:
+                upcoming.append(top[0])
+        return min(upcoming) + HandoverScheduler.WAKE_MARGIN if len(upcoming) > 0 else None
+
+    def waitUntil(self, deadline):
+        # Sleep until the next wakeup or the deadline, True if woken up for a decision before the deadline
+        while True:
+            now = self.clock()
+            if now >= deadline:
+                return False
+            wake = self.nextWakeup()
+            if wake is not None and wake <= now:
+                return True
+            self.wakeup.wait((deadline if wake is None else min(deadline, wake)) - now)
+            self.wakeup.clear()
+
+    def decided(self, count):
+        with self.lock:
+            self.decisions += count
+
+    def getMetrics(self):
+        with self.lock:
+            return {'samples': self.samples, 'predictions': self.predictions, 'evaluations': self.evaluations,
+                    'decisions': self.decisions, 'near': len(self.near), 'queued': len(self.queue)}
@@ -0,0 +1,334 @@
+#
+# Generator of matching mininet-wifi, kind, scenario and SUMO configs for scale experiments.
+#
+# A layout spec (JSON) describes the experiment:
+#   {
+#       "name": "grid-100",
+#       "scenario": "5_MobilityStrategy",   # Selects the scenario in app.py (config file names carry it)
+#       "layout": "grid",                   # grid | hex | road
+#       "aps": 100,                         # N
+#       "spacing": 400,                     # Meters between neighbouring APs (minimum separation for road)
+#       "net": "sumo/manhattan/manhattan.net.xml",  # road: the SUMO network the APs are placed along
+#       "workers": 9,                       # M
+#       "assignment": "blocks",             # AP -> worker: blocks | round-robin | kmeans
+#       "backhaul": "tree",                 # linkTo: chain | tree (minimum spanning tree) | mesh (neighbours)
+#       "vehicles": 500,                    # K
+#       "departures": {"mode": "uniform", "begin": 0, "period": 1.0},  # uniform | poisson | batch
+#       "seed": 1
+#   }
+# and the generator writes to the output directory:
+#   <scenario>-<name>.json         mininet-wifi config (APs, cars, SUMO config, telemetry bounds)
+#   <scenario>-<name>.yaml         kind config with M workers
+#   <scenario>-<name>-config.json  scenario config for app.py
+#   <name>.sumocfg, <name>.rou.xml SUMO config and K vehicle trips with their departure times
+#   <name>.nod.xml, <name>.edg.xml grid and hex: road grid over the APs, built into <name>.net.xml
+#                                  with netconvert when it is installed
+#
+# Only chain and tree are loop-free. The OVSAPs bridge the backhaul without STP, so mininetController
+# refuses to start a mesh (its broadcasts would loop); mesh configs are for Topology and headless runs.
+#
+#   python3 -m scenarios.LayoutGenerator <layout spec> [output dir]
+#
+import os
+import sys
+import json
+import math
+import yaml
+import shutil
+import subprocess
+import numpy as np
+import xml.etree.ElementTree as ElementTree
+
+LAYOUTS = ['grid', 'hex', 'road']
+ASSIGNMENTS = ['blocks', 'round-robin', 'kmeans']
+BACKHAULS = ['chain', 'tree', 'mesh']
+CHANNELS = ['1', '6', '11']
+
+CLUSTER_NAMES = {'1_POC_Replication': 'poc-replication', '2_POC_Migration': 'poc-migration', '3_StreamingService': 'streaming-service',
+                 '4_LoadBalancing': 'load-balancing', '5_MobilityStrategy': 'mobility-strategy'}
+SDN_CONTROLLER = 'sdnRyu/simple_switch_rest_13.py sdnRyu/ofctl_rest.py'
+
+def gridPositions(numAps, spacing, origin=0.0):
+    # Square grid, row by row
+    side = math.ceil(math.sqrt(numAps))
+    return np.array([(origin + (i % side) * spacing, origin + (i // side) * spacing) for i in range(numAps)], dtype=float)
+
+def hexPositions(numAps, spacing, origin=0.0):
+    # Hexagonal packing: every other row shifted by half the spacing, rows sqrt(3)/2 apart
+    side = math.ceil(math.sqrt(numAps))
+    rowHeight = spacing * math.sqrt(3) / 2
+    return np.array([(origin + (i % side) * spacing + (spacing / 2 if (i // side) % 2 else 0), origin + (i // side) * rowHeight)
+                     for i in range(numAps)], dtype=float)
+
+def readNetEdges(netPath):
+    # {edge_id: [(x, y)]} of the drivable edges of a SUMO network (internal edges left out)
+    edges = {}
+    for _, element in ElementTree.iterparse(netPath, events=('end',)):
+        if element.tag != 'edge':
+            continue
+        if element.get('function', None) is None:
+            lane = element.find('lane')
+            if lane is not None and lane.get('shape', None) is not None:
+                edges[element.get('id')] = [tuple(float(c) for c in point.split(',')[0:2]) for point in lane.get('shape').split()]
+        element.clear()
+    return edges
+
+def roadPositions(numAps, spacing, edges, rng, attempts=100):
+    # Random points along the roads, at least 3/4 of the spacing apart (fewer APs if the network is full)
+    segments = [(a, b) for shape in edges.values() for a, b in zip(shape, shape[1:]) if a != b]
+    starts = np.array([a for a, _ in segments], dtype=float)
+    ends = np.array([b for _, b in segments], dtype=float)
+    lengths = np.linalg.norm(ends - starts, axis=1)
+    weights = lengths / lengths.sum()
+
+    minDistance = 0.75 * spacing
+    positions = []
+    for _ in range(numAps * attempts):
+        if len(positions) == numAps:
+            break
+        i = rng.choice(len(segments), p=weights)
+        point = starts[i] + rng.random() * (ends[i] - starts[i])
+        if len(positions) == 0 or np.min(np.linalg.norm(np.array(positions) - point, axis=1)) >= minDistance:
+            positions.append(point)
+    if len(positions) < numAps:
+        print(f"Only {len(positions)} of {numAps} APs fit {minDistance:.0f} m apart along the roads")
+    return np.array(positions, dtype=float)
+
+def assignWorkers(positions, numWorkers, policy, rng, iterations=20):
+    # Worker id (1..M) of every AP
+    n = len(positions)
+    numWorkers = max(1, min(numWorkers, n))
+    if policy == 'blocks':
+        return [i * numWorkers // n + 1 for i in range(n)]
+    if policy == 'round-robin':
+        return [i % numWorkers + 1 for i in range(n)]
+    if policy == 'kmeans':
+        # Lloyd's iterations from random APs: every worker serves a compact region
+        centers = positions[rng.choice(n, numWorkers, replace=False)]
+        for _ in range(iterations):
+            labels = np.argmin(((positions[:, None, :] - centers[None]) ** 2).sum(axis=2), axis=1)
+            for k in range(numWorkers):
+                if np.any(labels == k):
+                    centers[k] = positions[labels == k].mean(axis=0)
+        # Workers numbered in region order (bottom left first), as with blocks
+        order = np.lexsort((centers[:, 0], centers[:, 1]))
+        rank = {int(k): r + 1 for r, k in enumerate(order)}
+        return [rank[int(label)] for label in labels]
+    raise ValueError(f"Unknown assignment '{policy}', expected one of {ASSIGNMENTS}")
+
+def backhaulLinks(positions, policy, spacing):
+    # {ap index: [linked ap indexes]}, every link listed once
+    n = len(positions)
+    if policy == 'chain':
+        return {i: [i + 1] for i in range(n - 1)}
+    if policy == 'tree':
+        # Minimum spanning tree (Prim), every AP links to its parent
+        inTree = np.zeros(n, dtype=bool)
+        distance = np.full(n, np.inf)
+        parent = np.full(n, -1)
+        distance[0] = 0
+        links = {}
+        for _ in range(n):
+            i = int(np.argmin(np.where(inTree, np.inf, distance)))
+            inTree[i] = True
+            if parent[i] >= 0:
+                links[i] = [int(parent[i])]
+            closer = np.linalg.norm(positions - positions[i], axis=1)
+            update = ~inTree & (closer < distance)
+            distance[update] = closer[update]
+            parent[update] = i
+        return links
+    if policy == 'mesh':
+        # Every pair of APs closer than 1.5 spacings (neighbours of the grid or hex layout)
+        links = {}
+        for i in range(n):
+            near = np.flatnonzero(np.linalg.norm(positions[i + 1:] - positions[i], axis=1) <= 1.5 * spacing) + i + 1
+            if len(near) > 0:
+                links[i] = near.tolist()
+        return links
+    raise ValueError(f"Unknown backhaul '{policy}', expected one of {BACKHAULS}")
+
+def assignChannels(positions, spacing):
+    # Greedy: the channel least used by the APs within two spacings
+    channels = []
+    for i in range(len(positions)):
+        near = np.flatnonzero(np.linalg.norm(positions[:i] - positions[i], axis=1) <= 2 * spacing)
+        used = [channels[j] for j in near]
+        channels.append(min(CHANNELS, key=lambda channel: (used.count(channel), CHANNELS.index(channel))))
+    return channels
+
+def accessPoints(positions, workers, links, channels=None):
+    # AP entries of the mininet config
+    aps = []
+    for i, (x, y) in enumerate(positions.tolist()):
+        ap = {'id': str(i + 1), 'position': f'{round(x)},{round(y)},0', 'channel': channels[i] if channels else CHANNELS[i % 3]}
+        if len(links.get(i, [])) > 0:
+            ap['linkTo'] = ','.join(str(j + 1) for j in links[i])
+        ap['kindNode'] = str(workers[i])
+        aps.append(ap)
+    return aps
+
+def kindConfig(clusterName, numWorkers):
+    return {
+        'kind': 'Cluster',
+        'apiVersion': 'kind.x-k8s.io/v1alpha4',
+        'name': clusterName,
+        'networking': {'apiServerAddress': '127.0.0.1', 'apiServerPort': 6443, 'podSubnet': '10.244.0.0/16', 'serviceSubnet': '10.96.0.0/12'},
+        'nodes': [{'role': 'control-plane'}] + [{'role': 'worker'} for _ in range(numWorkers)],
+    }
+
+def roadGrid(positions, spacing):
+    # Plain SUMO nodes and edges of a road grid covering the APs, one road every spacing
+    (minX, minY), (maxX, maxY) = positions.min(axis=0) - spacing / 2, positions.max(axis=0) + spacing / 2
+    columns = max(2, math.ceil((maxX - minX) / spacing) + 1)
+    rows = max(2, math.ceil((maxY - minY) / spacing) + 1)
+    nodes = {f'n{c}_{r}': (minX + c * spacing, minY + r * spacing) for c in range(columns) for r in range(rows)}
+    edges = {}
+    for c in range(columns):
+        for r in range(rows):
+            for (dc, dr) in ((1, 0), (0, 1)):
+                if c + dc < columns and r + dr < rows:
+                    a, b = f'n{c}_{r}', f'n{c + dc}_{r + dr}'
+                    edges[f'{a}to{b}'] = (a, b)
+                    edges[f'{b}to{a}'] = (b, a)
+    return nodes, edges
+
+def writeRoadGrid(nodes, edges, directory, name):
+    nodPath = os.path.join(directory, f'{name}.nod.xml')
+    edgPath = os.path.join(directory, f'{name}.edg.xml')
+    netPath = os.path.join(directory, f'{name}.net.xml')
+    with open(nodPath, 'w') as file:
+        file.write('<nodes>\n')
+        for nodeId, (x, y) in nodes.items():
+            file.write(f'    <node id="{nodeId}" x="{x:.2f}" y="{y:.2f}" type="priority"/>\n')
+        file.write('</nodes>\n')
+    with open(edgPath, 'w') as file:
+        file.write('<edges>\n')
+        for edgeId, (a, b) in edges.items():
+            file.write(f'    <edge id="{edgeId}" from="{a}" to="{b}" numLanes="1" speed="13.89"/>\n')
+        file.write('</edges>\n')
+
+    command = ['netconvert', '--node-files', nodPath, '--edge-files', edgPath, '--output-file', netPath, '--no-turnarounds', 'true']
+    if shutil.which('netconvert') is None:
+        print(f"netconvert not found, build the network with: {' '.join(command)}")
+    else:
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    return netPath
+
+def departureTimes(numVehicles, schedule, rng):
+    mode = schedule.get('mode', 'uniform')
+    begin = float(schedule.get('begin', 0.0))
+    period = float(schedule.get('period', 1.0))
+    if mode == 'uniform':
+        return [begin + i * period for i in range(numVehicles)]
+    if mode == 'poisson':
+        return (begin + np.cumsum(rng.exponential(period, numVehicles))).tolist()
+    if mode == 'batch':
+        return [begin] * numVehicles
+    raise ValueError(f"Unknown departure mode '{mode}', expected uniform, poisson or batch")
+
+def writeRoutes(path, edgeIds, departures, rng):
+    # One trip per vehicle between random edges, routed by SUMO when it loads them
+    with open(path, 'w') as file:
+        file.write('<routes>\n')
+        file.write('    <vType id="car" vClass="passenger"/>\n')
+        for i, depart in enumerate(departures):
+            origin, destination = rng.choice(len(edgeIds), 2, replace=len(edgeIds) < 2)
+            file.write(f'    <trip id="{i}" type="car" depart="{depart:.2f}" from="{edgeIds[origin]}" to="{edgeIds[destination]}" departLane="best"/>\n')
+        file.write('</routes>\n')
+
+def sumoPath(path, directory):
+    # Relative to the sumocfg when the file is next to it, absolute otherwise
+    relative = os.path.relpath(os.path.abspath(path), directory)
+    return os.path.abspath(path) if relative.startswith('..') else relative
+
+def writeSumoConfig(path, netPath, routesPath):
+    directory = os.path.dirname(os.path.abspath(path))
+    with open(path, 'w') as file:
+        file.write('<configuration>\n')
+        file.write('    <input>\n')
+        file.write(f'        <net-file value="{sumoPath(netPath, directory)}"/>\n')
+        file.write(f'        <route-files value="{sumoPath(routesPath, directory)}"/>\n')
+        file.write('    </input>\n')
+        file.write('    <processing>\n')
+        file.write('        <ignore-route-errors value="true"/>\n')
+        file.write('    </processing>\n')
+        file.write('</configuration>\n')
+
+def generate(spec, directory='.'):
+    # Writes every file of the spec, returns {kind: path}
+    name = spec['name']
+    scenario = spec.get('scenario', '5_MobilityStrategy')
+    layout = spec.get('layout', 'grid')
+    numAps = int(spec['aps'])
+    spacing = float(spec.get('spacing', 400))
+    numWorkers = int(spec.get('workers', 9))
+    numVehicles = int(spec.get('vehicles', 100))
+    rng = np.random.default_rng(spec.get('seed', None))
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout '{layout}', expected one of {LAYOUTS}")
+    os.makedirs(directory, exist_ok=True)
+
+    edges = None
+    if layout == 'grid':
+        positions = gridPositions(numAps, spacing, spacing / 2)
+    elif layout == 'hex':
+        positions = hexPositions(numAps, spacing, spacing / 2)
+    else:
+        edges = readNetEdges(spec['net'])
+        positions = roadPositions(numAps, spacing, edges, rng)
+
+    workers = assignWorkers(positions, numWorkers, spec.get('assignment', 'blocks'), rng)
+    links = backhaulLinks(positions, spec.get('backhaul', 'tree'), spacing)
+    if spec.get('backhaul', 'tree') == 'mesh':
+        print("Warning: A mesh backhaul has loops, its mininet config only serves Topology and headless runs")
+    aps = accessPoints(positions, workers, links, assignChannels(positions, spacing))
+
+    # Roads: the given network, or a grid over the APs
+    if edges is not None:
+        netPath = spec['net']
+        edgeIds = sorted(edges)
+    else:
+        nodes, gridEdges = roadGrid(positions, spacing)
+        netPath = writeRoadGrid(nodes, gridEdges, directory, name)
+        edgeIds = list(gridEdges)
+    routesPath = os.path.join(directory, f'{name}.rou.xml')
+    writeRoutes(routesPath, edgeIds, departureTimes(numVehicles, spec.get('departures', {}), rng), rng)
+    sumoConfigPath = os.path.join(directory, f'{name}.sumocfg')
+    writeSumoConfig(sumoConfigPath, netPath, routesPath)
+
+    (minX, minY), (maxX, maxY) = positions.min(axis=0), positions.max(axis=0)
+    mininetConfig = {
+        'sumoConfig': os.path.abspath(sumoConfigPath),
+        'telemetry': {'enabled': True, 'min_x': math.floor(minX - spacing), 'max_x': math.ceil(maxX + spacing),
+                      'min_y': math.floor(minY - spacing), 'max_y': math.ceil(maxY + spacing)},
+        'cars': {'count': numVehicles},
+        'aps': aps,
+        'propagationModel': {'model': 'logDistance', 'exp': 3},
+    }
+    paths = {
+        'mininet-config': os.path.join(directory, f'{scenario}-{name}.json'),
+        'kind-config': os.path.join(directory, f'{scenario}-{name}.yaml'),
+        'scenario-config': os.path.join(directory, f'{scenario}-{name}-config.json'),
+        'sumo-config': sumoConfigPath,
+        'routes': routesPath,
+        'net': netPath,
+    }
+    with open(paths['mininet-config'], 'w') as file:
+        json.dump(mininetConfig, file, indent=4)
+    with open(paths['kind-config'], 'w') as file:
+        yaml.safe_dump(kindConfig(CLUSTER_NAMES.get(scenario, 'kind'), max(workers)), file, sort_keys=False)
+    with open(paths['scenario-config'], 'w') as file:
+        json.dump({'kind-config': paths['kind-config'], 'mininet-config': paths['mininet-config'], 'sdn-controller': SDN_CONTROLLER}, file, indent=4)
+    return paths
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python3 -m scenarios.LayoutGenerator <layout spec> [output dir]")
+        sys.exit(1)
+    with open(sys.argv[1], 'r') as file:
+        spec = json.load(file)
+    outputDir = sys.argv[2] if len(sys.argv) > 2 else '.'
+
+    for kind, path in generate(spec, outputDir).items():
+        print(f"{kind:16} {path}")
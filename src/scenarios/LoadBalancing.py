@@ -1,14 +1,20 @@
 from scenarios.Scenario import Scenario
+from scenarios.TelemetryTailer import TelemetryTailer
+from scenarios.MetricsSink import MetricsSink
+from scenarios.StateWriter import StateWriter
+from scenarios.VehicleStore import VehicleStore, groupInOrder
 
 import threading
 import time
 import os
-import json
-from datetime import datetime
+import numpy as np
 
 class LoadBalancing(Scenario):
 
     LOG_FILE = 'load-balance.log'
+    LOG_INTERVAL = 1 # Seconds between writes of the log
+    LOG_VERBOSITY = StateWriter.DEBUG # DEBUG also logs the whole vehicle data every tick
+    AP_RANGE = 300 # Radius of an AP's coverage
 
     clusterName = 'load-balancing'
     appName = 'mysimpleserver'
@@ -20,148 +26,135 @@ class LoadBalancing(Scenario):
 
     STOP_SIMULATION = False
 
-    # Visualization structure: for each time t, store the load of each node
-    visualization = {}
-    # {
-    #   t_0: {
-    #       node_id: load,
-    #   },
-    # }
+    # Visualization output: for each time t, one line with the load of each node (see MetricsSink)
+    VISUALIZATION_FILE = 'visualization.json'
+    METRICS_FILE = 'visualization.jsonl'
+    # {"t": 0, node_id: load, ...}
+
+    # Vehicle state: position, direction, associated AP and using node of every car (see VehicleStore)
+    vehicleStore = None
 
-    # Vehicle position dictionary and its lock
-    vehicleDataLock = threading.Lock()
-    vehicleData = {}
+    # Flows installed for each vehicle: see Scenario.flowTable
     #
     # {
-    #   1: {
-    #       "position": (x, y),
-    #       "direction": (dx, dy),
-    #       "associated_ap": 1,
-    #       "using_node": 1,
-    #       "flows" : [
-    #           {
-    #               'ap': 1,
-    #               'node': 1,
-    #           },
-    #           ...
-    #       ]
-    #   },
+    #   1: [
+    #       {
+    #           'ap': 1,
+    #           'node': 1,
+    #       },
+    #       ...
+    #   ],
     # }
 
-    def __init__(self, kindCfg, mininetCfg, sdnController):
-        super().__init__(kindCfg, mininetCfg, sdnController, force_restart=False)
+    def __init__(self, kindCfg, mininetCfg, sdnController, warm_pool=False, output_dir='.', record=None, profile=False, backends=None):
+        super().__init__(kindCfg, mininetCfg, sdnController, force_restart=False, warm_pool=warm_pool, output_dir=output_dir, record=record, profile=profile, backends=backends)
+        LoadBalancing.vehicleStore = VehicleStore(self.numCars)
+        LoadBalancing.vehicleStore.lock = self.profiler.wrapLock('vehicle_store', LoadBalancing.vehicleStore.lock)
+        self.metricsSink = MetricsSink(Scenario.outputPath(self, LoadBalancing.METRICS_FILE))
+        self.stateWriter = StateWriter(Scenario.outputPath(self, LoadBalancing.LOG_FILE), interval=LoadBalancing.LOG_INTERVAL, verbosity=LoadBalancing.LOG_VERBOSITY)
+        self.profiler.writer = self.stateWriter
 
-    def needToUpdateNode(self, car_id):
-        if "using_node" not in LoadBalancing.vehicleData[car_id]:
+    def getVehicleFlows(self, car_id):
+        return self.flowTable.getVehicleFlows(car_id)
+
+    def needToUpdateNode(self, car_id, x, y):
+        _, _, _, using_node = LoadBalancing.vehicleStore.get(car_id)
+        if using_node < 0:
             return True
         
         # If the ap's in the flows are not in range, update the node
-        if 'flows' in LoadBalancing.vehicleData[car_id]:
-            x,y = LoadBalancing.vehicleData[car_id]['position']
-            for flow in LoadBalancing.vehicleData[car_id]['flows']:
-                if Scenario.isAPInRange(self, x, y, flow['ap']):
-                    return False
+        for flow in LoadBalancing.getVehicleFlows(self, car_id):
+            if Scenario.isAPInRange(self, x, y, flow['ap'], self.AP_RANGE):
+                return False
 
         return True
 
     def positionTracker(self, num_cars):
         #
-        for i in range(1, num_cars + 1):
-            with LoadBalancing.vehicleDataLock:
-                LoadBalancing.vehicleData[i] = {}
-        #
-        while not LoadBalancing.STOP_SIMULATION:
-            time.sleep(1)
-            for car_id in range(1, num_cars + 1):
-                car_position_path = f'position-car{i}-mn-telemetry.txt'
-
-                if os.path.exists(car_position_path):
-                    with open(car_position_path, 'rb') as f:
-                        try:
-                            f.seek(-2, os.SEEK_END)
-                            while f.read(1) != b'\n':
-                                f.seek(-2, os.SEEK_CUR)
-                        except OSError:
-                            f.seek(0)
-                        coordinates = f.readline().decode()
-                        x, y = coordinates.strip().split(',')
-                        x = float(x)
-                        y = float(y)
-                    
-                    with LoadBalancing.vehicleDataLock:
-                        previous_position = LoadBalancing.vehicleData[car_id].get('position', None)
-                        if previous_position is None or previous_position != (x, y):
-                            if previous_position is not None:
-                                dx = x - previous_position[0]
-                                dy = y - previous_position[1]
-                                LoadBalancing.vehicleData[car_id]['direction'] = (dx, dy)
-                            LoadBalancing.vehicleData[car_id]['position'] = (x, y)
-                            LoadBalancing.vehicleData[car_id]['associated_ap'] = Scenario.getAssociatedAP(self, car_id)
-                            if self.needToUpdateNode(car_id):
-                                LoadBalancing.vehicleData[car_id]['using_node'] = Scenario.getNodeByAP(self, LoadBalancing.vehicleData[car_id]['associated_ap'])
-
-    def calculateDistanceInRange(self, car_id):
-        # If the car already has a flow for the current ap, return 0
-        if 'flows' in LoadBalancing.vehicleData[car_id]:
-            for flow in LoadBalancing.vehicleData[car_id]['flows']:
-                if flow['ap'] == LoadBalancing.vehicleData[car_id]['associated_ap']:
-                    return 0
-
-        # Calculate expected time the car will stay in range of the node
-        if 'position' not in LoadBalancing.vehicleData[car_id]:
-            return 0
-        position = LoadBalancing.vehicleData[car_id]['position']
-        x, y = position
-        
-        if 'direction' not in LoadBalancing.vehicleData[car_id]:
-            return 0
-        direction = LoadBalancing.vehicleData[car_id]['direction']
-        dx, dy = direction
-        ap = LoadBalancing.vehicleData[car_id]['associated_ap']
-
-        return Scenario.distanceInRange(self, x, y, dx, dy, ap)
-
-    def controller(self):
-        base_flows_installed = False
-        i_time = -1
-        while not LoadBalancing.STOP_SIMULATION:
-            time.sleep(1)
-            nodes_load = {} # {node: [vehicle_id,...]}
-            with LoadBalancing.vehicleDataLock:
-                with open(LoadBalancing.LOG_FILE, "a") as f:
-                    f.write(f"{datetime.now().strftime('%H:%M:%S.%f')[:-3]} : Vehicle data: {LoadBalancing.vehicleData}\n")
-                for car_id, data in LoadBalancing.vehicleData.items():
-                    if 'using_node' not in data:
-                        continue
-                    node_id = data['using_node']
-                    if node_id is None:
-                        continue
-                    if node_id not in nodes_load:
-                        nodes_load[node_id] = [car_id]
-                    else:
-                        nodes_load[node_id].append(car_id)
-            
-            with open(LoadBalancing.LOG_FILE, "a") as f:
-                f.write(f"{datetime.now().strftime('%H:%M:%S.%f')[:-3]} : Nodes load: {nodes_load}\n")
-            
-            if len(nodes_load) == 0:
+        cars = {car_id: f'car{car_id}' for car_id in range(1, num_cars + 1)}
+        tailer = TelemetryTailer(cars, self.onTelemetrySample)
+        tailer.run(lambda: LoadBalancing.STOP_SIMULATION)
+
+    def onTelemetrySample(self, car_id, t, x, y):
+        if self.recorder is not None:
+            self.recorder.sample(car_id, x, y)
+        with self.profiler.phase('sample'):
+            if LoadBalancing.vehicleStore.updatePosition(car_id, x, y):
+                associated_ap = Scenario.getAssociatedAP(self, car_id)
+                LoadBalancing.vehicleStore.setAssociatedAp(car_id, self.apIndex.indexOf(associated_ap))
+                if self.needToUpdateNode(car_id, x, y):
+                    LoadBalancing.vehicleStore.setServingNode(car_id, Scenario.getNodeByAP(self, associated_ap))
+
+    def calculateDistancesInRange(self, snapshot, car_ids):
+        # Calculate expected distance each car will stay in range of its AP
+        rows = np.asarray(car_ids, dtype=np.int64) - 1
+        distances = Scenario.distanceInRangeBatch(self, snapshot.position[rows], snapshot.direction[rows], snapshot.associatedAp[rows], self.AP_RANGE)
+
+        # If the car already has a flow for the current ap, its distance is 0
+        for i, row in enumerate(rows.tolist()):
+            ap_index = snapshot.associatedAp[row]
+            if ap_index < 0:
                 continue
+            ap = self.apIndex.ids[ap_index]
+            for flow in LoadBalancing.getVehicleFlows(self, int(snapshot.carIds[row])):
+                if flow['ap'] == ap:
+                    distances[i] = 0
+                    break
+
+        return distances
+
+    def getVehicleData(self, snapshot):
+        # Old vehicleData layout, with the flows of each car, for logging
+        vehicle_data = snapshot.toDict(self.apIndex.ids)
+        for car_id, flows in self.flowTable.toDict()['vehicles'].items():
+            vehicle_data[car_id]['flows'] = [{'ap': ap_id, 'node': node_id} for ap_id, node_id in flows.items()]
+        return vehicle_data
+
+    def getNodesLoad(self, snapshot):
+        # Cars using each node, in order of first appearance: {node: [vehicle_id,...]}
+        rows = np.flatnonzero(snapshot.servingNode >= 0)
+        nodes_load = {}
+        for node_id, node_rows in groupInOrder(snapshot.servingNode[rows]):
+            nodes_load[str(node_id)] = snapshot.carIds[rows[node_rows]].tolist()
+        return nodes_load
+
+    def startController(self):
+        self.baseFlowsInstalled = False
+        self.i_time = -1
+
+    def controllerStep(self):
+        # One control tick: move cars from the heaviest to the lightest node
+        if self.recorder is not None:
+            self.recorder.tick(self.i_time)
+        # Consistent copy of the vehicle state, no lock is held while deciding
+        with self.profiler.phase('ingest'):
+            snapshot = LoadBalancing.vehicleStore.snapshot()
+        # Built and written by the state writer thread, from this tick's snapshot
+        self.stateWriter.debug(lambda snapshot=snapshot: f"Vehicle data: {LoadBalancing.getVehicleData(self, snapshot)}")
+        with self.profiler.phase('decide'):
+            nodes_load = LoadBalancing.getNodesLoad(self, snapshot) # {node: [vehicle_id,...]}
+        
+        self.stateWriter.info(f"Nodes load: {nodes_load}")
+        self.stateWriter.info(f"Flow queue: {self.flowQueue.getMetrics()}")
+        
+        if len(nodes_load) == 0:
+            return
 
-            if not base_flows_installed:
-                print("Creating default LB SDN flows...")
-                Scenario.createDefaultLoadBalancingSDNFlows(self)
-                base_flows_installed = True
+        if not self.baseFlowsInstalled:
+            print("Creating default LB SDN flows...")
+            Scenario.createDefaultLoadBalancingSDNFlows(self)
+            self.baseFlowsInstalled = True
 
-            i_time += 1
-            visualization_item = {} # {node_id: load}
-            for node_id, cars in nodes_load.items():
-                visualization_item[node_id] = len(cars)
-            LoadBalancing.visualization[i_time] = visualization_item
+        self.i_time += 1
+        visualization_item = {} # {node_id: load}
+        for node_id, cars in nodes_load.items():
+            visualization_item[node_id] = len(cars)
 
-            # Overwrite the visualization file as json format pretty
-            with open('visualization.json', 'w') as f:
-                json.dump(LoadBalancing.visualization, f, sort_keys=True, indent=4)
+        # Append one record, the full visualization.json is written at the end of the run
+        with self.profiler.phase('output'):
+            self.metricsSink.write(self.i_time, visualization_item)
 
+        with self.profiler.phase('decide'):
             lighest_node_load = None
             lighest_node_id = None
             heaviest_node = None
@@ -170,7 +163,7 @@ class LoadBalancing(Scenario):
                 if lighest_node_load is None:
                     lighest_node_load = len(cars)
                     lighest_node_id = node_id
-                
+            
                 if heaviest_node is None:
                     heaviest_node = node_id
                     cars_to_move = cars
@@ -182,64 +175,81 @@ class LoadBalancing(Scenario):
                 elif len(cars) > len(cars_to_move):
                     heaviest_node = node_id
                     cars_to_move = cars
-            
-            with open(LoadBalancing.LOG_FILE, "a") as f:
-                f.write(f"{datetime.now().strftime('%H:%M:%S.%f')[:-3]} : Node {lighest_node_id} is the lighest node with {lighest_node_load} cars\n")
-                f.write(f"{datetime.now().strftime('%H:%M:%S.%f')[:-3]} : Node {heaviest_node} is the heaviest node with {len(cars_to_move)} cars\n")
+        
+            self.stateWriter.info(f"Node {lighest_node_id} is the lighest node with {lighest_node_load} cars")
+            self.stateWriter.info(f"Node {heaviest_node} is the heaviest node with {len(cars_to_move)} cars")
 
             if lighest_node_id == heaviest_node:
-                continue
-            
+                return
+        
             # Calculate retention rate of each car (distance they will stay in range of ap)
             retention_dist = {} # {car_id: distance_left}
-            for car_id in cars_to_move:
-                with LoadBalancing.vehicleDataLock:
-                    dist_left = LoadBalancing.calculateDistanceInRange(self, car_id)
-                    if dist_left > 0:
-                        retention_dist[car_id] = dist_left
+            distances = LoadBalancing.calculateDistancesInRange(self, snapshot, cars_to_move)
+            for car_id, dist_left in zip(cars_to_move, distances.tolist()):
+                if dist_left > 0:
+                    retention_dist[car_id] = dist_left
 
             num_cars_to_move = int((len(cars_to_move) + lighest_node_load) / 2) - 1
             if num_cars_to_move <= 0:
-                continue
+                return
             sorted_cars = sorted(retention_dist.items(), key=lambda x: x[1], reverse=True)
             cars_ready_to_move = [car_id for car_id, _ in sorted_cars[:num_cars_to_move]]
 
-            with open(LoadBalancing.LOG_FILE, "a") as f:
-                f.write(f"{datetime.now().strftime('%H:%M:%S.%f')[:-3]} : Moving {num_cars_to_move} cars from node {heaviest_node} to node {lighest_node_id}\n")
-
-            # Move cars to the lighest node!
-            # Install flows
-            for car_id in cars_ready_to_move:
-                with LoadBalancing.vehicleDataLock:
-                    ap = LoadBalancing.vehicleData[car_id]['associated_ap']
-                    if ap is None:
-                        with open(LoadBalancing.LOG_FILE, "a") as f:
-                            f.write(f"{datetime.now().strftime('%H:%M:%S.%f')[:-3]} : Car {car_id} has no associated ap. Skipping...\n")
-                        continue
-                    if 'flows' not in LoadBalancing.vehicleData[car_id]:
-                        LoadBalancing.vehicleData[car_id]['flows'] = []
-                    Scenario.installFlowForVehicle(self, car_id, ap, Scenario.convertWorkerIdToName(self, self.clusterName, lighest_node_id))
-                    LoadBalancing.vehicleData[car_id]['flows'].append({'ap': ap, 'node': lighest_node_id})
+        self.stateWriter.info(f"Moving {num_cars_to_move} cars from node {heaviest_node} to node {lighest_node_id}")
 
-    def run(self):
-        # Add delimiter to log, if it exists
-        if os.path.exists(LoadBalancing.LOG_FILE):
-            os.remove(LoadBalancing.LOG_FILE)
+        # Move cars to the lighest node!
+        # Install flows
+        for car_id in cars_ready_to_move:
+            ap_index = snapshot.associatedAp[car_id - 1]
+            if ap_index < 0:
+                self.stateWriter.info(f"Car {car_id} has no associated ap. Skipping...")
+                continue
+            ap = self.apIndex.ids[ap_index]
+            Scenario.installFlowForVehicle(self, car_id, ap, Scenario.convertWorkerIdToName(self, self.clusterName, lighest_node_id), wait=False)
 
-        # Setup kind cluster
-        self.clusterName = Scenario.startKindController(self)
-        print(f"Cluster name: {self.clusterName}")
-        #
-        Scenario.createService(self, self.appName, self.appName + '-service', self.serviceType, self.containerPort, self.targetPort, self.nodePort, self.tag)
-        #
+    def controller(self):
+        LoadBalancing.startController(self)
+        if self.recorder is not None:
+            self.recorder.controllerStart()
+        while not LoadBalancing.STOP_SIMULATION:
+            time.sleep(1)
+            with self.profiler.tick():
+                LoadBalancing.controllerStep(self)
+
+    def serviceSpec(self):
+        return dict(appName=self.appName, serviceName=self.appName + '-service', serviceType=self.serviceType,
+                    port=self.containerPort, targetPort=self.targetPort, nodePort=self.nodePort, tag=self.tag)
+
+    def initialDeployments(self):
+        # One deployment per node, all of them on the first worker
         firstDeploymentNodeName = self.clusterName + '-worker'
         deploymentName = self.appName + '-deployment-'
-        Scenario.createDeployment(self, self.appName, deploymentName + '1', self.containerPort, 1, firstDeploymentNodeName, self.tag)
-        #
-        for i in range(2, Scenario.getNumberOfNodes(self) + 1):
-            Scenario.createDeployment(self, self.appName, f"{deploymentName}{i}", self.containerPort, 1, firstDeploymentNodeName, self.tag)
-        #
-        Scenario.launchSDNController(self)
+        return [dict(appName=self.appName, deploymentName=f"{deploymentName}{i}", containerPort=self.containerPort,
+                     numReplicas=1, nodeName=firstDeploymentNodeName, tag=self.tag)
+                for i in range(1, Scenario.getNumberOfNodes(self) + 1)]
+
+    def startOutputs(self):
+        # A new run starts a new log
+        logFile = Scenario.outputPath(self, LoadBalancing.LOG_FILE)
+        if os.path.exists(logFile):
+            os.remove(logFile)
+        self.stateWriter.start()
+
+    def closeOutputs(self):
+        self.profiler.close()
+        self.stateWriter.stop()
+        self.metricsSink.close()
+        MetricsSink.convert(Scenario.outputPath(self, LoadBalancing.METRICS_FILE), Scenario.outputPath(self, LoadBalancing.VISUALIZATION_FILE))
+        if self.recorder is not None:
+            self.recorder.close()
+            print(f"Trace recorder metrics: {self.recorder.getMetrics()}")
+
+    def run(self):
+        LoadBalancing.startOutputs(self)
+
+        # Setup kind cluster, service, deployments and SDN controller (concurrently)
+        self.clusterName = Scenario.bootstrap(self, [LoadBalancing.serviceSpec(self)], lambda: LoadBalancing.initialDeployments(self))
+        print(f"Cluster name: {self.clusterName}")
 
         # Start position tracker threads
         positionTrackerThread = threading.Thread(target=self.positionTracker, args=(self.numCars,), daemon=True)
@@ -258,5 +268,12 @@ class LoadBalancing(Scenario):
         LoadBalancing.STOP_SIMULATION = True
         positionTrackerThread.join()
         controller.join()
-    
+
+        self.flowQueue.stop()
+        LoadBalancing.closeOutputs(self)
+        self.associationTracker.close()
+        print(f"Association tracker metrics: {self.associationTracker.getMetrics()}")
+        print(f"Flow queue metrics: {self.flowQueue.getMetrics()}")
+        print(f"State writer metrics: {self.stateWriter.getMetrics()}")
+        print(f"Kubernetes timings: {self.kindController.getTimings()}")
         print("Exiting...")
@@ -0,0 +1,115 @@
+#
+# Append-only per-tick metrics output (JSON Lines).
+#
+# Every tick is one compact line, e.g. {"t": 3, "global_latency": 546}. Lines are buffered and
+# written in batches, and the file is rotated by size (visualization.jsonl.1, .2, ... oldest first),
+# so a run of any length uses constant memory and constant I/O per tick.
+#
+# The visualization scripts read the old { "t": { key: value } } dictionary; convert with
+#   python3 -m scenarios.MetricsSink visualization.jsonl visualization.json
+#
+import os
+import sys
+import json
+import time
+import threading
+
+class MetricsSink:
+
+    def __init__(self, path='visualization.jsonl', batchSize=16, flushInterval=5, maxBytes=64 * 1024 * 1024, truncate=True):
+        self.path = path
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.maxBytes = maxBytes
+
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.lastFlush = time.monotonic()
+        self.records = 0
+
+        if truncate:
+            # A new run starts a new series
+            for segment in MetricsSink.segments(path):
+                os.remove(segment)
+        self.file = open(path, 'a')
+        self.segment = len(MetricsSink.segments(path)) - 1 # Number of rotated segments
+
+    @staticmethod
+    def segments(path):
+        # Files of a series in write order: path.1, path.2, ..., path
+        rotated = []
+        directory = os.path.dirname(path) or '.'
+        prefix = os.path.basename(path) + '.'
+        for name in os.listdir(directory):
+            suffix = name[len(prefix):]
+            if name.startswith(prefix) and suffix.isdigit():
+                rotated.append((int(suffix), os.path.join(directory, name)))
+        files = [segment for (_, segment) in sorted(rotated)]
+        if os.path.exists(path):
+            files.append(path)
+        return files
+
+    def write(self, t, values):
+        # Record the values ({ key: number }) of tick t
+        line = json.dumps({'t': t, **values}, separators=(',', ':'))
+        with self.lock:
+            self.buffer.append(line)
+            self.records += 1
+            if len(self.buffer) >= self.batchSize or time.monotonic() - self.lastFlush >= self.flushInterval:
+                self.__flush()
+
+    def __flush(self):
+        if len(self.buffer) > 0:
+            self.file.write('\n'.join(self.buffer) + '\n')
+            self.file.flush()
+            self.buffer = []
+        self.lastFlush = time.monotonic()
+        if self.file.tell() >= self.maxBytes:
+            self.__rotate()
+
+    def __rotate(self):
+        self.file.close()
+        self.segment += 1
+        os.rename(self.path, f'{self.path}.{self.segment}')
+        self.file = open(self.path, 'a')
+
+    def flush(self):
+        with self.lock:
+            self.__flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.__flush()
+                self.file.close()
+                self.file = None
+
+    @staticmethod
+    def readRecords(path):
+        # Iterate the records of a series (all its segments), oldest first
+        for segment in MetricsSink.segments(path):
+            with open(segment, 'r') as file:
+                for line in file:
+                    line = line.strip()
+                    if line:
+                        yield json.loads(line)
+
+    @staticmethod
+    def toVisualizationDict(path):
+        # { "t": { key: value } }, the layout of visualization.json
+        data = {}
+        for record in MetricsSink.readRecords(path):
+            t = record.pop('t')
+            data[str(t)] = record
+        return data
+
+    @staticmethod
+    def convert(path, outputPath='visualization.json'):
+        with open(outputPath, 'w') as file:
+            json.dump(MetricsSink.toVisualizationDict(path), file, sort_keys=True, indent=4)
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print("Usage: python3 -m scenarios.MetricsSink <metrics.jsonl> <visualization.json>")
+        sys.exit(1)
+    MetricsSink.convert(sys.argv[1], sys.argv[2])
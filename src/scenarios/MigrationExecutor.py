@@ -0,0 +1,260 @@
+#
+# Make-before-break migrations of a service between workers.
+#
+# A migration moves the traffic of one or more APs to a deployment on another worker:
+#   create    the target deployment (Scenario.createDeployment, the API call returns before the pod runs)
+#   ready     a Ready pod of the app on the target worker (deployment cache event)
+#   redirect  the AP flows are switched to the target worker, only now
+#   drain     the old deployment keeps answering the requests already sent to it...
+#   retire    ...and is deleted once the drain period is over
+# The caller only pays for the create call. The Ready events, ready timeouts and drain periods of
+# every migration in flight are handled by one event loop thread, so the control tick never waits
+# for a pod. A newer migration of the same APs to another worker supersedes the one still waiting.
+#
+# The headless runs (scenarios.Simulation) use the loop without its thread (threaded=False): the
+# virtual clock drives the timers (poll) and the fake cache delivers the Ready events inline.
+#
+import time
+import heapq
+import threading
+from collections import deque
+
+class Migration:
+
+    def __init__(self, key, nodeName, appName, redirect, retire=None, onRedirected=None, onAborted=None):
+        self.key = key # At most one migration waiting per key (the APs whose traffic moves)
+        self.nodeName = nodeName
+        self.appName = appName
+        self.redirect = redirect # callback(done), switches the traffic and calls done(ok) once acknowledged
+        self.retire = retire # callback(), deletes the old deployment at the end of the drain period
+        self.onRedirected = onRedirected # callback(ok)
+        self.onAborted = onAborted # callback(reason), the traffic was not switched
+        self.drain = None # Seconds, set by MigrationExecutor.submit
+        self.state = 'waiting' # waiting -> redirecting -> draining -> done, or aborted
+        self.submittedAt = None
+        self.readyAt = None
+
+class MigrationExecutor:
+
+    DRAIN = 5.0 # Seconds the old deployment keeps serving after the redirect
+    READY_TIMEOUT = 120 # Seconds to wait for a Ready pod before giving the migration up
+    WAIT_SAMPLES = 1024
+
+    def __init__(self, clock=time.time, threaded=True):
+        self.clock = clock
+        self.threaded = threaded
+
+        self.cond = threading.Condition()
+        self.events = deque() # Callbacks posted to the loop
+        self.timers = [] # [(t, sequence, callback)]
+        self.sequence = 0
+        self.waiting = {} # {(nodeName, appName): [Migration]}, waiting for a Ready pod
+        self.waitingByKey = {} # {key: Migration}
+        self.draining = 0
+        self.running = True
+
+        # Metrics
+        self.submitted = 0
+        self.deduplicated = 0
+        self.superseded = 0
+        self.timedOut = 0
+        self.redirected = 0
+        self.failed = 0
+        self.retired = 0
+        self.readyWaits = deque(maxlen=self.WAIT_SAMPLES) # Seconds from submit to Ready, of the migrations that waited
+
+        self.thread = None
+        if threaded:
+            self.thread = threading.Thread(target=self.__loop, name='migration-executor', daemon=True)
+            self.thread.start()
+
+    def post(self, callback):
+        # Run callback on the loop (inline without the thread)
+        if not self.threaded:
+            self.__run([callback])
+            return
+        with self.cond:
+            self.events.append(callback)
+            self.cond.notify()
+
+    def at(self, t, callback):
+        # Run callback on the loop at time t
+        if not self.threaded and t <= self.clock():
+            self.__run([callback])
+            return
+        with self.cond:
+            self.sequence += 1
+            heapq.heappush(self.timers, (t, self.sequence, callback))
+            self.cond.notify()
+
+    def after(self, seconds, callback):
+        self.at(self.clock() + seconds, callback)
+
+    def nextTimer(self):
+        with self.cond:
+            return self.timers[0][0] if len(self.timers) > 0 else None
+
+    def submit(self, migration, isReady, drain=None, timeout=None):
+        # Redirect once isReady() (inline if it already is), then retire after the drain period.
+        # Returns the migration in charge: the waiting one if it already moves the same key to the same worker.
+        drain = MigrationExecutor.DRAIN if drain is None else drain
+        timeout = MigrationExecutor.READY_TIMEOUT if timeout is None else timeout
+        superseded = None
+        with self.cond:
+            previous = self.waitingByKey.get(migration.key, None)
+            if previous is not None:
+                if previous.nodeName == migration.nodeName and previous.appName == migration.appName:
+                    self.deduplicated += 1
+                    return previous
+                superseded = previous
+                self.__forget(previous)
+                previous.state = 'aborted'
+                self.superseded += 1
+
+            self.submitted += 1
+            migration.drain = drain
+            migration.submittedAt = self.clock()
+            # Checked under the lock, a Ready event cannot slip between the check and the registration
+            ready = isReady()
+            if ready:
+                migration.state = 'redirecting'
+            else:
+                self.waiting.setdefault((migration.nodeName, migration.appName), []).append(migration)
+                self.waitingByKey[migration.key] = migration
+
+        if superseded is not None and superseded.onAborted is not None:
+            superseded.onAborted('superseded')
+        if ready:
+            self.__redirect(migration)
+        else:
+            self.at(migration.submittedAt + timeout, lambda: self.__timeout(migration))
+        return migration
+
+    def onPodReady(self, nodeName, appName, podIP=None, t=None):
+        # Deployment cache listener (called from its watch thread), the redirects run on the loop
+        with self.cond:
+            if (nodeName, appName) not in self.waiting:
+                return
+        self.post(lambda: self.__ready(nodeName, appName, t))
+
+    def __forget(self, migration):
+        key = (migration.nodeName, migration.appName)
+        migrations = self.waiting.get(key, [])
+        if migration in migrations:
+            migrations.remove(migration)
+            if len(migrations) == 0:
+                del self.waiting[key]
+        if self.waitingByKey.get(migration.key, None) is migration:
+            del self.waitingByKey[migration.key]
+
+    def __ready(self, nodeName, appName, t):
+        now = self.clock()
+        with self.cond:
+            migrations = self.waiting.pop((nodeName, appName), [])
+            for migration in migrations:
+                self.__forget(migration)
+                migration.state = 'redirecting'
+                migration.readyAt = now if t is None else t
+                self.readyWaits.append(migration.readyAt - migration.submittedAt)
+        for migration in migrations:
+            self.__redirect(migration)
+
+    def __timeout(self, migration):
+        with self.cond:
+            if migration.state != 'waiting':
+                return
+            self.__forget(migration)
+            migration.state = 'aborted'
+            self.timedOut += 1
+        print(f"No Ready pod of {migration.appName} on {migration.nodeName}, traffic not redirected")
+        if migration.onAborted is not None:
+            migration.onAborted('not ready')
+
+    def __redirect(self, migration):
+        migration.redirect(lambda ok: self.__redirected(migration, ok))
+
+    def __redirected(self, migration, ok):
+        # Called by whoever acknowledged the redirect (flow queue thread, or inline)
+        with self.cond:
+            if ok:
+                self.redirected += 1
+            else:
+                self.failed += 1
+            retire = ok and migration.retire is not None
+            migration.state = 'draining' if retire else 'done'
+            if retire:
+                self.draining += 1
+        if migration.onRedirected is not None:
+            migration.onRedirected(ok)
+        if retire:
+            # The old deployment only goes once the traffic is on the new one
+            self.after(migration.drain, lambda: self.__retire(migration))
+
+    def __retire(self, migration):
+        with self.cond:
+            self.draining -= 1
+            self.retired += 1
+            migration.state = 'done'
+        migration.retire()
+
+    def __takeDue(self, now):
+        callbacks = list(self.events)
+        self.events.clear()
+        while len(self.timers) > 0 and self.timers[0][0] <= now:
+            callbacks.append(heapq.heappop(self.timers)[2])
+        return callbacks
+
+    def __run(self, callbacks):
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in migration executor: {e}")
+
+    def __loop(self):
+        while True:
+            with self.cond:
+                callbacks = []
+                while self.running:
+                    callbacks = self.__takeDue(self.clock())
+                    if len(callbacks) > 0:
+                        break
+                    self.cond.wait(None if len(self.timers) == 0 else max(0.0, self.timers[0][0] - self.clock()))
+                if not self.running:
+                    return
+            self.__run(callbacks)
+
+    def poll(self, now=None):
+        # Run the due timers, for the loop without its thread (virtual clock listener)
+        with self.cond:
+            callbacks = self.__takeDue(self.clock() if now is None else now)
+        self.__run(callbacks)
+
+    def getMetrics(self):
+        with self.cond:
+            waits = sorted(self.readyWaits)
+            metrics = {
+                'submitted': self.submitted,
+                'deduplicated': self.deduplicated,
+                'superseded': self.superseded,
+                'timed_out': self.timedOut,
+                'redirected': self.redirected,
+                'failed': self.failed,
+                'retired': self.retired,
+                'waiting': len(self.waitingByKey),
+                'draining': self.draining,
+            }
+        if len(waits) > 0:
+            metrics['ready_wait_s'] = {
+                'mean': sum(waits) / len(waits),
+                'p95': waits[min(len(waits) - 1, int(len(waits) * 0.95))],
+                'max': waits[-1],
+            }
+        return metrics
+
+    def stop(self, timeout=5):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
@@ -0,0 +1,185 @@
+#
+# End-to-end tracing of the service migrations of MobilityStrategy.
+#
+# Every (worker, AP) pair the controller decides to move traffic to becomes a span with an id
+# ('m1', 'm2', ...) and the time of each stage:
+#   leaving             the tick whose decision detected the cars leaving their AP (isLeavingAP)
+#   deployment_created  createDeployment returned (or deployment_existing, the app already ran there)
+#   pod_ready           a Ready pod of the app on the node (deployment cache event)
+#   redirect_acked      the SDN controller acknowledged the AP redirect (or redirect_existing)
+#   first_request       first /getPodIP answered by the new pod, taken from the client logs by the summariser
+# Finished spans are appended to a JSON Lines file, unfinished ones are written at close.
+#
+#   python3 -m scenarios.MigrationTracer migrations.jsonl [client.log ...]
+# prints the percentiles of every stage (seconds since 'leaving') per strategy.
+#
+import sys
+import json
+import time
+import threading
+
+STAGES = ['leaving', 'deployment_created', 'pod_ready', 'redirect_acked', 'first_request']
+
+class MigrationTracer:
+
+    def __init__(self, path='migrations.jsonl', enabled=True, clock=time.time):
+        self.path = path
+        self.enabled = enabled
+        self.clock = clock
+        self.strategy = None
+
+        self.lock = threading.Lock()
+        self.spans = {} # {id: span}, open spans
+        self.openByKey = {} # {(node_name, ap_id): id}
+        self.counter = 0
+        self.written = 0
+        self.file = None
+        if enabled:
+            self.file = open(path, 'w')
+
+    def begin(self, node_name, ap_id, app_name, leavingAt=None):
+        # Span of a migration of ap_id's traffic to node_name, the open one if there is already one
+        if not self.enabled:
+            return None
+        key = (node_name, str(ap_id))
+        with self.lock:
+            migration = self.openByKey.get(key, None)
+            if migration is not None:
+                return migration
+            self.counter += 1
+            migration = f'm{self.counter}'
+            self.spans[migration] = {'id': migration, 'strategy': self.strategy, 'node': key[0], 'ap': key[1], 'app': app_name,
+                                     'stages': {'leaving': self.clock() if leavingAt is None else leavingAt}}
+            self.openByKey[key] = migration
+            return migration
+
+    def mark(self, migration, stage, t=None, **attributes):
+        # Set the time of a stage (the first one wins) and finish the span when complete
+        if migration is None:
+            return
+        with self.lock:
+            span = self.spans.get(migration, None)
+            if span is None:
+                return
+            span['stages'].setdefault(stage, self.clock() if t is None else t)
+            span.update(attributes)
+            if self.__isComplete(span):
+                self.__finish(span)
+
+    def onPodReady(self, nodeName, appName, podIP, t=None):
+        # Deployment cache listener: every open span waiting for this app on this node
+        with self.lock:
+            waiting = [span for span in self.spans.values()
+                       if span['node'] == nodeName and span['app'] == appName and 'pod_ready' not in span['stages']]
+        for span in waiting:
+            self.mark(span['id'], 'pod_ready', t, pod_ip=podIP)
+
+    def abort(self, migration, error):
+        # Write the span as incomplete, a later decision for the same pair starts a new one
+        if migration is None:
+            return
+        with self.lock:
+            span = self.spans.get(migration, None)
+            if span is not None:
+                span['error'] = error
+                self.__finish(span, complete=False)
+
+    @staticmethod
+    def __isComplete(span):
+        stages = span['stages']
+        redirected = 'redirect_acked' in stages or 'redirect_existing' in stages
+        ready = 'pod_ready' in stages or 'deployment_existing' in stages or span['app'] is None
+        return redirected and ready
+
+    def __finish(self, span, complete=True):
+        del self.spans[span['id']]
+        key = (span['node'], span['ap'])
+        if self.openByKey.get(key, None) == span['id']:
+            del self.openByKey[key]
+        span['complete'] = complete
+        self.file.write(json.dumps(span, separators=(',', ':')) + '\n')
+        self.file.flush()
+        self.written += 1
+
+    def close(self):
+        if not self.enabled:
+            return
+        with self.lock:
+            for span in list(self.spans.values()):
+                self.__finish(span, complete=False)
+            self.file.close()
+            self.enabled = False
+
+    def getMetrics(self):
+        with self.lock:
+            return {'written': self.written, 'open': len(self.spans)}
+
+def readSpans(path):
+    with open(path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def readClientLog(path):
+    # [(t, podIP)] of the timestamped lines ('<epoch seconds> Pod IP: <ip>')
+    requests = []
+    with open(path, 'r') as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) < 2 or 'IP:' not in parts:
+                continue
+            try:
+                t = float(parts[0])
+            except ValueError:
+                continue # Older logs have no timestamps
+            requests.append((t, parts[-1].strip('"')))
+    return requests
+
+def addFirstRequests(spans, clientLogs):
+    # First request served by the span's pod after the redirect
+    requests = sorted(request for path in clientLogs for request in readClientLog(path))
+    for span in spans:
+        podIP = span.get('pod_ip', None)
+        redirected = span['stages'].get('redirect_acked', None)
+        if podIP is None or redirected is None:
+            continue
+        for (t, ip) in requests:
+            if t >= redirected and ip == podIP:
+                span['stages']['first_request'] = t
+                break
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))]
+
+def summarise(spans):
+    # {strategy: {'spans', 'complete', stage: {count, p50, p90, p99, max}}}, seconds since 'leaving'
+    summary = {}
+    for span in spans:
+        strategy = summary.setdefault(str(span.get('strategy', None)), {'spans': 0, 'complete': 0, 'stages': {}})
+        strategy['spans'] += 1
+        strategy['complete'] += 1 if span.get('complete', False) else 0
+        stages = span['stages']
+        for stage in STAGES[1:]:
+            if stage in stages:
+                strategy['stages'].setdefault(stage, []).append(stages[stage] - stages['leaving'])
+    for strategy in summary.values():
+        strategy['stages'] = {stage: {'count': len(values),
+                                      'p50': percentile(values, 50),
+                                      'p90': percentile(values, 90),
+                                      'p99': percentile(values, 99),
+                                      'max': max(values)}
+                              for stage, values in sorted(strategy['stages'].items(), key=lambda item: STAGES.index(item[0]))}
+    return summary
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python3 -m scenarios.MigrationTracer <migrations.jsonl> [client.log ...]")
+        sys.exit(1)
+    spans = list(readSpans(sys.argv[1]))
+    addFirstRequests(spans, sys.argv[2:])
+    for strategy, result in summarise(spans).items():
+        print(f"{strategy}: {result['spans']} migrations, {result['complete']} complete")
+        for stage, stats in result['stages'].items():
+            print(f"  {stage:20} n={stats['count']:<5} p50={stats['p50']:.3f} s  p90={stats['p90']:.3f} s  p99={stats['p99']:.3f} s  max={stats['max']:.3f} s")
@@ -1,9 +1,14 @@
 from scenarios.Scenario import Scenario
+from scenarios.TelemetryTailer import TelemetryTailer
+from scenarios.VehicleStore import VehicleStore, groupInOrder
+from scenarios.MetricsSink import MetricsSink
+from scenarios.StateWriter import StateWriter
+from scenarios.MigrationTracer import MigrationTracer
+from scenarios.HandoverScheduler import HandoverScheduler
 
 import threading
 import time
-import os
-import json
+import numpy as np
 
 class MobilityStrategy(Scenario):
 
@@ -16,26 +21,26 @@ class MobilityStrategy(Scenario):
     nodePort = 30001
 
     MAX_DEPLOYMENTS = 3 # Limit by cost!
+    AP_RANGE = 300 # Radius of an AP's coverage
+    LEAVE_THRESHOLD = 0.20 # A car is leaving its AP when less than this fraction of the range is left ahead
+    HANDOVER_LOOKAHEAD = None # Seconds; when set, decisions follow the predicted AP crossings (see HandoverScheduler)
+    HANDOVER_VELOCITY_CHANGE = 0.25 # Relative velocity change that makes the scheduler predict a car's crossing again
 
     STOP_SIMULATION = False
 
-    # Visualization structure: for each time t, store the global latency
-    visualization = {}
-    # {
-    #   t_0: {
-    #       global_latency: _,
-    #   },
-    # }
+    # Vehicle state dump, written by the state writer thread at most every interval
+    VEHICLE_DATA_FILE = 'vehicle-data.json'
+    STATE_INTERVAL = 1
 
-    # Flows
-    flows = []
-    # [
-    #   {
-    #       ap_id: _,
-    #       node_id: _
-    #   },
-    #   ...
-    # ]
+    # Visualization output: for each time t, one line with the global latency (see MetricsSink)
+    VISUALIZATION_FILE = 'visualization.json'
+    METRICS_FILE = 'visualization.jsonl'
+    # {"t": 0, "global_latency": _}
+
+    # Migration spans, one JSON line per migration (see MigrationTracer)
+    MIGRATIONS_FILE = 'migrations.jsonl'
+
+    # Flows: see Scenario.flowTable (AP -> node redirects installed on the switches)
 
     # Deployments
     deployments = []
@@ -50,118 +55,89 @@ class MobilityStrategy(Scenario):
     #   ...
     # ]
 
-    # Vehicle position dictionary and its lock
-    vehicleDataLock = threading.Lock()
-    vehicleData = {}
-    #
-    # {
-    #   1: {
-    #       "position": (x, y),
-    #       "direction": (dx, dy),
-    #       "associated_ap": 1
-    #   },
-    #   ...
-    # }
+    # Vehicle state: position, direction and associated AP of every car (see VehicleStore)
+    vehicleStore = None
 
 
-    def __init__(self, kindCfg, mininetCfg, sdnController):
-        super().__init__(kindCfg, mininetCfg, sdnController, force_restart=False)
+    def __init__(self, kindCfg, mininetCfg, sdnController, warm_pool=False, output_dir='.', record=None, profile=False, backends=None, handover_lookahead=None, migration_drain=None):
+        super().__init__(kindCfg, mininetCfg, sdnController, force_restart=False, warm_pool=warm_pool, output_dir=output_dir, record=record, profile=profile, backends=backends, migration_drain=migration_drain)
+        if handover_lookahead is not None:
+            self.HANDOVER_LOOKAHEAD = handover_lookahead
+        self.scheduler = None # Created by startController, with the parameters of the run
+        MobilityStrategy.vehicleStore = VehicleStore(self.numCars)
+        MobilityStrategy.vehicleStore.lock = self.profiler.wrapLock('vehicle_store', MobilityStrategy.vehicleStore.lock)
+        self.metricsSink = MetricsSink(Scenario.outputPath(self, MobilityStrategy.METRICS_FILE))
+        self.stateWriter = StateWriter(interval=MobilityStrategy.STATE_INTERVAL)
+        self.profiler.writer = self.stateWriter
+        self.tracer = MigrationTracer(Scenario.outputPath(self, MobilityStrategy.MIGRATIONS_FILE))
+        self.decisionTime = None
+        self.retiring = {} # {node_id: deployment_name}, deployments the traffic moved off, deleted after the drain period
 
 
     def positionTracker(self, num_cars):
         #
-        for i in range(1, num_cars + 1):
-            with MobilityStrategy.vehicleDataLock:
-                MobilityStrategy.vehicleData[i] = {}
-        #
-        while not MobilityStrategy.STOP_SIMULATION:
-            time.sleep(1)
-            for car_id in range(1, num_cars + 1):
-                car_position_path = f'position-car{i}-mn-telemetry.txt'
-
-                if os.path.exists(car_position_path):
-                    with open(car_position_path, 'rb') as f:
-                        try:
-                            f.seek(-2, os.SEEK_END)
-                            while f.read(1) != b'\n':
-                                f.seek(-2, os.SEEK_CUR)
-                        except OSError:
-                            f.seek(0)
-                        coordinates = f.readline().decode()
-                        x, y = coordinates.strip().split(',')
-                        x = float(x)
-                        y = float(y)
-                    
-                    with MobilityStrategy.vehicleDataLock:
-                        previous_position = MobilityStrategy.vehicleData[car_id].get('position', None)
-                        if previous_position is None or previous_position != (x, y):
-                            if previous_position is not None:
-                                dx = x - previous_position[0]
-                                dy = y - previous_position[1]
-                                MobilityStrategy.vehicleData[car_id]['direction'] = (dx, dy)
-                            MobilityStrategy.vehicleData[car_id]['position'] = (x, y)
-                            
-                            associated_ap = Scenario.getAssociatedAP(self, car_id)
-                            if associated_ap is None:
-                                associated_ap = Scenario.closestAP(self, x, y)
-                            MobilityStrategy.vehicleData[car_id]['associated_ap'] = associated_ap
+        cars = {car_id: f'car{car_id}' for car_id in range(1, num_cars + 1)}
+        tailer = TelemetryTailer(cars, self.onTelemetrySample)
+        tailer.run(lambda: MobilityStrategy.STOP_SIMULATION)
+
+    def onTelemetrySample(self, car_id, t, x, y):
+        if self.recorder is not None:
+            self.recorder.sample(car_id, x, y)
+        with self.profiler.phase('sample'):
+            if MobilityStrategy.vehicleStore.updatePosition(car_id, x, y):
+                associated_ap = Scenario.getAssociatedAP(self, car_id)
+                if associated_ap is None:
+                    associated_ap = Scenario.closestAP(self, x, y)
+                ap_index = self.apIndex.indexOf(associated_ap)
+                MobilityStrategy.vehicleStore.setAssociatedAp(car_id, ap_index)
+                if self.scheduler is not None:
+                    self.scheduler.onSample(car_id, t, x, y, ap_index)
+
+    def getUsingNode(self, ap_id):
+        # Node currently serving the AP according to the installed flows
+        return self.flowTable.getApNode(ap_id, '1') # Bootstrap worker by default
     
-    def getCurrentGlobalLatency(self):
+    def getCurrentGlobalLatency(self, snapshot=None):
         # For each vehicle, get its associated AP
         # Get the node that serves the AP from the flows
         # Get the node that should serve the AP from the deployments
         # If they are different, increment global latency by factor
         # The factor is the distance between the two nodes...
-        global_latency = 0
-        with MobilityStrategy.vehicleDataLock:
-            for car_id, data in MobilityStrategy.vehicleData.items():
-                if 'associated_ap' not in data:
-                    continue
-                ap_id = data['associated_ap']
-                if ap_id is None:
-                    continue
+        if snapshot is None:
+            snapshot = MobilityStrategy.vehicleStore.snapshot()
 
-                using_node = None
-                for flow_data in MobilityStrategy.flows:
-                    if flow_data['ap_id'] == ap_id:
-                        using_node = flow_data['node_id']
-                        break
-                
-                if using_node is None:
-                    using_node = 1
-                
-                best_node = Scenario.getNodeByAP(self, ap_id)
-                if best_node is None:
-                    continue
+        # The factor only depends on the AP, so count the cars per AP and weight once
+        cars_per_ap = np.bincount(snapshot.associatedAp[snapshot.hasAp], minlength=Scenario.getNumberOfAps(self))
+        global_latency = 0
+        for ap_index in np.flatnonzero(cars_per_ap):
+            ap_id = self.apIndex.ids[ap_index]
+            best_node = self.apBestNodes[ap_index]
+            if best_node is None:
+                continue
 
-                if best_node != using_node:
-                    global_latency += Scenario.getDistanceFactorBetweenNodes(self, ap_id, using_node)
+            using_node = MobilityStrategy.getUsingNode(self, ap_id)
+            if best_node != using_node:
+                global_latency += int(cars_per_ap[ap_index]) * Scenario.getDistanceFactorBetweenNodes(self, ap_id, using_node)
         
         return global_latency
 
-    def updateVisualization(self, i_time):
+    def updateVisualization(self, i_time, snapshot=None):
         visualization_item = {}
-        visualization_item['global_latency'] = MobilityStrategy.getCurrentGlobalLatency(self)
-        MobilityStrategy.visualization[i_time] = visualization_item
+        visualization_item['global_latency'] = MobilityStrategy.getCurrentGlobalLatency(self, snapshot)
 
-        # Overwrite visualization file as json format pretty
-        with open('visualization.json', 'w') as f:
-            json.dump(MobilityStrategy.visualization, f, sort_keys=True, indent=4)
+        # Append one record, the full visualization.json is written at the end of the run
+        self.metricsSink.write(i_time, visualization_item)
 
     def updateDeploymentsStructure(self):
         updated_deployments = []
-        # Populate deployments structure: get from Scenario.deployments
-        scenario_deployments = Scenario.getDeployment(self)
-        for (worker_name, deployment_list) in scenario_deployments.items():
+        # Populate deployments structure from what is deployed in the cluster
+        for (worker_name, app_list) in Scenario.getDeployedApps(self).items():
+            if worker_name is None:
+                continue
             node_id = Scenario.convertWorkerNameToId(self, worker_name)
-            app_list = []
-            for deployment_obj in deployment_list:
-                try:
-                    deployment_obj = deployment_obj.to_dict()
-                    app_name = deployment_obj['spec']['selector']['matchLabels']['app']
-                    app_list.append(app_name)
-                except Exception as e:
-                    print("Error getting app name from deployment object: ", e)
+            if str(node_id) in self.retiring:
+                # Draining, already gone for the decisions
+                continue
 
             updated_deployments.append({
                 'node_id': node_id,
@@ -170,11 +146,19 @@ class MobilityStrategy(Scenario):
         
         MobilityStrategy.deployments = updated_deployments
 
+    def getNodesLoad(self, snapshot):
+        # Number of cars per best node, in order of first appearance: { node_id: load }
+        # Also returns the rows of the cars that were counted
+        rows = np.flatnonzero(snapshot.hasAp)
+        best_nodes = self.apNodeIds[snapshot.associatedAp[rows]]
+        rows = rows[best_nodes >= 0]
+        nodes_load = {}
+        for node_id, node_rows in groupInOrder(best_nodes[best_nodes >= 0]):
+            nodes_load[str(node_id)] = len(node_rows)
+        return (nodes_load, rows)
+
     def existsFlow(self, ap_id, node_id):
-        for flow_data in MobilityStrategy.flows:
-            if flow_data['ap_id'] == ap_id and flow_data['node_id'] == node_id:
-                return True
-        return False
+        return self.flowTable.hasApFlow(ap_id, node_id)
     
     def existsDeployment(self, node_id, app_name):
         for deployment in MobilityStrategy.deployments:
@@ -218,181 +202,263 @@ class MobilityStrategy(Scenario):
                 continue
 
             node_name = Scenario.convertWorkerIdToName(self, self.clusterName, node_id)
+            migration = None
+            if app_name is not None or not MobilityStrategy.existsFlow(self, ap_id, node_id):
+                # Something moves, trace it
+                migration = self.tracer.begin(node_name, ap_id, app_name or self.appName, self.decisionTime)
+            if app_name is None:
+                self.tracer.mark(migration, 'deployment_existing')
 
             # Create deployment if app is not deployed
+            retired = None # (node_id, deployment_name) the traffic moves off
             if app_name is not None:
+                # A draining deployment is taken back instead of deleted
+                self.retiring.pop(str(node_id), None)
                 deployment_name = app_name + '-deployment-' + str(node_id)
-                if Scenario.createDeployment(self, app_name, deployment_name, self.containerPort, 1, node_name, self.tag) == 0:
+                result = Scenario.createDeployment(self, app_name, deployment_name, self.containerPort, 1, node_name, self.tag)
+                self.tracer.mark(migration, 'deployment_created', result=result)
+                if result == 2:
+                    # Nothing to move the traffic to, the current deployments stay
+                    self.tracer.abort(migration, 'deployment failed')
+                    continue
+                elif result == 1 and self.kindController.isCacheSynced() and len(self.kindController.cache.getPodIPs(node_name, app_name)) > 0:
+                    # Already running, no Ready event will come
+                    self.tracer.mark(migration, 'deployment_existing')
+                if result == 0:
                     print(f"App {app_name} deployed on {node_name}...")
                 
-                if Scenario.getNumberOfDeployments(self) > MobilityStrategy.MAX_DEPLOYMENTS and len(to_remove) > 0:
+                if Scenario.getNumberOfDeployments(self) - len(self.retiring) > self.MAX_DEPLOYMENTS and len(to_remove) > 0:
                     to_remove_node_id = to_remove.pop(0)
                     if to_remove_node_id != node_id:
-                        remove_deployment_name = app_name + '-deployment-' + str(to_remove_node_id)
-                        Scenario.deleteDeployment(self, Scenario.convertWorkerIdToName(self, MobilityStrategy.clusterName, to_remove_node_id), remove_deployment_name)
+                        # Make before break: deleted once the traffic is on the new deployment and the drain period is over
+                        retired = (str(to_remove_node_id), app_name + '-deployment-' + str(to_remove_node_id))
+                        self.retiring[retired[0]] = retired[1]
 
-                        aps_of_node = Scenario.getAPsAssociatedWithWorker(self, to_remove_node_id)
-                        for ap_id_to_remove in aps_of_node:
-                            Scenario.deleteSDNFlow(self, ap_id_to_remove)
-            
-            # Redirect traffic
+            retire = None if retired is None else lambda retired=retired: MobilityStrategy.retireDeployment(self, *retired)
+            # Redirect traffic once a pod of the app is Ready on the node (the flow table is updated by the SDN call)
             if not MobilityStrategy.existsFlow(self, ap_id, node_id):
-                Scenario.redirectTrafficSDN(self, node_name, ap_id)
-                flow_data = {
-                    'ap_id': ap_id,
-                    'node_id': node_id
-                }
-                MobilityStrategy.flows.append(flow_data)
+                Scenario.redirectWhenReady(self, node_name, app_name or self.appName, [ap_id], retire=retire,
+                                           onRedirected=lambda ok, migration=migration: self.tracer.mark(migration, 'redirect_acked', redirected=ok),
+                                           onAborted=lambda reason, migration=migration, retired=retired: MobilityStrategy.abortMigration(self, migration, reason, retired))
+            else:
+                self.tracer.mark(migration, 'redirect_existing')
+                if retire is not None:
+                    self.migrationExecutor.after(self.MIGRATION_DRAIN, retire)
 
         MobilityStrategy.updateDeploymentsStructure(self)
 
-    def controller_reactive(self):
-        base_flows_installed = False
+    def retireDeployment(self, node_id, deployment_name):
+        # End of the drain period (migration executor), unless a decision took the deployment back since
+        if self.retiring.get(str(node_id), None) != deployment_name:
+            return
+        Scenario.deleteDeployment(self, Scenario.convertWorkerIdToName(self, self.clusterName, node_id), deployment_name)
+        # The APs still redirected to the node go back to the default flows
+        for ap_id in self.flowTable.getApsOfNode(node_id):
+            Scenario.deleteSDNFlow(self, ap_id, wait=False)
+        self.retiring.pop(str(node_id), None)
         MobilityStrategy.updateDeploymentsStructure(self)
+
+    def abortMigration(self, migration, reason, retired=None):
+        # The traffic did not move (no Ready pod, or a newer decision for the AP): the old deployment keeps serving
+        self.tracer.abort(migration, reason)
+        if retired is not None and self.retiring.get(retired[0], None) == retired[1]:
+            self.retiring.pop(retired[0], None)
+            MobilityStrategy.updateDeploymentsStructure(self)
+
+    def decideReactive(self, snapshot):
+        new_deployment_and_flow = [] # [(node_id, app_name, ap_id), ...]
+        nodes_load, rows = MobilityStrategy.getNodesLoad(self, snapshot)
+
+        # Cars whose AP is served by a node other than its best node
+        mismatch = np.zeros(Scenario.getNumberOfAps(self), dtype=bool)
+        for ap_index in np.unique(snapshot.associatedAp[rows]).tolist():
+            ap_id = self.apIndex.ids[ap_index]
+            mismatch[ap_index] = self.apBestNodes[ap_index] != MobilityStrategy.getUsingNode(self, ap_id)
+        rows = rows[mismatch[snapshot.associatedAp[rows]] & snapshot.hasDirection[rows]]
+        handovers = None if self.scheduler is None else self.scheduler.handoverRows()
+        if handovers is not None:
+            # Between ticks, only the cars that just changed AP
+            rows = np.intersect1d(rows, handovers, assume_unique=True)
+
+        leaving = Scenario.isLeavingAPBatch(self, snapshot.position[rows], snapshot.direction[rows], snapshot.associatedAp[rows], self.AP_RANGE, self.LEAVE_THRESHOLD)
+        for row in rows[~leaving].tolist():
+            ap_index = snapshot.associatedAp[row]
+            best_node = self.apBestNodes[ap_index]
+
+            deployment_app_name = self.appName
+            if MobilityStrategy.existsDeployment(self, best_node, self.appName):
+                deployment_app_name = None
+            
+            new_deployment_and_flow.append((best_node, deployment_app_name, self.apIndex.ids[ap_index]))
+
+        return (new_deployment_and_flow, nodes_load)
+
+    def decidePredictive(self, snapshot):
         #
-        i_time = -1
-        while not MobilityStrategy.STOP_SIMULATION:
-            time.sleep(1)
-            new_deployment_and_flow = [] # [(node_id, app_name, ap_id), ...]
-            nodes_load = {} # node_id : load
-            with MobilityStrategy.vehicleDataLock:
-                with open('vehicle-data.json', 'w') as f:
-                    json.dump(MobilityStrategy.vehicleData, f, sort_keys=True, indent=4)
-                for car_id, data in MobilityStrategy.vehicleData.items():
-                    if 'associated_ap' not in data:
-                        continue
-                    ap_id = data['associated_ap']
-                    if ap_id is None:
-                        continue
-                    
-                    best_node = Scenario.getNodeByAP(self, ap_id)
-                    if best_node is None:
-                        continue
-
-                    if best_node in nodes_load:
-                        nodes_load[best_node] += 1
-                    else:
-                        nodes_load[best_node] = 1
-
-                    using_node = None
-                    for flow_data in MobilityStrategy.flows:
-                        if flow_data['ap_id'] == ap_id:
-                            using_node = flow_data['node_id']
-                            break
-                    
-                    if using_node is None:
-                        using_node = 1 # Bootstrap worker
-                    
-                    if best_node == using_node:
-                        continue
-                    
-                    x, y = data['position']
-
-                    if 'direction' not in data:
-                        continue
-                    dx, dy = data['direction']
-                    
-                    if not Scenario.isLeavingAP(self, x, y, dx, dy, ap_id):
-                        deployment_app_name = self.appName
-                        if MobilityStrategy.existsDeployment(self, best_node, self.appName):
-                            deployment_app_name = None
-                        
-                        new_deployment_and_flow.append((best_node, deployment_app_name, ap_id))
-
-            if i_time != -1 or len(new_deployment_and_flow) > 0:
-                if not base_flows_installed:
-                    Scenario.createDefaultMobilitySDNFlows(self)
-                    base_flows_installed = True
-                i_time += 1
-                MobilityStrategy.updateVisualization(self, i_time)
-            #
-            MobilityStrategy.updateDeploymentsAndFlows(self, nodes_load, new_deployment_and_flow)
+        # Iterate cars
+        #  - check if car is leaving AP
+        #    - check next AP in direction
+        #    - check if next AP uses different node
+        #      - replicate deployment
+        new_deployment_and_flow = [] # [(node_id, app_name, ap_id), ...]
+        nodes_load, _ = MobilityStrategy.getNodesLoad(self, snapshot)
+
+        if self.scheduler is None:
+            rows = np.flatnonzero(snapshot.hasAp & snapshot.hasDirection)
+        else:
+            # Only the cars near their predicted crossing
+            rows = self.scheduler.nearRows()
+            rows = rows[(snapshot.associatedAp[rows] >= 0) & ~np.isnan(snapshot.direction[rows]).any(axis=1)]
+        leaving = Scenario.isLeavingAPBatch(self, snapshot.position[rows], snapshot.direction[rows], snapshot.associatedAp[rows], self.AP_RANGE, self.LEAVE_THRESHOLD)
+        rows = rows[leaving]
+        next_aps = Scenario.nextApInDirectionBatch(self, snapshot.position[rows], snapshot.direction[rows], snapshot.associatedAp[rows], self.AP_RANGE)
+
+        for row, next_ap_index in zip(rows.tolist(), next_aps.tolist()):
+            if next_ap_index < 0:
+                continue
+            next_ap = self.apIndex.ids[next_ap_index]
+            next_node = self.apBestNodes[next_ap_index]
 
-    def controller_predictive(self):
-        base_flows_installed = False
+            using_node = MobilityStrategy.getUsingNode(self, self.apIndex.ids[snapshot.associatedAp[row]])
+            if next_node == using_node:
+                continue
+
+            deployment_app_name = self.appName
+            if MobilityStrategy.existsDeployment(self, next_node, self.appName):
+                deployment_app_name = None
+            
+            new_deployment_and_flow.append((next_node, deployment_app_name, next_ap))
+
+        return (new_deployment_and_flow, nodes_load)
+
+    def startController(self):
+        self.baseFlowsInstalled = False
+        self.i_time = -1
+        # Pod Ready events of the deployment cache close the migration spans
+        cache = getattr(self.kindController, 'cache', None)
+        if cache is not None and self.tracer.onPodReady not in cache.readyListeners:
+            cache.addReadyListener(self.tracer.onPodReady)
+        # The migrations redirect on them, replays need them in the trace
+        if cache is not None and self.recorder is not None and self.recorder.podReady not in cache.readyListeners:
+            cache.addReadyListener(self.recorder.podReady)
         MobilityStrategy.updateDeploymentsStructure(self)
+        if self.HANDOVER_LOOKAHEAD is not None and self.scheduler is None:
+            self.scheduler = HandoverScheduler(self.apCoords, self.numCars, self.AP_RANGE, self.LEAVE_THRESHOLD,
+                                               self.HANDOVER_LOOKAHEAD, self.HANDOVER_VELOCITY_CHANGE, clock=self.tracer.clock)
+
+    def schedulerConfig(self):
+        if self.HANDOVER_LOOKAHEAD is None:
+            return None
+        return {'lookahead': self.HANDOVER_LOOKAHEAD, 'velocityChange': self.HANDOVER_VELOCITY_CHANGE}
+
+    def decideStep(self, decide, snapshot, react=False):
+        # Decisions on a snapshot; with the handover scheduler, the near cars are moved to where they are now
+        self.decisionTime = self.tracer.clock()
+        if self.scheduler is not None:
+            with self.profiler.phase('ingest'):
+                self.scheduler.due(self.decisionTime, react)
+                snapshot = self.scheduler.extrapolate(snapshot, self.decisionTime)
+        with self.profiler.phase('decide'):
+            new_deployment_and_flow, nodes_load = decide(self, snapshot)
+        if self.scheduler is not None:
+            self.scheduler.decided(len(new_deployment_and_flow))
+        if self.recorder is not None:
+            self.recorder.decision(new_deployment_and_flow)
+        return (new_deployment_and_flow, nodes_load, snapshot)
+
+    def controllerStep(self, decide):
+        # One control tick: decide on a snapshot of the vehicle state and apply the decisions
+        if self.recorder is not None:
+            self.recorder.tick(self.i_time)
+        # Consistent copy of the vehicle state, no lock is held while deciding
+        with self.profiler.phase('ingest'):
+            snapshot = MobilityStrategy.vehicleStore.snapshot()
+        # Serialised and written by the state writer thread
+        with self.profiler.phase('output'):
+            self.stateWriter.dump(Scenario.outputPath(self, MobilityStrategy.VEHICLE_DATA_FILE), lambda snapshot=snapshot: snapshot.toDict(self.apIndex.ids), sort_keys=True, indent=4)
+
+        new_deployment_and_flow, nodes_load, snapshot = MobilityStrategy.decideStep(self, decide, snapshot)
+
+        if self.i_time != -1 or len(new_deployment_and_flow) > 0:
+            if not self.baseFlowsInstalled:
+                Scenario.createDefaultMobilitySDNFlows(self)
+                self.baseFlowsInstalled = True
+            self.i_time += 1
+            with self.profiler.phase('output'):
+                MobilityStrategy.updateVisualization(self, self.i_time, snapshot)
         #
-        i_time = -1
+        MobilityStrategy.updateDeploymentsAndFlows(self, nodes_load, new_deployment_and_flow)
+
+    def reactStep(self, decide):
+        # Decision between two ticks, when the handover scheduler wakes the controller up (no outputs)
+        if self.recorder is not None:
+            self.recorder.react()
+        with self.profiler.phase('ingest'):
+            snapshot = MobilityStrategy.vehicleStore.snapshot()
+        new_deployment_and_flow, nodes_load, _ = MobilityStrategy.decideStep(self, decide, snapshot, react=True)
+        if len(new_deployment_and_flow) == 0:
+            return
+        if not self.baseFlowsInstalled:
+            Scenario.createDefaultMobilitySDNFlows(self)
+            self.baseFlowsInstalled = True
+        MobilityStrategy.updateDeploymentsAndFlows(self, nodes_load, new_deployment_and_flow)
+
+    def waitForTick(self, decide):
+        # One second between ticks; with the handover scheduler, the crossings and handovers in between are decided as they come
+        if self.scheduler is None:
+            time.sleep(1)
+            return
+        nextTick = time.time() + 1
+        while self.scheduler.waitUntil(nextTick) and not MobilityStrategy.STOP_SIMULATION:
+            with self.profiler.phase('react'):
+                MobilityStrategy.reactStep(self, decide)
+
+    def controller(self, decide):
+        MobilityStrategy.startController(self)
+        self.tracer.strategy = decide.__name__
+        if self.recorder is not None:
+            self.recorder.controllerStart(decide, MobilityStrategy.schedulerConfig(self))
         while not MobilityStrategy.STOP_SIMULATION:
-            #
-            # Iterate cars
-            #  - check if car is leaving AP
-            #    - check next AP in direction
-            #    - check if next AP uses different node
-            #      - replicate deployment
+            MobilityStrategy.waitForTick(self, decide)
+            with self.profiler.tick():
+                MobilityStrategy.controllerStep(self, decide)
 
-            time.sleep(1)
-            new_deployment_and_flow = [] # [(node_id, app_name, ap_id), ...]
-            nodes_load = {} # node_id : load
-            with MobilityStrategy.vehicleDataLock:
-                with open('vehicle-data.json', 'w') as f:
-                    json.dump(MobilityStrategy.vehicleData, f, sort_keys=True, indent=4)
-                for car_id, data in MobilityStrategy.vehicleData.items():
-                    if 'associated_ap' not in data:
-                        continue
-                    ap_id = data['associated_ap']
-
-                    best_node = Scenario.getNodeByAP(self, ap_id)
-                    if best_node is not None:
-                        if best_node in nodes_load:
-                            nodes_load[best_node] += 1
-                        else:
-                            nodes_load[best_node] = 1
-
-                    x, y = data['position']
-
-                    if 'direction' not in data:
-                        continue
-
-                    dx, dy = data['direction']
-                    if not Scenario.isLeavingAP(self, x, y, dx, dy, ap_id):
-                        continue
-                    
-                    next_ap = Scenario.nextApInDirection(self, x, y, dx, dy, ap_id)
-                    if next_ap is None:
-                        continue
-
-                    next_node = Scenario.getNodeByAP(self, next_ap)
-
-                    using_node = None
-                    for flow_data in MobilityStrategy.flows:
-                        if flow_data['ap_id'] == ap_id:
-                            using_node = flow_data['node_id']
-                            break
-                    
-                    if using_node is None:
-                        using_node = 1 # Bootstrap worker
-                    
-                    if next_node == using_node:
-                        continue
-
-                    deployment_app_name = self.appName
-                    if MobilityStrategy.existsDeployment(self, next_node, self.appName):
-                        deployment_app_name = None
-                    
-                    new_deployment_and_flow.append((next_node, deployment_app_name, next_ap))
-
-            if i_time != -1 or len(new_deployment_and_flow) > 0:
-                if not base_flows_installed:
-                    Scenario.createDefaultMobilitySDNFlows(self)
-                    base_flows_installed = True
-                i_time += 1
-                MobilityStrategy.updateVisualization(self, i_time)
-            #
-            MobilityStrategy.updateDeploymentsAndFlows(self, nodes_load, new_deployment_and_flow)
+    def controller_reactive(self):
+        MobilityStrategy.controller(self, MobilityStrategy.decideReactive)
 
-    def run(self):
-        # Setup kind cluster
-        self.clusterName = Scenario.startKindController(self)
-        print(f"Cluster name: {self.clusterName}")
-        #
-        Scenario.createService(self, self.appName, self.appName + '-service', self.serviceType, self.containerPort, self.targetPort, self.nodePort, self.tag)
-        #
+    def controller_predictive(self):
+        MobilityStrategy.controller(self, MobilityStrategy.decidePredictive)
+
+    def serviceSpec(self):
+        return dict(appName=self.appName, serviceName=self.appName + '-service', serviceType=self.serviceType,
+                    port=self.containerPort, targetPort=self.targetPort, nodePort=self.nodePort, tag=self.tag)
+
+    def initialDeployments(self):
+        # The app starts on the first worker only
         firstDeploymentNodeName = self.clusterName + '-worker'
         deploymentName = self.appName + '-deployment-1'
-        Scenario.createDeployment(self, self.appName, deploymentName, self.containerPort, 1, firstDeploymentNodeName, self.tag)
-        #
-        Scenario.launchSDNController(self)
+        return [dict(appName=self.appName, deploymentName=deploymentName, containerPort=self.containerPort,
+                     numReplicas=1, nodeName=firstDeploymentNodeName, tag=self.tag)]
+
+    def closeOutputs(self):
+        self.profiler.close()
+        self.stateWriter.stop()
+        self.metricsSink.close()
+        MetricsSink.convert(Scenario.outputPath(self, MobilityStrategy.METRICS_FILE), Scenario.outputPath(self, MobilityStrategy.VISUALIZATION_FILE))
+        if self.recorder is not None:
+            self.recorder.close()
+            print(f"Trace recorder metrics: {self.recorder.getMetrics()}")
+        self.tracer.close()
+        print(f"Migration tracer metrics: {self.tracer.getMetrics()}")
+        if self.scheduler is not None:
+            print(f"Handover scheduler metrics: {self.scheduler.getMetrics()}")
+
+    def run(self):
+        # Setup kind cluster, service, first deployment and SDN controller (concurrently)
+        self.clusterName = Scenario.bootstrap(self, [MobilityStrategy.serviceSpec(self)], lambda: MobilityStrategy.initialDeployments(self))
+        print(f"Cluster name: {self.clusterName}")
+
+        self.stateWriter.start()
 
         # Start position tracker threads
         positionTrackerThread = threading.Thread(target=self.positionTracker, args=(self.numCars,), daemon=True)
@@ -412,5 +478,14 @@ class MobilityStrategy(Scenario):
         MobilityStrategy.STOP_SIMULATION = True
         positionTrackerThread.join()
         controller.join()
-    
+
+        self.migrationExecutor.stop()
+        self.flowQueue.stop()
+        MobilityStrategy.closeOutputs(self)
+        self.associationTracker.close()
+        print(f"Association tracker metrics: {self.associationTracker.getMetrics()}")
+        print(f"Flow queue metrics: {self.flowQueue.getMetrics()}")
+        print(f"Migration executor metrics: {self.migrationExecutor.getMetrics()}")
+        print(f"State writer metrics: {self.stateWriter.getMetrics()}")
+        print(f"Kubernetes timings: {self.kindController.getTimings()}")
         print("Exiting...")
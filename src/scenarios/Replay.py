@@ -0,0 +1,273 @@
+#
+# Deterministic re-run of a recorded live run (see scenarios.TraceRecorder).
+#
+# The recorded telemetry samples and controller ticks are fed, in order, to the same scenario
+# class on the headless engine (scenarios.Simulation). Association lookups, Kubernetes calls and
+# flow mods are answered with the recorded results and latencies, so the controller sees exactly
+# the inputs of the live run, and pods become Ready when the trace says so (older traces without pod
+# Ready events fall back to the simulated readiness). Whatever the current control logic asks for
+# that the trace cannot answer (a different deployment, a new flow) falls back to the simulated
+# backends and is counted as a divergence; recorded decisions are compared with the replayed ones
+# tick by tick.
+#
+#   python3 -m scenarios.Replay trace.jsonl.gz [max|realtime|<speed factor>] [output dir]
+#
+import sys
+import json
+import math
+import time
+import numpy as np
+from collections import deque
+
+from scenarios.TraceRecorder import TraceRecorder
+from scenarios.Simulation import HeadlessSimulation, FakeKubernetesController, FakeSDNClient, ImmediateFlowQueue, scenarioClassFor
+
+def flowKey(cmd, dpid, priority, match):
+    return json.dumps([cmd, dpid, priority, match], sort_keys=True)
+
+class ReplayKubernetesController(FakeKubernetesController):
+
+    def __init__(self, configPath, clock, clusterName, workers, calls):
+        super().__init__(configPath, clock)
+        self.clusterName = clusterName
+        self.workers = workers
+        self.calls = calls # {(operation, name): deque([(result, seconds)])}
+        self.current = None
+        self.divergences = 0
+        self.readyFromTrace = False # Pods only become Ready with the recorded events (Replay.run, once bootstrapped)
+
+    def getNodeInfo(self):
+        if self.workers is None:
+            return super().getNodeInfo()
+        return dict(self.workers)
+
+    def latencyOf(self, operation):
+        if operation == 'podReady' and self.readyFromTrace:
+            return math.inf
+        if self.current is not None:
+            return self.current[1]
+        return super().latencyOf(operation)
+
+    def __replay(self, operation, name, apply):
+        queue = self.calls.get((operation, name), None)
+        if not queue:
+            # Not in the trace, the simulated cluster answers
+            self.divergences += 1
+            return apply()
+        self.current = queue.popleft()
+        try:
+            result = self.current[0]
+            if result >= 2:
+                # Failed in the live run: nothing was created or deleted
+                self.cost(operation)
+            else:
+                apply()
+            return result
+        finally:
+            self.current = None
+
+    def createService(self, service):
+        return self.__replay('createService', service.metadata.name, lambda: super(ReplayKubernetesController, self).createService(service))
+
+    def createDeployment(self, deployment):
+        return self.__replay('createDeployment', deployment.metadata.name, lambda: super(ReplayKubernetesController, self).createDeployment(deployment))
+
+    def deleteDeployment(self, deploymentName):
+        return self.__replay('deleteDeployment', deploymentName, lambda: super(ReplayKubernetesController, self).deleteDeployment(deploymentName))
+
+class ReplaySDNClient(FakeSDNClient):
+
+    def __init__(self, clock, results):
+        super().__init__(clock)
+        self.results = results # {flowKey: deque([(ok, seconds)])}
+        self.divergences = 0
+
+    def modFlows(self, flowMods):
+        if len(flowMods) == 0:
+            return []
+        self.requests += 1
+        results = []
+        for (cmd, payload) in flowMods:
+            self.flowMods[cmd] = self.flowMods.get(cmd, 0) + 1
+            queue = self.results.get(flowKey(cmd, payload['dpid'], payload.get('priority', 0), payload.get('match', {})), None)
+            if not queue:
+                self.divergences += 1
+                self.busy += self.latencies['flowMod']
+                results.append(True)
+                continue
+            ok, seconds = queue.popleft()
+            self.busy += seconds
+            results.append(ok)
+        return results
+
+class ReplayAssociation:
+
+    def __init__(self, associations):
+        self.associations = associations # {car_id: deque([ap_id])}
+        self.lookups = 0
+        self.divergences = 0
+
+    def setPosition(self, car_id, x, y):
+        pass
+
+    def getAssociatedAP(self, car_id):
+        self.lookups += 1
+        queue = self.associations.get(car_id, None)
+        if not queue:
+            self.divergences += 1
+            return None
+        return queue.popleft()
+
+    def getMetrics(self):
+        return {'lookups': self.lookups, 'divergences': self.divergences}
+
+    def close(self):
+        pass
+
+class Replay(HeadlessSimulation):
+
+    def __init__(self, path, speed=0.0, output_dir='.'):
+        # speed: 0 replays as fast as possible, 1.0 in real time, 2.0 twice as fast...
+        self.path = path
+        self.speed = speed
+
+        header = None
+        clusterName = None
+        workers = None
+        decideName = None
+        scheduler = None
+        calls = {}
+        results = {}
+        associations = {}
+        self.decisions = [] # Recorded decision of each tick
+        self.stream = [] # Samples, controller start and ticks, in order
+        for event in TraceRecorder.readEvents(path):
+            kind = event[1]
+            if kind == 'h':
+                header = event[2]
+            elif kind == 'w':
+                clusterName, workers = event[2], event[3]
+            elif kind == 'a':
+                associations.setdefault(event[2], deque()).append(event[3])
+            elif kind == 'k':
+                calls.setdefault((event[2], event[3]), deque()).append((event[4], event[5] / 1000))
+            elif kind == 'f':
+                mods = event[3]
+                for (cmd, dpid, priority, match, ok) in mods:
+                    results.setdefault(flowKey(cmd, dpid, priority, match), deque()).append((ok, event[2] / 1000 / len(mods)))
+            elif kind == 'd':
+                self.decisions.append(event[2])
+            elif kind in ('s', 't', 'r', 'c', 'p'):
+                if kind == 'c' and event[2] is not None:
+                    decideName = event[2]
+                if kind == 'c' and len(event) > 3:
+                    scheduler = event[3]
+                self.stream.append(event)
+        if header is None:
+            raise ValueError(f"{path} has no header, not a scenario trace")
+
+        scenarioClass = scenarioClassFor(header['kindConfig'])
+        super().__init__(header['kindConfig'], header['mininetConfig'], np.zeros((0, header['numCars'], 2)),
+                         output_dir=output_dir, scenarioClass=scenarioClass)
+        if decideName is not None:
+            self.decide = getattr(scenarioClass, decideName)
+            self.strategy = decideName
+            self.scenario.tracer.strategy = decideName
+        if scheduler is not None:
+            # Same handover scheduler as the live run, created by startController
+            self.scenario.HANDOVER_LOOKAHEAD = scheduler['lookahead']
+            self.scenario.HANDOVER_VELOCITY_CHANGE = scheduler['velocityChange']
+
+        # Recorded answers instead of the simulated ones
+        scenario = self.scenario
+        scenario.sdnClient = ReplaySDNClient(self.clock, results)
+        scenario.flowQueue = ImmediateFlowQueue(scenario.sdnClient)
+        scenario.associationTracker = ReplayAssociation(associations)
+        scenario.kindController = ReplayKubernetesController(header['kindConfig'], self.clock, clusterName or scenario.kindController.clusterName, workers, calls)
+
+        self.ticks = 0
+        self.decisionMismatches = 0
+
+    def step(self, react=False):
+        # One recorded tick, or one recorded decision between ticks (react)
+        if self.decide is None:
+            super().step()
+            self.ticks += 1
+            return
+        decided = self.ticks + self.reacts # Recorded decisions of the ticks and reacts so far
+        recorded = self.decisions[decided] if decided < len(self.decisions) else None
+
+        def decide(scenario, snapshot):
+            result = self.decide(scenario, snapshot)
+            # Same JSON round trip as the recorded decision
+            if recorded is not None and json.loads(json.dumps([list(decision) for decision in result[0]])) != recorded:
+                self.decisionMismatches += 1
+            return result
+
+        if react:
+            self.scenarioClass.reactStep(self.scenario, decide)
+            self.reacts += 1
+        else:
+            self.scenarioClass.controllerStep(self.scenario, decide)
+            self.ticks += 1
+
+    def run(self):
+        scenario = self.scenario
+        start = time.perf_counter()
+        self.start()
+        scenario.kindController.readyFromTrace = any(event[1] == 'p' for event in self.stream)
+        t0 = self.clock.now()
+        first = None
+        started = False
+        for event in self.stream:
+            t, kind = event[0], event[1]
+            if first is None:
+                first = t
+            if self.speed > 0:
+                delay = (t - first) / self.speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            self.clock.advanceTo(t0 + t - first)
+
+            if kind == 's':
+                scenario.onTelemetrySample(event[2], self.clock.now(), event[3], event[4])
+            elif kind == 'c' or (kind == 't' and not started):
+                self.scenarioClass.startController(scenario)
+                started = True
+            if kind == 't':
+                self.step()
+            elif kind == 'r' and started:
+                self.step(react=True)
+            elif kind == 'p':
+                scenario.kindController.cache.markReady(event[2], event[3], self.clock.now())
+
+        return self.finish(time.perf_counter() - start)
+
+    def summary(self, wall):
+        summary = super().summary(wall)
+        summary['ticks'] = self.ticks
+        summary['replay'] = {
+            'trace': self.path,
+            'events': len(self.stream),
+            'speed': self.speed,
+            'divergences': {
+                'associations': self.scenario.associationTracker.divergences,
+                'kubernetes': self.scenario.kindController.divergences,
+                'sdn': self.scenario.sdnClient.divergences,
+                'decisions': self.decisionMismatches,
+            },
+        }
+        return summary
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python3 -m scenarios.Replay <trace.jsonl.gz> [max|realtime|<speed factor>] [output dir]")
+        sys.exit(1)
+    pacing = sys.argv[2] if len(sys.argv) > 2 else 'max'
+    speed = {'max': 0.0, 'realtime': 1.0}.get(pacing, None)
+    if speed is None:
+        speed = float(pacing)
+    outputDir = sys.argv[3] if len(sys.argv) > 3 else '.'
+
+    replay = Replay(sys.argv[1], speed=speed, output_dir=outputDir)
+    print(json.dumps(replay.run(), indent=4, default=str))
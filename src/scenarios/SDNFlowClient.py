@@ -0,0 +1,58 @@
+#
+# Client for the flow entry REST API of the SDN controller (sdnRyu/ofctl_rest.py).
+#
+# All requests go through one keep-alive session, and many flow mods (for any number of
+# switches) can be sent in a single request to POST /stats/flowentry/batch.
+#
+import requests
+from requests.adapters import HTTPAdapter
+
+class SDNFlowClient:
+
+    def __init__(self, baseUrl='http://localhost:8080', poolSize=16, timeout=10):
+        self.baseUrl = baseUrl
+        self.timeout = timeout
+        self.batchSupported = True
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=poolSize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def __post(self, path, payload):
+        response = self.session.post(f'{self.baseUrl}{path}', json=payload, timeout=self.timeout)
+        if response.status_code != 200:
+            print(f"Error sending the request to the SDN controller: {response.status_code} : {response.text}")
+        return response
+
+    def modFlow(self, cmd, payload):
+        # Send a single flow mod (cmd is add, modify, modify_strict, delete or delete_strict)
+        return self.__post(f'/stats/flowentry/{cmd}', payload).status_code == 200
+
+    def addFlow(self, payload):
+        return self.modFlow('add', payload)
+
+    def deleteFlow(self, payload):
+        return self.modFlow('delete', payload)
+
+    def modFlows(self, flowMods):
+        # Send a list of (cmd, payload) in one round trip.
+        # Returns the list of per-flow results (True if applied).
+        if len(flowMods) == 0:
+            return []
+
+        if self.batchSupported:
+            batch = [dict(payload, cmd=cmd) for (cmd, payload) in flowMods]
+            response = self.__post('/stats/flowentry/batch', batch)
+            if response.status_code == 200:
+                return [status == 200 for status in response.json()]
+            if response.status_code not in (404, 405):
+                return [False] * len(flowMods)
+            # The controller does not have the batch endpoint, use one request per flow
+            print("SDN controller does not support batched flow entries, sending them one by one...")
+            self.batchSupported = False
+
+        return [self.modFlow(cmd, payload) for (cmd, payload) in flowMods]
+
+    def close(self):
+        self.session.close()
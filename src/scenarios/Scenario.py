@@ -1,13 +1,28 @@
 from kind.kubernetesController import KubernetesController
-from mininetwf.mininetController import MininetController
-
+from scenarios.APIndex import APIndex
+from scenarios.Geometry import rayCircleExit, rayCircleExitBatch
+from scenarios.Backends import createSDNClient, createKubernetesController, sdnType
+from scenarios.FlowQueue import FlowQueue
+from scenarios.MigrationExecutor import MigrationExecutor, Migration
+from scenarios.Bootstrap import BootstrapPipeline
+from scenarios.AssociationTracker import AssociationTracker
+from scenarios.FlowTable import FlowTable
+from scenarios.Topology import Topology
+from scenarios.TickProfiler import TickProfiler
+from scenarios.TraceRecorder import TraceRecorder, RecordingKubernetesController, RecordingSDNClient
+
+import os
 import subprocess
+import threading
 import json
 import math
-import requests
+import numpy as np
 
 class Scenario:
 
+    MIGRATION_DRAIN = MigrationExecutor.DRAIN # Seconds the old deployment keeps serving after a migration's redirect
+    MIGRATION_READY_TIMEOUT = MigrationExecutor.READY_TIMEOUT # Seconds a migration waits for a Ready pod
+
     SDN_PAYLOAD = {
             "dpid": 0,
             "cookie": 0,
@@ -21,11 +36,17 @@ class Scenario:
             "actions": []
         }
 
-    def __init__(self, kindCfg, mininetCfg, sdnController, force_restart=False):
+    def __init__(self, kindCfg, mininetCfg, sdnController, force_restart=False, warm_pool=False, output_dir='.', record=None, profile=False, backends=None, migration_drain=None):
         self.kindCfg = kindCfg
         self.mininetCfg = mininetCfg
         self.sdnController = sdnController
         self.force_restart = force_restart
+        self.warm_pool = warm_pool # Keep the kind cluster between runs and reset it instead of recreating it
+        self.output_dir = output_dir # Metrics, state dumps and logs of the run
+        self.backends = backends or {} # {'sdn': config, 'kubernetes': config}, see scenarios.Backends
+        if migration_drain is not None:
+            self.MIGRATION_DRAIN = migration_drain
+        os.makedirs(output_dir, exist_ok=True)
 
         with open(mininetCfg, 'r') as file:
             print(f"Using config file: {mininetCfg}")
@@ -33,12 +54,45 @@ class Scenario:
             self.accessPoints = mnCfg['aps']
             self.numCars = mnCfg['cars']['count']
 
+        # Parsed AP positions and grid index, built once for every geometry query
+        self.apIndex = APIndex(self.accessPoints)
+        self.apCoords = np.array(self.apIndex.positions, dtype=float).reshape(-1, 2)
+        # Backhaul graph (linkTo) with the hop and latency matrices between APs and worker nodes
+        self.topology = Topology(self.accessPoints)
+        # Node that should serve each AP (config order): its own, else the one with the lowest backhaul latency
+        self.apBestNodes = self.topology.apNearestNode
+        self.apNodeIds = np.array([-1 if node is None else int(node) for node in self.apBestNodes], dtype=np.int64)
+
+        # Car -> AP associations, shared by every car (one station dump per AP per tick at most)
+        self.associationTracker = AssociationTracker([ap['id'] for ap in self.accessPoints])
+
+        # Per-tick phase timings of the control loop (profile.json), no-ops unless enabled
+        self.profiler = TickProfiler(profile, self.outputPath('profile.json'))
+
+        # Optional trace of every controller input (record: path of the trace), see scenarios.Replay
+        self.recorder = None
+        if record is not None:
+            self.recorder = TraceRecorder(record)
+            self.recorder.header(type(self).__name__, kindCfg, mininetCfg, self.numCars)
+
         self.kindController = None
+        self.sdnClient = createSDNClient(self.backends.get('sdn', None))
+        if self.recorder is not None:
+            self.sdnClient = RecordingSDNClient(self.sdnClient, self.recorder)
+        self.flowQueue = FlowQueue(self.sdnClient) # Non-blocking flow programming for the control loops
+        self.flowTable = FlowTable(self.getDpid) # Flows installed on the AP switches, updated with every SDN call
+        self.flowTable.lock = self.profiler.wrapLock('flow_table', self.flowTable.lock)
+        self.migrationExecutor = MigrationExecutor() # Make-before-break migrations: redirect on pod Ready, delete after the drain period
         self.dockerImages = [] # List of docker images loaded
         self.workers = {} # {worker_name: worker_ip}
         self.services = {} # {service_name: service_object}
         self.deployments = {} # {worker_name: [deployment_objects]}
+        self.deploymentsLock = threading.Lock() # Deployments are created concurrently during bootstrap
+        self.bootstrapPipeline = None
     
+    def outputPath(self, name):
+        return os.path.join(self.output_dir, name)
+
     def getNumberOfNodes(self):
         return len(self.workers)
 
@@ -52,8 +106,11 @@ class Scenario:
         return len(self.deployments)
 
     def deleteDeployment(self, worker_name, deployment_name):
-        self.kindController.deleteDeployment(deployment_name)
-        del self.deployments[worker_name]
+        with self.profiler.phase('k8s'):
+            self.kindController.deleteDeployment(deployment_name)
+        with self.deploymentsLock:
+            # Migrations delete from the executor thread
+            self.deployments.pop(worker_name, None)
 
     def getBootstrap_worker_ip(self):
         return self.workers[self.kindController.clusterName + '-worker']
@@ -62,27 +119,37 @@ class Scenario:
         return cluster_name + '-worker' + (worker_id if worker_id != '1' else '')
 
     def convertWorkerNameToId(self, worker_name):
-        # Get the last character of the worker name
-        last_char = worker_name[-1]
-        # If the last character is a digit, return it
-        if last_char.isdigit():
-            return int(last_char)
+        # Trailing number of the worker name (<cluster>-worker12 -> 12), kind's first worker has none
+        digits = len(worker_name) - len(worker_name.rstrip('0123456789'))
+        if digits > 0:
+            return int(worker_name[-digits:])
         else:
             return 1
 
     def startKindController(self) -> KubernetesController:
         # Start the kind controller and get the workers
-        self.kindController = KubernetesController(self.kindCfg)
+        self.kindController = createKubernetesController(self.kindCfg, self.backends.get('kubernetes', None), self.warm_pool)
         self.kindController.startCluster(self.force_restart)
+        if self.recorder is not None:
+            self.kindController = RecordingKubernetesController(self.kindController, self.recorder)
 
         self.workers = self.kindController.getNodeInfo()
+        if self.recorder is not None:
+            self.recorder.workers(self.kindController.clusterName, self.workers)
+
+        # Follow the deployments and pods of the cluster, so placement checks are local lookups
+        try:
+            self.kindController.startCache()
+        except Exception as e:
+            print(f"Could not start the deployment cache, using local deployment lists: {e}")
 
         return self.kindController.clusterName
     
-    def createService(self, appName, serviceName, serviceType, port, targetPort, nodePort, tag='latest'):
+    def createService(self, appName, serviceName, serviceType, port, targetPort, nodePort, tag='latest', loadImage=True):
         #
         imageName = f'{appName}:{tag}'
-        self.kindController.loadDockerImages(imageName)
+        if loadImage:
+            self.kindController.loadDockerImages(imageName)
         #
         serviceObject = self.kindController.createServiceObject(serviceName, 
                                                        serviceType, 
@@ -119,29 +186,127 @@ class Scenario:
                                                              nodeName, 
                                                              appName)
 
-        deploymentResult = self.kindController.createDeployment(deploymentObject)
-        if deploymentResult == 0:
-            # Fresh deployment
-            workerDeployments = self.deployments.get(nodeName, [])
-            workerDeployments.append(deploymentObject)
-            self.deployments[nodeName] = workerDeployments
-
-        elif deploymentResult == 1:
-            # Deployment already exists but it might be from previous runs
-            # Check if the deployment is from previous runs
-            workerDeployments = self.deployments.get(nodeName, [])
-            for deployment in workerDeployments:
-                if deployment.metadata.name == deploymentName:
-                    # Deployment exists
-                    return deploymentResult
-            
-            # Deployment does not exist, it is from previous runs
-            workerDeployments.append(deploymentObject)
-            self.deployments[nodeName] = workerDeployments
+        with self.profiler.phase('k8s'):
+            deploymentResult = self.kindController.createDeployment(deploymentObject)
+        with self.deploymentsLock:
+            if deploymentResult == 0:
+                # Fresh deployment
+                workerDeployments = self.deployments.get(nodeName, [])
+                workerDeployments.append(deploymentObject)
+                self.deployments[nodeName] = workerDeployments
+
+            elif deploymentResult == 1:
+                # Deployment already exists but it might be from previous runs
+                # Check if the deployment is from previous runs
+                workerDeployments = self.deployments.get(nodeName, [])
+                for deployment in workerDeployments:
+                    if deployment.metadata.name == deploymentName:
+                        # Deployment exists
+                        return deploymentResult
+                
+                # Deployment does not exist, it is from previous runs
+                workerDeployments.append(deploymentObject)
+                self.deployments[nodeName] = workerDeployments
 
         return deploymentResult
 
+    def bootstrap(self, services, deployments, waitForReady=True, readyTimeout=120):
+        #
+        # Bring the experiment up concurrently:
+        #   cluster -> image loads -> deployments -> readiness barrier
+        #   cluster -> services
+        #   SDN controller (independent of the cluster)
+        # services: list of dicts with the createService arguments
+        # deployments: function returning a list of dicts with the createDeployment arguments,
+        #              called once the cluster is up (worker names and count are known then)
+        # Returns the cluster name.
+        #
+        pipeline = BootstrapPipeline()
+        self.bootstrapPipeline = pipeline
+
+        def startCluster():
+            self.clusterName = Scenario.startKindController(self)
+            return self.clusterName
+
+        def addDeploymentTasks():
+            # The deployments depend on the workers, so they join the graph once the cluster is up
+            for deployment in deployments():
+                imageName = f"{deployment['appName']}:{deployment.get('tag', 'latest')}"
+                task = f"deployment:{deployment['deploymentName']}"
+                pipeline.add(task, lambda deployment=deployment: Scenario.createDeployment(self, **deployment),
+                             dependsOn=[f'image:{imageName}'])
+                if waitForReady:
+                    pipeline.add(f"ready:{deployment['deploymentName']}",
+                                 lambda deployment=deployment: Scenario.waitForDeploymentReady(self, deployment['deploymentName'], readyTimeout),
+                                 dependsOn=[task])
+
+        pipeline.add('cluster', startCluster)
+        pipeline.add('sdn:controller', lambda: Scenario.launchSDNController(self))
+        pipeline.add('plan:deployments', addDeploymentTasks, dependsOn=['cluster'])
+
+        imageNames = set()
+        for service in services:
+            imageNames.add(f"{service['appName']}:{service.get('tag', 'latest')}")
+            pipeline.add(f"service:{service['serviceName']}",
+                         lambda service=service: Scenario.createService(self, loadImage=False, **service),
+                         dependsOn=['cluster'])
+        for imageName in sorted(imageNames):
+            pipeline.add(f'image:{imageName}', lambda imageName=imageName: self.kindController.loadDockerImages(imageName), dependsOn=['cluster'])
+
+        failed = pipeline.run()
+        pipeline.printTimings()
+        for task in failed:
+            if task.name == 'cluster':
+                raise RuntimeError(f"Could not start the cluster: {task.error}")
+
+        return self.clusterName
+
+    def waitForDeploymentReady(self, deploymentName, timeout=120):
+        # Block until the deployment has a Ready replica (needs the deployment cache)
+        if not self.kindController.isCacheSynced():
+            print(f"Deployment cache not available, not waiting for {deploymentName}")
+            return False
+        if not self.kindController.cache.waitForDeployment(deploymentName, timeout):
+            print(f"Timed out waiting for {deploymentName} to be ready")
+            return False
+        return True
+
+    def redirectWhenReady(self, nodeName, appName, aps, retire=None, onRedirected=None, onAborted=None):
+        # Switch the traffic of aps to nodeName once a pod of appName is Ready there (now if it already is),
+        # then call retire() after the drain period. Returns immediately, see scenarios.MigrationExecutor.
+        executor = self.migrationExecutor
+        cache = self.kindController.cache if self.kindController is not None and self.kindController.isCacheSynced() else None
+        if cache is None:
+            print(f"Deployment cache not available, redirecting to {nodeName} without waiting for {appName}")
+            isReady = lambda: True
+        else:
+            if executor.onPodReady not in cache.readyListeners:
+                cache.addReadyListener(executor.onPodReady)
+            isReady = lambda: cache.isReadyAt(nodeName, appName)
+
+        def redirect(done):
+            remaining = [len(aps), True]
+            lock = threading.Lock()
+            def acked(ok):
+                with lock:
+                    remaining[0] -= 1
+                    remaining[1] = remaining[1] and ok
+                    finished = remaining[0] == 0
+                if finished:
+                    done(remaining[1])
+
+            if len(aps) == 0:
+                done(True)
+            for ap_id in aps:
+                Scenario.redirectTrafficSDN(self, nodeName, ap_id, wait=False, onDone=acked)
+
+        migration = Migration((appName,) + tuple(str(ap_id) for ap_id in aps), nodeName, appName, redirect, retire, onRedirected, onAborted)
+        return executor.submit(migration, isReady, self.MIGRATION_DRAIN, self.MIGRATION_READY_TIMEOUT)
+
     def launchSDNController(self):
+        if sdnType(self.backends.get('sdn', None)) != 'ryu':
+            print(f"Using the {sdnType(self.backends['sdn'])} SDN backend, not launching ryu-manager")
+            return
         # Launch a new terminal and run the controller with 'ryu-manager'
         command = f'ryu-manager {self.sdnController}'
         print(f"Launching SDN controller with command: {command}")
@@ -156,79 +321,59 @@ class Scenario:
             file.write(f'[DEFAULT]\n')
             file.write(f'bootstrap_worker_ip = {bootstrap_worker_ip}\n')
 
+        # Imported here, so the scenarios can also be driven without mininet-wifi (see scenarios.Simulation)
+        from mininetwf.mininetController import MininetController
         mininetController = MininetController(self.mininetCfg)
         mininetController.startNetwork()
 
         return mininetController
     
     def getAssociatedAP(self, car_id):
-        #
-        car_mac = '02:00:00:00:%02x:00' % (car_id)
-
-        # Run the iw command for each AP until we get the car's MAC address
-        for ap in self.accessPoints:
-            # iw dev ap3-wlan1 station dump
-            result = subprocess.run(["iw", "dev", f"ap{ap['id']}-wlan1", "station", "dump"], capture_output=True, text=True)
-            if result.returncode != 0:
-                continue
-    
-            if car_mac in result.stdout:
-                return ap['id']
-        
-        return None
+        ap_id = self.associationTracker.getAssociatedAP(car_id)
+        if self.recorder is not None:
+            self.recorder.association(car_id, ap_id)
+        return ap_id
     
     def closestAP(self, x, y):
-        carPos = [x, y]
-        closestAp = None
-        minDistance = None
-        for ap in self.accessPoints:
-            apPos = ap['position'].split(',')[0:2]
-            apPos = [float(i) for i in apPos]
-            distance = math.dist(carPos, apPos)
-            if minDistance is None:
-                minDistance = distance
-
-            if distance <= minDistance:
-                minDistance = distance
-                closestAp = ap['id']
-
-        return closestAp
+        return self.apIndex.nearestId(x, y)
 
     def getNodeByAP(self, apID):
-        if apID is None:
-            return None
-        for ap in self.accessPoints:
-            if ap['id'] == apID:
-                return ap['kindNode']
-        return None
+        return self.topology.nearestNode(apID)
 
     def isAPInRange(self, x, y, ap_id, range=300):
-        carPos = [x, y]
-        for ap in self.accessPoints:
-            if ap['id'] == ap_id:
-                apPos = ap['position'].split(',')[0:2]
-                apPos = [float(i) for i in apPos]
-                distance = math.dist(carPos, apPos)
-                return distance <= range
-        return False
+        apPos = self.apIndex.position(ap_id)
+        if apPos is None:
+            return False
+        return math.dist([x, y], apPos) <= range
 
     def apAndNodeInRange(self, x, y, direction, range=300):
         carPos = [x, y]
-        for ap in self.accessPoints:
-            apPos = ap['position'].split(',')[0:2]
-            apPos = [float(i) for i in apPos]
-            distance = math.dist(carPos, apPos)
-            if distance <= range:
-                migrate = self.isCarPastAP(carPos, apPos, direction)
-                return (ap['id'], ap['kindNode'], migrate)
+        inRange = self.apIndex.inRange(x, y, range)
+        if len(inRange) > 0:
+            i = inRange[0]
+            migrate = self.isCarPastAP(carPos, self.apIndex.positions[i], direction)
+            return (self.apIndex.ids[i], self.apBestNodes[i], migrate)
         return (None, None, False)
     
     def isDeployedAt(self, workerName, appName):
+        if self.kindController is not None and self.kindController.isCacheSynced():
+            return self.kindController.cache.isDeployedAt(workerName, appName)
+
         for deployment in self.deployments.get(workerName, []):
             if deployment.spec.selector['matchLabels']['app'] == appName:
                 return True
         return False
 
+    def getDeployedApps(self):
+        # {worker_name: [app_name]}, as running in the cluster when the deployment cache is synced
+        if self.kindController is not None and self.kindController.isCacheSynced():
+            return self.kindController.cache.getDeployedApps()
+
+        deployed = {}
+        for (worker_name, deployment_list) in self.deployments.items():
+            deployed[worker_name] = [deployment.spec.selector['matchLabels']['app'] for deployment in deployment_list]
+        return deployed
+
     # Check if the car has passed the AP if it is moving to certain direction
     def isCarPastAP(self, carPos, apPos, direction):
         return not self.checkDirection(carPos, apPos, direction)
@@ -248,53 +393,46 @@ class Scenario:
 
     def nextApAndNode(self, x, y, direction, range=300):
         carPos = [x, y]
-        nextAp = None
-        nextNode = None
-        minDistance = None
-        for ap in self.accessPoints:
-            apPos = ap['position'].split(',')[0:2]
-            apPos = [float(i) for i in apPos]
-            distance = math.dist(carPos, apPos)
-            if distance > range or self.checkDirection(carPos, apPos, direction):
-                if minDistance is None:
-                    minDistance = distance
-
-                if distance <= minDistance:
-                    minDistance = distance
-                    nextAp = ap['id']
-                    nextNode = ap['kindNode']
-
-        return (nextAp, nextNode)
+
+        def isCandidate(i):
+            apPos = self.apIndex.positions[i]
+            return math.dist(carPos, apPos) > range or self.checkDirection(carPos, apPos, direction)
+
+        i = self.apIndex.nearest(x, y, predicate=isCandidate)
+        if i is None:
+            return (None, None)
+        return (self.apIndex.ids[i], self.apBestNodes[i])
     
     def distanceInRange(self, x, y, dx, dy, ap_id, range=300):
         if ap_id is None:
             return 0
 
-        carPos = [x, y]
-        
-        apPos = None
-        for ap in self.accessPoints:
-            if int(ap['id']) == int(ap_id):
-                apPos = ap['position'].split(',')[0:2]
-                apPos = [float(i) for i in apPos]
-                break
+        apPos = self.apIndex.position(ap_id)
 
         if apPos is None:
             print("apPos is null")
             return 0
 
-        distance_iter = math.sqrt(dx**2 + dy**2)
-        if distance_iter == 0:
-            return range - math.dist(carPos, apPos)
-
-        distance = 0
-        theoreticalPos = carPos[:]
-        while math.dist(theoreticalPos, apPos) <= range:
-            theoreticalPos[0] += dx
-            theoreticalPos[1] += dy
-            distance += distance_iter
-        
+        # Distance along (dx, dy) until the car leaves the AP's disc
+        distance, _ = rayCircleExit(x, y, dx, dy, apPos[0], apPos[1], range)
         return distance
+
+    def apIndexesOf(self, ap_ids):
+        # Convert AP ids to indexes in self.apIndex (-1 where the AP is unknown)
+        return np.array([-1 if i is None else i for i in map(self.apIndex.indexOf, ap_ids)], dtype=np.int64)
+
+    def apCenters(self, ap_indexes):
+        # (N, 2) array with the position of each AP index, NaN where the index is -1
+        ap_indexes = np.asarray(ap_indexes, dtype=np.int64)
+        centers = np.full((len(ap_indexes), 2), np.nan)
+        known = ap_indexes >= 0
+        centers[known] = self.apCoords[ap_indexes[known]]
+        return centers
+
+    def distanceInRangeBatch(self, positions, directions, ap_indexes, range=300):
+        # Same as distanceInRange, for arrays of positions, directions and AP indexes of many cars
+        distances, _ = rayCircleExitBatch(positions, directions, self.apCenters(ap_indexes), range)
+        return distances
     
     def isLeavingAP(self, x, y, dx, dy, ap_id, range=300, threshold=0.20):
         # Check if the car at position x,y and moving in direction dx,dy is leaving the AP
@@ -305,89 +443,92 @@ class Scenario:
 
         return distance <= threshold * range
 
+    def isLeavingAPBatch(self, positions, directions, ap_indexes, range=300, threshold=0.20):
+        # Same as isLeavingAP, for arrays of positions, directions and AP indexes of many cars
+        distances = self.distanceInRangeBatch(positions, directions, ap_indexes, range)
+        return (distances != 0) & (distances <= threshold * range)
+
     def nextApInDirection(self, x, y, dx, dy, current_ap_id, range=300):
         # Get the theoretical position of the car after
         # moving in the direction dx,dy and reaching the range
-        carPos = [x, y]
-        theoreticalPos = carPos[:]
-        while math.dist(theoreticalPos, carPos) <= range:
-            theoreticalPos[0] += dx
-            theoreticalPos[1] += dy
+        step = math.hypot(dx, dy)
+        if step == 0:
+            # Not moving, there is no next AP to predict
+            return None
+        theoreticalPos = [x + dx / step * range, y + dy / step * range]
         
         # Find the closest AP to the theoretical position
         # Exclude the current AP
-        closestAp = None
-        minDistance = None
-        for ap in self.accessPoints:
-            if ap['id'] == current_ap_id:
-                continue
-
-            apPos = ap['position'].split(',')[0:2]
-            apPos = [float(i) for i in apPos]
-            distance = math.dist(theoreticalPos, apPos)
-            if minDistance is None:
-                minDistance = distance
-
-            if distance <= minDistance:
-                minDistance = distance
-                closestAp = ap['id']
-        
-        return closestAp
+        return self.apIndex.nearestId(theoreticalPos[0], theoreticalPos[1], exclude=current_ap_id)
+
+    def nextApInDirectionBatch(self, positions, directions, ap_indexes, range=300):
+        # Same as nextApInDirection for many cars: returns the next AP index of each car (-1 if none)
+        p = np.asarray(positions, dtype=float).reshape(-1, 2)
+        d = np.asarray(directions, dtype=float).reshape(-1, 2)
+        step = np.hypot(d[:, 0], d[:, 1])
+        moving = step > 0
+        theoreticalPos = p + np.divide(d, step[:, None], out=np.zeros_like(d), where=moving[:, None]) * range
+
+        next_aps = np.full(len(p), -1, dtype=np.int64)
+        for row in np.flatnonzero(moving):
+            current = int(ap_indexes[row])
+            i = self.apIndex.nearest(theoreticalPos[row, 0], theoreticalPos[row, 1],
+                                     exclude=self.apIndex.ids[current] if current >= 0 else None)
+            if i is not None:
+                next_aps[row] = i
+        return next_aps
     
     def getAPsAssociatedWithWorker(self, workerID):
-        aps = []
-        for ap in self.accessPoints:
-            if int(ap['kindNode']) == int(workerID):
-                aps.append(int(ap['id']))
-        return aps
+        return [int(ap_id) for ap_id in self.apIndex.apsOfNode(int(workerID))]
     
     def getDistanceFactorBetweenNodes(self, ap1, node2):
-        # The car is using node1 via ap1, but it should be using node2
-        # Get the ap_id of the closest AP that uses node2
-        # Return the different between the ap's
-        aps_list = self.getAPsAssociatedWithWorker(node2)
-        if len(aps_list) == 0:
-            print(f"No APs associated with worker {node2}")
+        # The car is connected to ap1 but served by node2:
+        # number of backhaul hops from ap1 to the closest AP of node2
+        hops = self.topology.hopsToNode(ap1, node2)
+        if hops is None:
+            print(f"No path from AP{ap1} to worker {node2}")
             return 0
-        
-        ap2_id = aps_list[0]
-        min_distance = None
-        for ap_id in aps_list:
-            for ap in self.accessPoints:
-                if ap['id'] == ap_id:
-                    apPos = ap['position'].split(',')[0:2]
-                    apPos = [float(i) for i in apPos]
-                    distance = math.dist(apPos, [0, 0])
-                    if min_distance is None:
-                        min_distance = distance
-
-                    if distance <= min_distance:
-                        min_distance = distance
-                        ap2_id = ap_id
-        
-        return abs(int(ap1) - ap2_id)
+        return hops
+
+    def __installApRedirects(self, redirects):
+        # redirects: [(ap_id, node_id)], sent in one request; the table keeps the ones that were applied
+        flowMods = []
+        for (ap_id, node_id) in redirects:
+            flowMods += self.redirectTrafficFlowMods(self.convertWorkerIdToName(self.clusterName, node_id), ap_id)
+
+        with self.profiler.phase('sdn'):
+            results = self.sdnClient.modFlows(flowMods)
+        for i, (ap_id, node_id) in enumerate(redirects):
+            if all(results[2 * i:2 * i + 2]):
+                self.flowTable.setApFlow(ap_id, node_id)
+        return results
 
     def createDefaultLoadBalancingSDNFlows(self):
-        for ap in self.accessPoints:
-            node = ap["kindNode"]
-            if node == '1':
-                continue
-            nodeName = self.clusterName + '-worker' + (node if node != '1' else '')
+        redirects = [(ap["id"], ap["kindNode"]) for ap in self.accessPoints if ap["kindNode"] != '1']
 
-            self.redirectTrafficSDN(nodeName, ap["id"])
+        # One request for the flows of every AP
+        results = self.__installApRedirects(redirects)
+        print(f"Default load balancing flows installed: {sum(results)}/{len(results)}...")
     
     def createDefaultMobilitySDNFlows(self):
-        for ap in self.accessPoints:
-            nodeName = self.clusterName + '-worker'
-            self.redirectTrafficSDN(nodeName, ap["id"])
+        redirects = [(ap["id"], '1') for ap in self.accessPoints]
+
+        # One request for the flows of every AP
+        results = self.__installApRedirects(redirects)
+        print(f"Default mobility flows installed: {sum(results)}/{len(results)}...")
 
     def getCarIPFromID(self, car_id):
-        return f'10.0.0.{car_id}'
+        # Same addressing as mininetController (10.0.0.x up to 255 cars, then the next octets, in 10.0.0.0/8)
+        car_id = int(car_id)
+        return f'10.{(car_id >> 16) & 0xff}.{(car_id >> 8) & 0xff}.{car_id & 0xff}'
 
-    def installFlowForVehicle(self, car_id, ap_id, worker_name):
+    def getDpid(self, ap_id):
+        return 1152921504606846977 + int(ap_id) - 1
+
+    def vehicleFlowMods(self, car_id, ap_id, worker_name):
         car_ip = self.getCarIPFromID(car_id)
         worker_ip = self.workers[worker_name]
-        dpid = 1152921504606846977 + int(ap_id) - 1
+        dpid = self.getDpid(ap_id)
         bootstrap_worker_ip = self.getBootstrap_worker_ip()
 
         payload_snat = self.SDN_PAYLOAD.copy()
@@ -413,11 +554,6 @@ class Scenario:
             }
         ]
         payload_snat['actions'] = snat_actions
-
-        response = requests.post('http://localhost:8080/stats/flowentry/add', json=payload_snat)
-        if response.status_code != 200:
-            print(f"Error sending the request to the SDN controller: {response.status_code} : {response.text}")
-            return
         
         payload_dnat = self.SDN_PAYLOAD.copy()
         payload_dnat['dpid'] = dpid
@@ -444,16 +580,29 @@ class Scenario:
         ]
         payload_dnat['actions'] = dnat_actions
 
-        response = requests.post('http://localhost:8080/stats/flowentry/add', json=payload_dnat)
-        if response.status_code != 200:
-            print(f"Error sending the request to the SDN controller: {response.status_code} : {response.text}")
+        return [('add', payload_snat), ('add', payload_dnat)]
+
+    def installFlowForVehicle(self, car_id, ap_id, worker_name, wait=True):
+        flowMods = self.vehicleFlowMods(car_id, ap_id, worker_name)
+        node_id = self.convertWorkerNameToId(worker_name)
+        if not wait:
+            # Enqueue and return, the flow queue sends it in the background (the previous flow is put back if it fails)
+            previous = self.flowTable.setVehicleFlow(car_id, ap_id, node_id)
+            with self.profiler.phase('sdn'):
+                self.flowQueue.enqueueMany(flowMods, lambda ok: ok or self.flowTable.restoreVehicleFlow(car_id, ap_id, node_id, previous))
             return
+
+        with self.profiler.phase('sdn'):
+            results = self.sdnClient.modFlows(flowMods)
+        if not all(results):
+            return
+        self.flowTable.setVehicleFlow(car_id, ap_id, node_id)
         
         print(f"Flow installed for car {car_id} at AP{ap_id} on Worker{worker_name}...")
 
-    def redirectTrafficSDN(self, workerName, nextAp):
+    def redirectTrafficFlowMods(self, workerName, nextAp):
         workerIP = self.workers[workerName]
-        dpid = 1152921504606846977 + int(nextAp) - 1
+        dpid = self.getDpid(nextAp)
         bootstrap_worker_ip = self.getBootstrap_worker_ip()
 
         payload_snat = self.SDN_PAYLOAD.copy()
@@ -480,12 +629,6 @@ class Scenario:
         ]
         payload_snat['actions'] = snat_actions
 
-        response = requests.post('http://localhost:8080/stats/flowentry/add', json=payload_snat)
-        if response.status_code != 200:
-            print(f"Error sending the request to the SDN controller: {response.status_code} : {response.text}")
-            return
-
-
         payload_dnat = self.SDN_PAYLOAD.copy()
         payload_dnat['dpid'] = dpid
         payload_dnat['priority'] = 10
@@ -510,46 +653,64 @@ class Scenario:
         ]
         payload_dnat['actions'] = dnat_actions
 
-        response = requests.post('http://localhost:8080/stats/flowentry/add', json=payload_dnat)
-        if response.status_code != 200:
-            print(f"Error sending the request to the SDN controller: {response.status_code} : {response.text}")
-            return
+        return [('add', payload_snat), ('add', payload_dnat)]
 
-        print(f"Redirecting traffic from base service IP to worker IP ({workerIP})...")
+    def redirectTrafficSDN(self, workerName, nextAp, wait=True, onDone=None):
+        # onDone(ok): called once the switch acknowledged (or refused) the redirect
+        flowMods = self.redirectTrafficFlowMods(workerName, nextAp)
+        node_id = self.convertWorkerNameToId(workerName)
+        if not wait:
+            # Enqueue and return, the flow queue sends it in the background (the previous redirect is put back if it fails)
+            previous = self.flowTable.setApFlow(nextAp, node_id)
 
-    def deleteSDNFlow(self, ap_id):
-        dpid = 1152921504606846977 + int(ap_id) - 1
-        
-        delete_payload = self.SDN_PAYLOAD.copy()
-        delete_payload['dpid'] = dpid
-        delete_payload['priority'] = 10
+            def done(ok):
+                if not ok:
+                    self.flowTable.restoreApFlow(nextAp, node_id, previous)
+                if onDone is not None:
+                    onDone(ok)
 
-        dnat_match = {
-            "in_port": 2,
-            "eth_type": 2048
-        }
-        delete_payload['match'] = dnat_match
-
-        response = requests.post('http://localhost:8080/stats/flowentry/delete', json=delete_payload)
-        if response.status_code != 200:
-            print(f"Error sending the request to the SDN controller: {response.status_code} : {response.text}")
+            with self.profiler.phase('sdn'):
+                self.flowQueue.enqueueMany(flowMods, done)
             return
-        
-        print(f"Deleted flow for in_port=2 on ap{ap_id}...")
-
-        delete_payload = self.SDN_PAYLOAD.copy()
-        delete_payload['dpid'] = dpid
-        delete_payload['priority'] = 10
 
-        dnat_match = {
-            "in_port": 1,
-            "eth_type": 2048
-        }
-        delete_payload['match'] = dnat_match
-
-        response = requests.post('http://localhost:8080/stats/flowentry/delete', json=delete_payload)
-        if response.status_code != 200:
-            print(f"Error sending the request to the SDN controller: {response.status_code} : {response.text}")
+        with self.profiler.phase('sdn'):
+            results = self.sdnClient.modFlows(flowMods)
+        if onDone is not None:
+            onDone(all(results))
+        if not all(results):
             return
-        
-        print(f"Deleted flow for in_port=1 on ap{ap_id}...")
+        self.flowTable.setApFlow(nextAp, node_id)
+
+        print(f"Redirecting traffic from base service IP to worker IP ({self.workers[workerName]})...")
+
+    def deleteFlowMods(self, ap_id):
+        dpid = self.getDpid(ap_id)
+        flowMods = []
+        for in_port in [2, 1]:
+            delete_payload = self.SDN_PAYLOAD.copy()
+            delete_payload['dpid'] = dpid
+            delete_payload['priority'] = 10
+            delete_payload['match'] = {
+                "in_port": in_port,
+                "eth_type": 2048
+            }
+            flowMods.append(('delete', delete_payload))
+        return flowMods
+
+    def deleteSDNFlow(self, ap_id, wait=True):
+        # The non-strict delete on in_port removes every flow of the AP's switch, vehicle flows included
+        flowMods = self.deleteFlowMods(ap_id)
+        if not wait:
+            # Enqueue and return, the flow queue sends it in the background; the flows are forgotten once it is acknowledged
+            flows = self.flowTable.getApFlows(ap_id)
+            with self.profiler.phase('sdn'):
+                self.flowQueue.enqueueMany(flowMods, lambda ok: ok and self.flowTable.clearAp(ap_id, flows))
+            return
+
+        with self.profiler.phase('sdn'):
+            results = self.sdnClient.modFlows(flowMods)
+        if all(results):
+            self.flowTable.clearAp(ap_id)
+        for (in_port, result) in zip([2, 1], results):
+            if result:
+                print(f"Deleted flow for in_port={in_port} on ap{ap_id}...")
@@ -0,0 +1,682 @@
+#
+# Headless, discrete-time runs of the placement strategies.
+#
+# The scenario's own decision logic (onTelemetrySample + controllerStep) is driven tick by tick
+# from a vehicle trace, with in-process stand-ins for the kind cluster, the SDN controller and the
+# WiFi association. Every backend operation costs a configurable latency on a virtual clock instead
+# of wall time, so a 400 s experiment runs as fast as the CPU allows. With the handover scheduler
+# (parameters={'HANDOVER_LOOKAHEAD': 2.0}), the decisions it wakes the controller up for between two
+# ticks run at their own virtual time. So do the pod Ready events and drain periods of the migrations:
+# the migration executor runs without its thread, on the virtual clock.
+#
+# Traces are (ticks, cars, 2) arrays of positions (NaN when a car is not in the simulation), loaded
+# from the mininet-wifi telemetry files of a previous run or from a SUMO FCD export:
+#   sumo -c manhattan-100.sumocfg --fcd-output fcd.xml --step-length 1
+#   python3 -m scenarios.Simulation fcd.xml kind/configs/5_MobilityStrategy.yaml mininetwf/configs/5_MobilityStrategy.json predictive
+#
+import os
+import sys
+import json
+import math
+import time
+import threading
+import subprocess
+import numpy as np
+import xml.etree.ElementTree as ElementTree
+from types import SimpleNamespace
+
+import yaml
+
+from scenarios.MetricsSink import MetricsSink
+from scenarios.MigrationExecutor import MigrationExecutor
+
+# Seconds of virtual time each backend operation takes
+LATENCIES = {
+    'startCluster': 0.0,
+    'loadDockerImages': 1.0,
+    'createService': 0.05,
+    'createDeployment': 0.05,
+    'deleteDeployment': 0.05,
+    'podReady': 2.0, # From deployment creation to a Ready pod
+    'flowMod': 0.002, # Per flow mod of a request
+    'flowRequest': 0.01, # Per request to the SDN controller
+}
+
+class VirtualClock:
+
+    def __init__(self, start=0.0):
+        self.t = start
+        self.listeners = [] # callback(t), called every time the clock moves
+
+    def now(self):
+        return self.t
+
+    def addListener(self, listener):
+        self.listeners.append(listener)
+
+    def advanceTo(self, t):
+        if t <= self.t:
+            return
+        self.t = t
+        for listener in self.listeners:
+            listener(t)
+
+    def spend(self, seconds):
+        # Backend latencies are accounted, the clock only moves with the trace
+        pass
+
+class WallClock:
+    # VirtualClock interface on wall time, for the fake backends of live runs (see scenarios.Backends)
+
+    POLL_INTERVAL = 0.05
+
+    def __init__(self):
+        self.listeners = []
+        self.ticker = None
+
+    def now(self):
+        return time.time()
+
+    def addListener(self, listener):
+        # Called with the time every POLL_INTERVAL, from a daemon thread
+        self.listeners.append(listener)
+        if self.ticker is None:
+            self.ticker = threading.Thread(target=self.__tick, daemon=True)
+            self.ticker.start()
+
+    def __tick(self):
+        while True:
+            time.sleep(WallClock.POLL_INTERVAL)
+            t = self.now()
+            for listener in list(self.listeners):
+                listener(t)
+
+    def advanceTo(self, t):
+        delay = t - self.now()
+        if delay > 0:
+            time.sleep(delay)
+
+    def spend(self, seconds):
+        # A slow API is slow for the caller
+        if seconds > 0:
+            time.sleep(seconds)
+
+class FakeDeploymentCache:
+    # Same lookups as kubernetesController.DeploymentCache, readiness follows the virtual clock
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.synced = True
+        self.deployments = {} # {deploymentName: (nodeName, appName, readyAt)}
+        self.readyListeners = []
+        self.podIPs = {} # {deploymentName: podIP}
+        self.pending = [] # [(readyAt, deploymentName)], Ready events not delivered yet
+        self.lock = threading.Lock() # The wall clock delivers from its own thread
+        clock.addListener(self.deliverReady)
+
+    def addReadyListener(self, listener):
+        self.readyListeners.append(listener)
+
+    def add(self, deployment, readyAt):
+        nodeName = deployment.spec.template.spec.node_name
+        appName = deployment.spec.selector['matchLabels']['app']
+        self.deployments[deployment.metadata.name] = (nodeName, appName, readyAt)
+        self.podIPs[deployment.metadata.name] = f'10.244.{len(self.podIPs) // 250}.{len(self.podIPs) % 250 + 2}'
+        with self.lock:
+            self.pending.append((readyAt, deployment.metadata.name))
+            self.pending.sort()
+        self.deliverReady(self.clock.now())
+
+    def deliverReady(self, t):
+        # Ready events of the pods whose ready time has passed, stamped with that time
+        with self.lock:
+            due = []
+            while len(self.pending) > 0 and self.pending[0][0] <= t:
+                due.append(self.pending.pop(0))
+        for readyAt, deploymentName in due:
+            if deploymentName not in self.deployments:
+                continue
+            nodeName, appName, _ = self.deployments[deploymentName]
+            for listener in list(self.readyListeners):
+                listener(nodeName, appName, self.podIPs[deploymentName], readyAt)
+
+    def nextReady(self):
+        # Time of the next Ready event, None if no pod is starting
+        with self.lock:
+            return self.pending[0][0] if len(self.pending) > 0 else None
+
+    def markReady(self, nodeName, appName, t):
+        # The pods of appName on nodeName are Ready from t on, whatever their ready time was (replays)
+        with self.lock:
+            for deploymentName, (node, app, readyAt) in list(self.deployments.items()):
+                if node == nodeName and app == appName and readyAt > t:
+                    self.deployments[deploymentName] = (node, app, t)
+                    self.pending.append((t, deploymentName))
+            self.pending.sort()
+        self.deliverReady(t)
+
+    def forgetDeployment(self, deploymentName):
+        self.deployments.pop(deploymentName, None)
+
+    def hasDeployment(self, deploymentName):
+        return deploymentName in self.deployments
+
+    def isDeployedAt(self, nodeName, appName):
+        return any(node == nodeName and app == appName for (node, app, _) in self.deployments.values())
+
+    def isReadyAt(self, nodeName, appName):
+        now = self.clock.now()
+        return any(node == nodeName and app == appName and readyAt <= now for (node, app, readyAt) in self.deployments.values())
+
+    def getDeployedApps(self):
+        deployed = {}
+        for (nodeName, appName, _) in self.deployments.values():
+            apps = deployed.setdefault(nodeName, [])
+            if appName not in apps:
+                apps.append(appName)
+        return deployed
+
+    def getPodIPs(self, nodeName, appName):
+        now = self.clock.now()
+        return [self.podIPs[name] for name, (node, app, readyAt) in self.deployments.items() if node == nodeName and app == appName and readyAt <= now]
+
+    def getReadyNodes(self, appName):
+        now = self.clock.now()
+        return sorted(set(node for (node, app, readyAt) in self.deployments.values() if app == appName and readyAt <= now))
+
+    def readyAt(self, nodeName, appName):
+        # Virtual time at which appName becomes ready on nodeName, None if it is not deployed there
+        times = [readyAt for (node, app, readyAt) in self.deployments.values() if node == nodeName and app == appName]
+        return min(times) if len(times) > 0 else None
+
+    def waitForReady(self, nodeName, appName, timeout=None):
+        # Waiting is moving the clock to the ready time
+        readyAt = self.readyAt(nodeName, appName)
+        if readyAt is None or (timeout is not None and readyAt - self.clock.now() > timeout):
+            return False
+        self.clock.advanceTo(readyAt)
+        return True
+
+    def waitForDeployment(self, deploymentName, timeout=None):
+        if deploymentName not in self.deployments:
+            return False
+        readyAt = self.deployments[deploymentName][2]
+        if timeout is not None and readyAt - self.clock.now() > timeout:
+            return False
+        self.clock.advanceTo(readyAt)
+        return True
+
+    def stop(self):
+        pass
+
+class FakeKubernetesController:
+    # In-process stand-in for KubernetesController: same methods and return codes, no cluster
+
+    def __init__(self, configPath, clock, latencies=None, faults=None):
+        with open(configPath, 'r') as file:
+            self.config = yaml.safe_load(file)
+        self.clusterName = 'kind' if 'name' not in self.config else self.config['name']
+        self.numNodes = len(self.config['nodes'])
+        self.clock = clock
+        self.latencies = dict(LATENCIES, **(latencies or {}))
+        self.faults = faults # Optional scenarios.Backends.FaultModel: jitter and injected failures
+
+        self.deployments = {}
+        self.services = {}
+        self.cache = None
+        self.timings = {} # { operation -> [count, total_seconds, max_seconds] }, in virtual time
+
+    def latencyOf(self, operation):
+        seconds = self.latencies.get(operation, 0.0)
+        if self.faults is not None:
+            seconds = self.faults.jitter(seconds)
+        return seconds
+
+    def cost(self, operation):
+        # Account one operation (and spend it on a wall clock), returns its latency
+        seconds = self.latencyOf(operation)
+        timing = self.timings.setdefault(operation, [0, 0.0, 0.0])
+        timing[0] += 1
+        timing[1] += seconds
+        timing[2] = max(timing[2], seconds)
+        self.clock.spend(seconds)
+        return seconds
+
+    def fails(self, operation):
+        # Injected API error
+        return self.faults is not None and self.faults.fails(operation)
+
+    def getTimings(self):
+        return {operation: {'count': count,
+                            'total_ms': 1000 * total,
+                            'mean_ms': 1000 * total / count,
+                            'max_ms': 1000 * maximum}
+                for operation, (count, total, maximum) in self.timings.items()}
+
+    def startCluster(self, force_restart=False):
+        self.cost('startCluster')
+
+    def getNodeInfo(self):
+        # Same names as kind: <cluster>-worker, <cluster>-worker2, ...
+        workers = [node for node in self.config['nodes'] if node.get('role', None) == 'worker']
+        return {self.clusterName + '-worker' + (str(i) if i > 1 else ''): f'172.18.0.{i + 2}' for i in range(1, len(workers) + 1)}
+
+    def startCache(self):
+        if self.cache is None:
+            self.cache = FakeDeploymentCache(self.clock)
+        return self.cache
+
+    def isCacheSynced(self):
+        return self.cache is not None and self.cache.synced
+
+    def loadDockerImages(self, imageName, nodes=None):
+        self.cost('loadDockerImages')
+        return ''
+
+    def createServiceObject(self, serviceName, serviceType, appName, port, targetPort, nodePort):
+        return SimpleNamespace(metadata=SimpleNamespace(name=serviceName),
+                               spec=SimpleNamespace(selector={'app': appName}, type=serviceType, port=port, target_port=targetPort, node_port=nodePort))
+
+    def createService(self, service):
+        self.cost('createService')
+        if self.fails('createService'):
+            return 2
+        if service.metadata.name in self.services:
+            return 1
+        self.services[service.metadata.name] = service
+        return 0
+
+    def createDeploymentObject(self, containerName, imageName, containerPort, numReplicas, deploymentName, nodeName, appName):
+        template = SimpleNamespace(metadata=SimpleNamespace(labels={'app': appName}),
+                                   spec=SimpleNamespace(node_name=nodeName, image=imageName, container_port=containerPort))
+        return SimpleNamespace(metadata=SimpleNamespace(name=deploymentName),
+                               spec=SimpleNamespace(replicas=numReplicas, template=template, selector={'matchLabels': {'app': appName}}))
+
+    def createDeployment(self, deployment):
+        start = self.clock.now()
+        latency = self.cost('createDeployment')
+        if self.fails('createDeployment'):
+            return 2
+        if self.cache.hasDeployment(deployment.metadata.name):
+            return 1
+        self.deployments.setdefault(deployment.spec.template.spec.node_name, {})[deployment.metadata.name] = deployment
+        self.cache.add(deployment, start + latency + self.latencyOf('podReady'))
+        return 0
+
+    def deleteDeployment(self, deploymentName):
+        self.cost('deleteDeployment')
+        if self.fails('deleteDeployment'):
+            return 2
+        for nodeDeployments in self.deployments.values():
+            nodeDeployments.pop(deploymentName, None)
+        if not self.cache.hasDeployment(deploymentName):
+            return 1
+        self.cache.forgetDeployment(deploymentName)
+        return 0
+
+class FakeSDNClient:
+    # Stand-in for SDNFlowClient: the time every request would take is accounted. Every flow mod
+    # succeeds, unless a FaultModel injects failures or a FlowStore (scenarios.Backends) refuses it.
+
+    def __init__(self, clock, latencies=None, faults=None, store=None):
+        self.clock = clock
+        self.latencies = dict(LATENCIES, **(latencies or {}))
+        self.faults = faults
+        self.store = store
+        self.lock = threading.Lock() # Flow queue worker and control loop
+        self.requests = 0
+        self.failed = 0
+        self.flowMods = {'add': 0, 'delete': 0, 'delete_strict': 0, 'modify': 0}
+        self.busy = 0.0 # Virtual seconds spent in the SDN controller
+
+    def modFlows(self, flowMods):
+        if len(flowMods) == 0:
+            return []
+        seconds = self.latencies['flowRequest'] + self.latencies['flowMod'] * len(flowMods)
+        if self.faults is not None:
+            seconds = self.faults.jitter(seconds)
+        self.clock.spend(seconds)
+
+        if self.faults is not None and self.faults.fails('flowRequest'):
+            # The whole request is lost (timeout, 5xx)
+            results = [False] * len(flowMods)
+        else:
+            results = []
+            for (cmd, payload) in flowMods:
+                ok = self.faults is None or not self.faults.fails('flowMod')
+                if ok and self.store is not None:
+                    ok = self.store.apply(cmd, payload) == 200
+                results.append(ok)
+
+        with self.lock:
+            self.requests += 1
+            self.busy += seconds
+            self.failed += len(results) - sum(results)
+            for (cmd, _) in flowMods:
+                self.flowMods[cmd] = self.flowMods.get(cmd, 0) + 1
+        return results
+
+    def modFlow(self, cmd, payload):
+        return self.modFlows([(cmd, payload)])[0]
+
+    def addFlow(self, payload):
+        return self.modFlow('add', payload)
+
+    def deleteFlow(self, payload):
+        return self.modFlow('delete', payload)
+
+    def getMetrics(self):
+        return {'requests': self.requests, 'flow_mods': dict(self.flowMods), 'failed': self.failed, 'busy_ms': 1000 * self.busy}
+
+    def close(self):
+        pass
+
+class ImmediateFlowQueue:
+    # FlowQueue interface, but every intent is sent as soon as it is enqueued (no threads)
+
+    def __init__(self, sdnClient):
+        self.sdnClient = sdnClient
+        self.enqueued = 0
+        self.completed = 0
+        self.failed = 0
+        self.batches = 0
+
+    def enqueue(self, cmd, payload, onDone=None):
+        self.enqueueMany([(cmd, payload)], onDone)
+
+    def enqueueMany(self, flowMods, onDone=None):
+        if len(flowMods) == 0:
+            return
+        self.enqueued += len(flowMods)
+        self.batches += 1
+        results = self.sdnClient.modFlows(flowMods)
+        self.completed += sum(results)
+        self.failed += len(results) - sum(results)
+        if onDone is not None:
+            onDone(all(results))
+
+    def flush(self, timeout=None):
+        return True
+
+    def getMetrics(self):
+        return {'enqueued': self.enqueued, 'coalesced': 0, 'completed': self.completed, 'failed': self.failed,
+                'pending': 0, 'in_flight': 0, 'batches': self.batches}
+
+    def stop(self, timeout=5):
+        pass
+
+class SimulatedAssociation:
+    # Stand-in for AssociationTracker: a car is associated to the nearest AP in range
+
+    def __init__(self, apIndex, numCars, range=300):
+        self.apIndex = apIndex
+        self.range = range
+        self.position = np.full((numCars, 2), np.nan)
+        self.lookups = 0
+
+    def setPosition(self, car_id, x, y):
+        self.position[car_id - 1] = (x, y)
+
+    def getAssociatedAP(self, car_id):
+        self.lookups += 1
+        x, y = self.position[car_id - 1]
+        if np.isnan(x):
+            return None
+        i = self.apIndex.nearest(x, y)
+        if i is None or math.dist((x, y), self.apIndex.positions[i]) > self.range:
+            return None
+        return self.apIndex.ids[i]
+
+    def getMetrics(self):
+        return {'lookups': self.lookups}
+
+    def close(self):
+        pass
+
+def loadTelemetryTrace(directory, numCars, pathFormat='position-{car}-mn-telemetry.txt'):
+    # One sample per line and tick ('x,y,...'), as written by the mininet-wifi telemetry
+    columns = []
+    for car_id in range(1, numCars + 1):
+        samples = []
+        path = os.path.join(directory, pathFormat.format(car=f'car{car_id}'))
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                for line in file:
+                    try:
+                        x, y = line.strip().split(',')[0:2]
+                        samples.append((float(x), float(y)))
+                    except ValueError:
+                        samples.append((math.nan, math.nan))
+        columns.append(samples)
+
+    trace = np.full((max([len(samples) for samples in columns] + [0]), numCars, 2), np.nan)
+    for row, samples in enumerate(columns):
+        if len(samples) > 0:
+            trace[:len(samples), row] = samples
+    return trace
+
+def loadFcdTrace(path, numCars=None, tick=1.0):
+    # SUMO floating car data (--fcd-output). Vehicles become cars 1, 2, ... in order of appearance.
+    rows = {} # {vehicle id: row}
+    samples = [] # (tick, row, x, y)
+    start = None
+    for _, element in ElementTree.iterparse(path, events=('end',)):
+        if element.tag != 'timestep':
+            continue
+        t = float(element.get('time'))
+        if start is None:
+            start = t
+        k = int(round((t - start) / tick))
+        for vehicle in element.iter('vehicle'):
+            row = rows.get(vehicle.get('id'), None)
+            if row is None:
+                if numCars is not None and len(rows) >= numCars:
+                    continue
+                row = rows[vehicle.get('id')] = len(rows)
+            samples.append((k, row, float(vehicle.get('x')), float(vehicle.get('y'))))
+        element.clear()
+
+    ticks = max([k for (k, _, _, _) in samples] + [-1]) + 1
+    trace = np.full((ticks, len(rows) if numCars is None else numCars, 2), np.nan)
+    for (k, row, x, y) in samples:
+        trace[k, row] = (x, y)
+    return trace
+
+def generateFcdTrace(sumoConfig, outputPath, end=None, stepLength=1.0):
+    # Run SUMO headless and export the floating car data
+    command = ['sumo', '-c', sumoConfig, '--fcd-output', outputPath, '--step-length', str(stepLength), '--no-step-log', 'true']
+    if end is not None:
+        command += ['--end', str(end)]
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    return outputPath
+
+def loadTrace(path, numCars, tick=1.0):
+    if os.path.isdir(path):
+        return loadTelemetryTrace(path, numCars)
+    if path.endswith('.npy'):
+        return np.load(path)
+    return loadFcdTrace(path, numCars, tick)
+
+def scenarioClassFor(kindCfg):
+    # Same selection as app.py; only the scenarios with a per-tick controller can run headless
+    if '4_LoadBalancing' in kindCfg:
+        from scenarios.LoadBalancing import LoadBalancing
+        return LoadBalancing
+    if '5_MobilityStrategy' in kindCfg:
+        from scenarios.MobilityStrategy import MobilityStrategy
+        return MobilityStrategy
+    raise ValueError(f"No headless run for {kindCfg}")
+
+class HeadlessSimulation:
+
+    def __init__(self, kindCfg, mininetCfg, trace, strategy='predictive', tick=1.0, latencies=None, output_dir='.', scenarioClass=None, parameters=None, profile=False, backends=None):
+        # parameters: scenario attributes to override for this run, e.g. {'MAX_DEPLOYMENTS': 4, 'AP_RANGE': 250}
+        # backends: the "backends" of a scenario config, for their latencies, jitter and failures (the types are ignored)
+        self.scenarioClass = scenarioClassFor(kindCfg) if scenarioClass is None else scenarioClass
+        self.trace = trace
+        self.strategy = strategy
+        self.tick = tick
+        self.clock = VirtualClock()
+        self.reacts = 0 # Decisions between ticks (handover scheduler)
+
+        self.scenario = self.scenarioClass(kindCfg, mininetCfg, None, output_dir=output_dir, profile=profile)
+        if trace.shape[1] > self.scenario.numCars:
+            # The vehicle store is sized by the mininet config
+            self.trace = trace[:, :self.scenario.numCars]
+
+        scenario = self.scenario
+        for name, value in (parameters or {}).items():
+            setattr(scenario, name, value)
+
+        # Swap the real backends for the in-process ones
+        scenario.flowQueue.stop()
+        scenario.associationTracker.close()
+        sdnConfig = (backends or {}).get('sdn', {})
+        kubernetesConfig = (backends or {}).get('kubernetes', {})
+        self.faults = {}
+        store = None
+        if backends is not None:
+            # Imported here, scenarios.Backends builds on this module
+            from scenarios.Backends import FaultModel, FlowStore
+            self.faults = {'sdn': FaultModel.fromConfig(sdnConfig), 'kubernetes': FaultModel.fromConfig(kubernetesConfig)}
+            store = FlowStore()
+        scenario.sdnClient = FakeSDNClient(self.clock, dict(latencies or {}, **sdnConfig.get('latency', {})), self.faults.get('sdn', None), store)
+        scenario.flowQueue = ImmediateFlowQueue(scenario.sdnClient)
+        scenario.associationTracker = SimulatedAssociation(scenario.apIndex, scenario.numCars, getattr(scenario, 'AP_RANGE', 300))
+        scenario.kindController = FakeKubernetesController(kindCfg, self.clock, dict(latencies or {}, **kubernetesConfig.get('latency', {})), self.faults.get('kubernetes', None))
+        scenario.migrationExecutor.stop()
+        scenario.migrationExecutor = MigrationExecutor(clock=self.clock.now, threaded=False)
+        self.clock.addListener(scenario.migrationExecutor.poll)
+
+        self.decide = None
+        if hasattr(self.scenarioClass, 'decideReactive'):
+            self.decide = {'reactive': self.scenarioClass.decideReactive, 'predictive': self.scenarioClass.decidePredictive}[strategy]
+            # Migration spans in virtual time
+            scenario.tracer.clock = self.clock.now
+            scenario.tracer.strategy = self.decide.__name__
+
+    def bootstrap(self):
+        # Same steps as Scenario.bootstrap, one after another (the latencies are virtual anyway)
+        scenario = self.scenario
+        kindController = scenario.kindController
+        kindController.startCluster()
+        scenario.clusterName = kindController.clusterName
+        scenario.workers = kindController.getNodeInfo()
+        kindController.startCache()
+
+        service = self.scenarioClass.serviceSpec(scenario)
+        scenario.createService(loadImage=True, **service)
+        for deployment in self.scenarioClass.initialDeployments(scenario):
+            scenario.createDeployment(**deployment)
+            kindController.cache.waitForDeployment(deployment['deploymentName'])
+
+    def step(self):
+        with self.scenario.profiler.tick():
+            if self.decide is not None:
+                self.scenarioClass.controllerStep(self.scenario, self.decide)
+            else:
+                self.scenarioClass.controllerStep(self.scenario)
+
+    def start(self):
+        # Cluster, service and initial deployments, then the outputs of the run
+        self.bootstrap()
+        if hasattr(self.scenarioClass, 'startOutputs'):
+            self.scenarioClass.startOutputs(self.scenario)
+        else:
+            self.scenario.stateWriter.start()
+
+    def finish(self, wall):
+        self.scenarioClass.closeOutputs(self.scenario)
+        return self.summary(wall)
+
+    def run(self):
+        scenario = self.scenario
+        start = time.perf_counter()
+        self.start()
+        self.scenarioClass.startController(scenario)
+        t0 = self.clock.now()
+
+        for k in range(len(self.trace)):
+            self.feed(k, t0 + k * self.tick)
+            self.step()
+            self.react(t0 + (k + 1) * self.tick)
+
+        return self.finish(time.perf_counter() - start)
+
+    def react(self, until):
+        # Before the next tick, at their virtual time: the decisions the handover scheduler wakes the controller
+        # up for, the pod Ready events and the migration timers (redirects and deletions)
+        scheduler = getattr(self.scenario, 'scheduler', None)
+        if self.decide is None:
+            scheduler = None
+        while True:
+            wake = scheduler.nextWakeup() if scheduler is not None else None
+            event = self.nextEvent()
+            if wake is not None and wake < until and (event is None or wake <= event):
+                self.clock.advanceTo(max(wake, self.clock.now()))
+                with self.scenario.profiler.phase('react'):
+                    self.scenarioClass.reactStep(self.scenario, self.decide)
+                self.reacts += 1
+            elif event is not None and event < until and event > self.clock.now():
+                self.clock.advanceTo(event)
+            else:
+                return
+
+    def nextEvent(self):
+        # Next pod Ready event or migration timer, None if there is none
+        cache = self.scenario.kindController.cache
+        times = [t for t in (None if cache is None else cache.nextReady(), self.scenario.migrationExecutor.nextTimer()) if t is not None]
+        return min(times) if len(times) > 0 else None
+
+    def feed(self, k, t):
+        # Telemetry samples of tick k, at virtual time t
+        scenario = self.scenario
+        self.clock.advanceTo(t)
+        positions = self.trace[k]
+        for row in np.flatnonzero(~np.isnan(positions[:, 0])).tolist():
+            x, y = positions[row].tolist()
+            scenario.associationTracker.setPosition(row + 1, x, y)
+            scenario.onTelemetrySample(row + 1, t, x, y)
+
+    def summary(self, wall):
+        scenario = self.scenario
+        metricsPath = scenario.outputPath(self.scenarioClass.METRICS_FILE)
+        totals = {}
+        for record in MetricsSink.readRecords(metricsPath):
+            record.pop('t')
+            for key, value in record.items():
+                total = totals.setdefault(key, [0, 0.0, None])
+                total[0] += 1
+                total[1] += value
+                total[2] = value if total[2] is None else max(total[2], value)
+        return {
+            'scenario': self.scenarioClass.__name__,
+            'strategy': self.strategy if self.decide is not None else None,
+            'ticks': len(self.trace),
+            'cars': int(self.trace.shape[1]),
+            'virtual_s': self.clock.now(),
+            'wall_s': wall,
+            'metrics': {key: {'mean': total / count, 'max': maximum, 'sum': total} for key, (count, total, maximum) in totals.items()},
+            'deployments': scenario.getDeployedApps(),
+            'flows': len(scenario.flowTable),
+            'kubernetes': scenario.kindController.getTimings(),
+            'sdn': scenario.sdnClient.getMetrics(),
+            'flow_queue': scenario.flowQueue.getMetrics(),
+            'faults': {backend: faults.getMetrics() for backend, faults in self.faults.items()},
+            'scheduler': None if getattr(scenario, 'scheduler', None) is None else dict(scenario.scheduler.getMetrics(), reacts=self.reacts),
+            'migrations': scenario.migrationExecutor.getMetrics(),
+        }
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4:
+        print("Usage: python3 -m scenarios.Simulation <trace: fcd.xml | telemetry dir | trace.npy> <kind config> <mininet config> [reactive|predictive] [output dir]")
+        sys.exit(1)
+    kindCfg = sys.argv[2]
+    mininetCfg = sys.argv[3]
+    strategy = sys.argv[4] if len(sys.argv) > 4 else 'predictive'
+    outputDir = sys.argv[5] if len(sys.argv) > 5 else '.'
+
+    with open(mininetCfg, 'r') as file:
+        numCars = json.load(file)['cars']['count']
+    simulation = HeadlessSimulation(kindCfg, mininetCfg, loadTrace(sys.argv[1], numCars), strategy=strategy, output_dir=outputDir)
+    print(json.dumps(simulation.run(), indent=4, default=str))
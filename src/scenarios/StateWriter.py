@@ -0,0 +1,129 @@
+#
+# Background writer for the per-tick state dumps (vehicle-data.json) and the scenario logs.
+#
+# The control loops only hand over a snapshot or a log record and return; a single thread
+# serialises them and writes to disk every interval. Dumps keep only the newest snapshot of
+# each file (older ones are skipped), log records are buffered and written in one go.
+# Messages and dumps may be given as callables, so building them also happens off the loop.
+#
+import json
+import threading
+from collections import deque
+from datetime import datetime
+
+class StateWriter:
+
+    DEBUG = 10
+    INFO = 20
+    WARNING = 30
+    LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING'}
+
+    def __init__(self, logFile=None, interval=1.0, verbosity=INFO, jsonLog=False, maxRecords=100000):
+        self.logFile = logFile
+        self.interval = interval
+        self.verbosity = verbosity
+        self.jsonLog = jsonLog # One JSON object per line instead of 'time : message'
+
+        self.cond = threading.Condition()
+        self.records = deque() # (timestamp, level, message)
+        self.maxRecords = maxRecords
+        self.dumps = {} # {path: (data, options)}, newest only
+        self.running = False
+        self.thread = None
+
+        # Metrics
+        self.written = 0
+        self.dropped = 0
+        self.dumpsWritten = 0
+        self.dumpsSkipped = 0
+
+    def start(self):
+        with self.cond:
+            if self.running:
+                return
+            self.running = True
+        self.thread = threading.Thread(target=self.__run, name='state-writer', daemon=True)
+        self.thread.start()
+
+    def isEnabled(self, level):
+        return level >= self.verbosity
+
+    def log(self, level, message):
+        # message: str, or a callable returning it (called on the writer thread)
+        if level < self.verbosity:
+            return
+        with self.cond:
+            if len(self.records) >= self.maxRecords:
+                # The disk cannot keep up, drop the oldest record instead of blocking the caller
+                self.records.popleft()
+                self.dropped += 1
+            self.records.append((datetime.now(), level, message))
+
+    def debug(self, message):
+        self.log(StateWriter.DEBUG, message)
+
+    def info(self, message):
+        self.log(StateWriter.INFO, message)
+
+    def dump(self, path, data, **options):
+        # Write data (JSON-able, or a callable returning it) to path; replaces a pending dump of the same file
+        with self.cond:
+            if path in self.dumps:
+                self.dumpsSkipped += 1
+            self.dumps[path] = (data, options)
+
+    def __run(self):
+        while True:
+            with self.cond:
+                self.cond.wait(self.interval)
+                running = self.running
+            self.flush()
+            if not running:
+                return
+
+    def flush(self):
+        with self.cond:
+            records = self.records
+            self.records = deque()
+            dumps = self.dumps
+            self.dumps = {}
+
+        for path, (data, options) in dumps.items():
+            try:
+                if callable(data):
+                    data = data()
+                with open(path, 'w') as f:
+                    json.dump(data, f, **options)
+                self.dumpsWritten += 1
+            except Exception as e:
+                print(f"Error writing {path}: {e}")
+
+        if len(records) > 0 and self.logFile is not None:
+            lines = []
+            for (timestamp, level, message) in records:
+                try:
+                    if callable(message):
+                        message = message()
+                except Exception as e:
+                    message = f"Error building log message: {e}"
+                if self.jsonLog:
+                    lines.append(json.dumps({'time': timestamp.isoformat(), 'level': self.LEVEL_NAMES.get(level, level), 'message': str(message)}))
+                else:
+                    lines.append(f"{timestamp.strftime('%H:%M:%S.%f')[:-3]} : {message}")
+            with open(self.logFile, 'a') as f:
+                f.write('\n'.join(lines) + '\n')
+            self.written += len(lines)
+
+    def getMetrics(self):
+        with self.cond:
+            return {'written': self.written, 'dropped': self.dropped, 'pending': len(self.records),
+                    'dumps_written': self.dumpsWritten, 'dumps_skipped': self.dumpsSkipped}
+
+    def stop(self, timeout=5):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        else:
+            self.flush()
@@ -0,0 +1,211 @@
+#
+# Parameter sweeps over headless runs (scenarios.Simulation), on every core.
+#
+# A sweep config names the base configs and a grid of values; every combination is one experiment:
+#   {
+#       "kind-config": "kind/configs/5_MobilityStrategy.yaml",
+#       "mininet-config": "mininetwf/configs/5_MobilityStrategy.json",
+#       "grid": {
+#           "trace": ["fcd-100.xml"],
+#           "strategy": ["reactive", "predictive"],
+#           "nodes": [1, 2, 3, 4, 5, 6, 7, 8],
+#           "max-deployments": [3],
+#           "range": [300],
+#           "threshold": [0.2],
+#           "lookahead": [null, 2.0],
+#           "drain": [5.0]
+#       }
+#   }
+# "nodes" rewrites the configs: the kind config gets that many workers and the APs (in config order)
+# are split into that many contiguous blocks, one per worker. "lookahead" turns on the handover
+# scheduler with that look-ahead window in seconds (null: decisions every tick over every car).
+# "drain" is the seconds an old deployment keeps serving after a migration's redirect.
+#
+# Results are stored under <cache dir>/<config hash>/ (summary.json and the run's outputs). The hash
+# covers the parameters, the contents of the configs and trace, and the scenarios sources, so repeated
+# and interrupted sweeps only run what is missing, and a code change runs everything again. One row
+# per experiment is written to a CSV table.
+#
+#   python3 -m scenarios.Sweep sweep.json [table.csv] [cache dir] [workers]
+#
+import os
+import sys
+import csv
+import json
+import yaml
+import hashlib
+import itertools
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+PARAMETERS = ['trace', 'strategy', 'nodes', 'max-deployments', 'range', 'threshold', 'lookahead', 'drain']
+
+# Sweep parameter -> scenario attribute
+SCENARIO_ATTRIBUTES = {'max-deployments': 'MAX_DEPLOYMENTS', 'range': 'AP_RANGE', 'threshold': 'LEAVE_THRESHOLD', 'lookahead': 'HANDOVER_LOOKAHEAD', 'drain': 'MIGRATION_DRAIN'}
+
+def hashFile(path, digest):
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            digest.update(name.encode())
+            hashFile(os.path.join(path, name), digest)
+        return
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+
+def codeHash():
+    # The sources the headless runs execute (this package)
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.py'):
+            digest.update(name.encode())
+            hashFile(os.path.join(directory, name), digest)
+    return digest.hexdigest()
+
+def configHash(experiment, code):
+    digest = hashlib.sha256(json.dumps(experiment, sort_keys=True).encode())
+    digest.update(code.encode())
+    for key in ('kind-config', 'mininet-config', 'trace'):
+        if experiment.get(key, None) is not None:
+            hashFile(experiment[key], digest)
+    return digest.hexdigest()[:16]
+
+def expandGrid(sweep):
+    # Every combination of the grid values, in grid order
+    grid = sweep.get('grid', {})
+    for key in grid:
+        if key not in PARAMETERS:
+            raise ValueError(f"Unknown sweep parameter '{key}', expected one of {PARAMETERS}")
+    keys = list(grid.keys())
+    for values in itertools.product(*[grid[key] for key in keys]):
+        experiment = {'kind-config': sweep['kind-config'], 'mininet-config': sweep['mininet-config'], 'trace': sweep.get('trace', None)}
+        experiment.update(zip(keys, values))
+        yield experiment
+
+def writeNodeConfigs(kindCfg, mininetCfg, nodes, directory):
+    # Copies of the configs with the given number of workers
+    os.makedirs(directory, exist_ok=True)
+    with open(kindCfg, 'r') as file:
+        kindConfig = yaml.safe_load(file)
+    kindConfig['nodes'] = [node for node in kindConfig['nodes'] if node.get('role', None) != 'worker'] + [{'role': 'worker'} for _ in range(nodes)]
+    with open(mininetCfg, 'r') as file:
+        mininetConfig = json.load(file)
+    aps = mininetConfig['aps']
+    for i, ap in enumerate(aps):
+        ap['kindNode'] = str(i * nodes // len(aps) + 1)
+
+    # The scenario is selected from the kind config name, keep it
+    kindPath = os.path.join(directory, f'{os.path.splitext(os.path.basename(kindCfg))[0]}-{nodes}nodes.yaml')
+    mininetPath = os.path.join(directory, f'{os.path.splitext(os.path.basename(mininetCfg))[0]}-{nodes}nodes.json')
+    with open(kindPath, 'w') as file:
+        yaml.safe_dump(kindConfig, file, sort_keys=False)
+    with open(mininetPath, 'w') as file:
+        json.dump(mininetConfig, file, indent=4)
+    return kindPath, mininetPath
+
+def runExperiment(experiment, outputDir):
+    # Runs in a worker process: one headless run, its output is kept in outputDir
+    from scenarios.Simulation import HeadlessSimulation, loadTrace
+
+    os.makedirs(outputDir, exist_ok=True)
+    kindCfg = experiment['kind-config']
+    mininetCfg = experiment['mininet-config']
+    if experiment.get('nodes', None) is not None:
+        kindCfg, mininetCfg = writeNodeConfigs(kindCfg, mininetCfg, int(experiment['nodes']), os.path.join(outputDir, 'configs'))
+    parameters = {attribute: experiment[key] for key, attribute in SCENARIO_ATTRIBUTES.items() if experiment.get(key, None) is not None}
+
+    with open(os.path.join(outputDir, 'run.log'), 'w') as log, contextlib.redirect_stdout(log):
+        with open(mininetCfg, 'r') as file:
+            numCars = json.load(file)['cars']['count']
+        simulation = HeadlessSimulation(kindCfg, mininetCfg, loadTrace(experiment['trace'], numCars),
+                                        strategy=experiment.get('strategy', 'predictive'), output_dir=outputDir, parameters=parameters)
+        summary = simulation.run()
+
+    summary['experiment'] = experiment
+    with open(os.path.join(outputDir, 'summary.json'), 'w') as file:
+        json.dump(summary, file, indent=4, default=str)
+    return summary
+
+def tableRow(experiment, summary):
+    row = {key: experiment.get(key, None) for key in PARAMETERS}
+    for key, metric in summary['metrics'].items():
+        row[f'{key}_mean'] = round(metric['mean'], 3)
+        row[f'{key}_max'] = metric['max']
+    timings = summary['kubernetes']
+    # Calls, failed ones included
+    row['create_deployment_calls'] = timings.get('createDeployment', {}).get('count', 0)
+    row['delete_deployment_calls'] = timings.get('deleteDeployment', {}).get('count', 0)
+    row['flow_mods'] = sum(summary['sdn']['flow_mods'].values())
+    migrations = summary.get('migrations', None) or {}
+    row['migrations_timed_out'] = migrations.get('timed_out', 0)
+    row['ready_wait_s_mean'] = round(migrations.get('ready_wait_s', {}).get('mean', 0.0), 3)
+    row['ticks'] = summary['ticks']
+    row['wall_s'] = round(summary['wall_s'], 3)
+    return row
+
+def runSweep(sweep, cacheDir='sweep-cache', workers=None):
+    # Returns the table rows, in grid order
+    code = codeHash()
+    experiments = [(configHash(experiment, code), experiment) for experiment in expandGrid(sweep)]
+    summaries = {}
+    pending = []
+    for key, experiment in experiments:
+        summaryPath = os.path.join(cacheDir, key, 'summary.json')
+        if key in summaries:
+            continue
+        if os.path.exists(summaryPath):
+            with open(summaryPath, 'r') as file:
+                summaries[key] = json.load(file)
+        else:
+            summaries[key] = None
+            pending.append((key, experiment))
+    print(f"{len(experiments)} experiments, {len(experiments) - len(pending)} cached, {len(pending)} to run")
+
+    if len(pending) > 0:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(runExperiment, experiment, os.path.join(cacheDir, key)): key for key, experiment in pending}
+            for done, future in enumerate(as_completed(futures), start=1):
+                key = futures[future]
+                try:
+                    summaries[key] = future.result()
+                    print(f"[{done}/{len(pending)}] {key} done in {summaries[key]['wall_s']:.2f}s")
+                except Exception as e:
+                    print(f"[{done}/{len(pending)}] {key} failed: {e}")
+
+    return [tableRow(experiment, summaries[key]) for key, experiment in experiments if summaries[key] is not None]
+
+def writeTable(rows, path):
+    columns = []
+    for row in rows:
+        columns.extend(column for column in row if column not in columns)
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def printTable(rows):
+    if len(rows) == 0:
+        return
+    columns = []
+    for row in rows:
+        columns.extend(column for column in row if column not in columns)
+    widths = {column: max(len(column), *(len(str(row.get(column, ''))) for row in rows)) for column in columns}
+    print('  '.join(column.ljust(widths[column]) for column in columns))
+    for row in rows:
+        print('  '.join(str(row.get(column, '')).ljust(widths[column]) for column in columns))
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python3 -m scenarios.Sweep <sweep config> [table.csv] [cache dir] [workers]")
+        sys.exit(1)
+    with open(sys.argv[1], 'r') as file:
+        sweep = json.load(file)
+    tablePath = sys.argv[2] if len(sys.argv) > 2 else 'sweep.csv'
+    cacheDir = sys.argv[3] if len(sys.argv) > 3 else 'sweep-cache'
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+
+    rows = runSweep(sweep, cacheDir, workers)
+    writeTable(rows, tablePath)
+    printTable(rows)
+    print(f"Table written to {tablePath}")
@@ -0,0 +1,176 @@
+#
+# Incremental reader for the mininet-wifi position telemetry files (position-<car>-mn-telemetry.txt).
+#
+# Every file is opened once and read from the last known offset, so each poll only costs the
+# bytes appended since the previous one. On Linux the directory is watched with inotify and only
+# the files that changed are read; elsewhere (or if inotify is unavailable) all files are polled.
+#
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+
+IN_MODIFY = 0x00000002
+IN_CREATE = 0x00000100
+IN_MOVED_TO = 0x00000080
+INOTIFY_EVENT = struct.Struct('iIII')
+
+class TelemetryFile:
+
+    # Bytes read back from the end of a file the first time it is opened
+    INITIAL_TAIL = 4096
+
+    def __init__(self, path):
+        self.path = path
+        self.handle = None
+        self.offset = 0
+        self.partial = b''
+
+    def open(self):
+        try:
+            self.handle = open(self.path, 'rb')
+        except FileNotFoundError:
+            return False
+        size = os.fstat(self.handle.fileno()).st_size
+        # Only the last line matters on the first read, skip the history
+        self.offset = max(0, size - self.INITIAL_TAIL)
+        self.partial = b''
+        self.handle.seek(self.offset)
+        if self.offset > 0:
+            self.handle.readline() # Drop the (probably) incomplete first line
+            self.offset = self.handle.tell()
+        return True
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+
+    def readLastLine(self):
+        # Read the appended bytes and return the last complete line, or None if there is none
+        if self.handle is None and not self.open():
+            return None
+
+        size = os.fstat(self.handle.fileno()).st_size
+        if size < self.offset:
+            # File was truncated or recreated by a new run
+            self.close()
+            if not self.open():
+                return None
+
+        data = self.handle.read()
+        if not data:
+            return None
+        self.offset += len(data)
+
+        data = self.partial + data
+        end = data.rfind(b'\n')
+        if end == -1:
+            self.partial = data
+            return None
+        self.partial = data[end + 1:]
+        start = data.rfind(b'\n', 0, end) + 1
+        return data[start:end]
+
+class TelemetryTailer:
+
+    def __init__(self, cars, onSample, directory='.', pathFormat='position-{car}-mn-telemetry.txt', pollInterval=1, useInotify=True):
+        # cars: { car_id: car_name }, e.g. { 1: 'car1' }
+        # onSample: callback(car_id, t, x, y), called with the newest sample of each car that changed
+        self.onSample = onSample
+        self.directory = directory
+        self.pollInterval = pollInterval
+        self.lastPoll = 0
+
+        self.files = {} # {car_id: TelemetryFile}
+        self.carByFilename = {} # {filename: car_id}
+        for car_id, car_name in cars.items():
+            filename = pathFormat.format(car=car_name)
+            self.files[car_id] = TelemetryFile(os.path.join(directory, filename))
+            self.carByFilename[filename] = car_id
+
+        self.inotifyFd = None
+        if useInotify and sys.platform.startswith('linux'):
+            self.inotifyFd = self.__startInotify()
+
+    def __startInotify(self):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = libc.inotify_init()
+            if fd < 0:
+                return None
+            wd = libc.inotify_add_watch(fd, os.fsencode(self.directory), IN_MODIFY | IN_CREATE | IN_MOVED_TO)
+            if wd < 0:
+                os.close(fd)
+                return None
+            return fd
+        except (OSError, AttributeError):
+            return None
+
+    def __waitForChanges(self):
+        # Returns the ids of the cars whose file may have changed since the last call
+        if self.inotifyFd is None:
+            time.sleep(self.pollInterval)
+            return list(self.files.keys())
+
+        ready, _, _ = select.select([self.inotifyFd], [], [], self.pollInterval)
+        if not ready:
+            return []
+
+        # Let the writers append for the rest of the interval, then read all events at once
+        remaining = self.lastPoll + self.pollInterval - time.time()
+        if remaining > 0:
+            time.sleep(remaining)
+        changed = set()
+        buffer = os.read(self.inotifyFd, 1 << 16)
+        while True:
+            i = 0
+            while i + INOTIFY_EVENT.size <= len(buffer):
+                _, _, _, length = INOTIFY_EVENT.unpack_from(buffer, i)
+                name = buffer[i + INOTIFY_EVENT.size:i + INOTIFY_EVENT.size + length].rstrip(b'\0')
+                car_id = self.carByFilename.get(os.fsdecode(name), None)
+                if car_id is not None:
+                    changed.add(car_id)
+                i += INOTIFY_EVENT.size + length
+            ready, _, _ = select.select([self.inotifyFd], [], [], 0)
+            if not ready:
+                break
+            buffer = os.read(self.inotifyFd, 1 << 16)
+        return changed
+
+    def poll(self, car_ids=None):
+        # Read the new samples of the given cars (all by default) and push them to onSample
+        t = time.time()
+        self.lastPoll = t
+        for car_id in (self.files.keys() if car_ids is None else car_ids):
+            line = self.files[car_id].readLastLine()
+            if line is None:
+                continue
+            try:
+                x, y = line.decode().strip().split(',')[0:2]
+                x = float(x)
+                y = float(y)
+            except ValueError:
+                continue
+            self.onSample(car_id, t, x, y)
+
+    def run(self, shouldStop):
+        # Loop until shouldStop() returns True
+        try:
+            self.poll()
+            while not shouldStop():
+                changed = self.__waitForChanges()
+                if changed:
+                    self.poll(changed)
+        finally:
+            self.close()
+
+    def close(self):
+        for telemetryFile in self.files.values():
+            telemetryFile.close()
+        if self.inotifyFd is not None:
+            os.close(self.inotifyFd)
+            self.inotifyFd = None
@@ -0,0 +1,204 @@
+#
+# Per-tick profiler of the control loops.
+#
+# Durations are recorded per phase into HDR-style histograms (log-linear buckets of microseconds,
+# 64 sub-buckets per power of two, so every value keeps about 1.5% precision and a histogram stays
+# a few hundred counters whatever the run length):
+#   tick    one controllerStep, counted as an overrun when it exceeds the budget (1 s)
+#   ingest  copy of the vehicle state for the tick
+#   decide  placement / load balancing decision
+#   k8s     Kubernetes calls
+#   sdn     SDN calls (or handing them to the flow queue)
+#   output  metrics, visualization and state dumps
+#   sample  handling of one telemetry sample (position tracker thread)
+#   lock:*  time spent waiting for a contended lock (see TimedLock)
+# The summary (count, mean and percentiles of each histogram) is written every dump interval and
+# at exit. When disabled, every timer is a shared no-op context.
+#
+import json
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+
+class Histogram:
+
+    SUB_BITS = 7
+    SUB_COUNT = 1 << SUB_BITS # Values below this are exact
+    HALF_COUNT = SUB_COUNT >> 1
+
+    def __init__(self):
+        self.counts = {} # {bucket index: count}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    @classmethod
+    def indexOf(cls, value):
+        magnitude = max(value.bit_length() - cls.SUB_BITS, 0)
+        return magnitude * cls.HALF_COUNT + (value >> magnitude)
+
+    @classmethod
+    def valueOf(cls, index):
+        # Middle of the bucket's value range
+        if index < cls.SUB_COUNT:
+            return index
+        magnitude = index // cls.HALF_COUNT - 1
+        low = (index - magnitude * cls.HALF_COUNT) << magnitude
+        return low + ((1 << magnitude) >> 1)
+
+    def record(self, value):
+        # value: non-negative int (microseconds)
+        index = self.indexOf(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, p):
+        if self.count == 0:
+            return None
+        rank = max(1, int(round(p / 100 * self.count)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(max(self.valueOf(index), self.min), self.max)
+        return self.max
+
+    def summary(self, scale=1000):
+        # In milliseconds (scale: units of a millisecond)
+        if self.count == 0:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'total_ms': self.total / scale,
+            'mean_ms': self.total / self.count / scale,
+            'p50_ms': self.percentile(50) / scale,
+            'p90_ms': self.percentile(90) / scale,
+            'p99_ms': self.percentile(99) / scale,
+            'max_ms': self.max / scale,
+        }
+
+class TimedLock:
+    # threading.Lock that records how long a contended acquire waited (uncontended ones cost nothing extra)
+
+    def __init__(self, profiler, name, lock=None):
+        self.profiler = profiler
+        self.name = f'lock:{name}'
+        self.lock = threading.Lock() if lock is None else lock
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self.lock.acquire(False):
+            return True
+        if not blocking:
+            return False
+        start = time.perf_counter_ns()
+        acquired = self.lock.acquire(True, timeout)
+        self.profiler.record(self.name, (time.perf_counter_ns() - start) // 1000)
+        return acquired
+
+    def release(self):
+        self.lock.release()
+
+    def locked(self):
+        return self.lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class TickProfiler:
+
+    NULL = nullcontext()
+
+    def __init__(self, enabled=False, path='profile.json', dumpInterval=10.0, budget=1.0, writer=None):
+        self.enabled = enabled
+        self.path = path
+        self.dumpInterval = dumpInterval
+        self.budget = budget
+        self.writer = writer # StateWriter for the periodic dumps, written here if None
+
+        self.lock = threading.Lock()
+        self.histograms = {} # {name: Histogram}
+        self.ticks = 0
+        self.overruns = 0
+        self.lastDump = time.monotonic()
+
+    def record(self, name, micros):
+        with self.lock:
+            histogram = self.histograms.get(name, None)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.record(micros)
+
+    @contextmanager
+    def __timed(self, name):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter_ns() - start) // 1000)
+
+    def phase(self, name):
+        if not self.enabled:
+            return TickProfiler.NULL
+        return self.__timed(name)
+
+    @contextmanager
+    def __tick(self):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            micros = (time.perf_counter_ns() - start) // 1000
+            self.record('tick', micros)
+            with self.lock:
+                self.ticks += 1
+                if micros > self.budget * 1e6:
+                    self.overruns += 1
+            if time.monotonic() - self.lastDump >= self.dumpInterval:
+                self.lastDump = time.monotonic()
+                if self.writer is not None:
+                    self.writer.dump(self.path, self.getSummary, indent=4)
+                else:
+                    self.dump()
+
+    def tick(self):
+        if not self.enabled:
+            return TickProfiler.NULL
+        return self.__tick()
+
+    def wrapLock(self, name, lock):
+        # The lock itself when disabled, so nothing changes on the hot paths
+        if not self.enabled:
+            return lock
+        return TimedLock(self, name, lock)
+
+    def getSummary(self):
+        with self.lock:
+            return {
+                'ticks': self.ticks,
+                'overruns': self.overruns,
+                'budget_ms': 1000 * self.budget,
+                'phases': {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+            }
+
+    def dump(self):
+        with open(self.path, 'w') as file:
+            json.dump(self.getSummary(), file, indent=4)
+
+    def close(self):
+        # Final dump and a short report
+        if not self.enabled:
+            return
+        self.dump()
+        summary = self.getSummary()
+        print(f"Tick profile: {summary['ticks']} ticks, {summary['overruns']} over the {summary['budget_ms']:.0f} ms budget")
+        for name, phase in summary['phases'].items():
+            if phase['count'] > 0:
+                print(f"  {name:24} n={phase['count']:<7} mean={phase['mean_ms']:.3f} ms  p99={phase['p99_ms']:.3f} ms  max={phase['max_ms']:.3f} ms")
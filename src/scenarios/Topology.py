@@ -0,0 +1,115 @@
+#
+# AP backhaul / worker node topology, built once from the mininet config.
+#
+# APs are the vertices, 'linkTo' gives the backhaul links (undirected, one hop each, 'linkLatency'
+# on the AP config overrides the per-hop latency of its links) and 'kindNode' attaches a worker node
+# to the AP. The hop count and path latency from every AP to every node are precomputed with one
+# search per node (breadth-first for hops, Dijkstra for latency), started from all the APs of that
+# node at once, so the distance from an AP to a node is a matrix lookup. Unreachable pairs hold inf.
+# The nearest node of every AP (lowest latency, its own node when it has one) is the placement
+# target of the controllers.
+#
+import heapq
+from collections import deque
+
+import numpy as np
+
+class Topology:
+
+    def __init__(self, accessPoints, hopLatency=1.0):
+        self.apIds = [str(ap['id']) for ap in accessPoints]
+        self.apRow = {ap_id: i for i, ap_id in enumerate(self.apIds)}
+
+        nodes = set(str(ap['kindNode']) for ap in accessPoints if ap.get('kindNode', None) is not None)
+        self.nodeIds = sorted(nodes, key=lambda node: (len(node), node))
+        self.nodeCol = {node: j for j, node in enumerate(self.nodeIds)}
+
+        n = len(self.apIds)
+        self.neighbours = [{} for _ in range(n)] # [{neighbour row: link latency}]
+        for ap in accessPoints:
+            if ap.get('linkTo', None) is None:
+                continue
+            a = self.apRow[str(ap['id'])]
+            linkLatency = float(ap.get('linkLatency', hopLatency))
+            for other in str(ap['linkTo']).split(','):
+                b = self.apRow.get(other.strip(), None)
+                if b is None or b == a:
+                    continue
+                latency = min(self.neighbours[a].get(b, np.inf), linkLatency)
+                self.neighbours[a][b] = self.neighbours[b][a] = latency
+
+        # AP -> node: distance to the closest AP the node is attached to
+        k = len(self.nodeIds)
+        self.apNodeHops = np.full((n, k), np.inf)
+        self.apNodeLatency = np.full((n, k), np.inf)
+        self.apsOfNode = {node: [] for node in self.nodeIds}
+        for ap in accessPoints:
+            if ap.get('kindNode', None) is None:
+                continue
+            self.apsOfNode[str(ap['kindNode'])].append(self.apRow[str(ap['id'])])
+        for node, rows in self.apsOfNode.items():
+            self.apNodeHops[:, self.nodeCol[node]] = self.__hopsFrom(rows)
+            self.apNodeLatency[:, self.nodeCol[node]] = self.__latencyFrom(rows)
+
+        # AP -> nearest node: its own, else the lowest path latency (None if no node is reachable)
+        self.apNearestNode = []
+        for a, ap in enumerate(accessPoints):
+            if ap.get('kindNode', None) is not None:
+                self.apNearestNode.append(str(ap['kindNode']))
+            elif k > 0 and not np.isinf(self.apNodeLatency[a].min()):
+                self.apNearestNode.append(self.nodeIds[int(np.argmin(self.apNodeLatency[a]))])
+            else:
+                self.apNearestNode.append(None)
+
+    def __hopsFrom(self, sources):
+        # Breadth-first search from every source at once: hops to the closest source
+        hops = [np.inf] * len(self.apIds)
+        for a in sources:
+            hops[a] = 0
+        queue = deque(sources)
+        while len(queue) > 0:
+            a = queue.popleft()
+            for b in self.neighbours[a]:
+                if hops[b] == np.inf:
+                    hops[b] = hops[a] + 1
+                    queue.append(b)
+        return hops
+
+    def __latencyFrom(self, sources):
+        # Dijkstra from every source at once: path latency to the closest source
+        latency = [np.inf] * len(self.apIds)
+        heap = []
+        for a in sources:
+            latency[a] = 0.0
+            heap.append((0.0, a))
+        heapq.heapify(heap)
+        while len(heap) > 0:
+            d, a = heapq.heappop(heap)
+            if d > latency[a]:
+                continue
+            for b, link in self.neighbours[a].items():
+                if d + link < latency[b]:
+                    latency[b] = d + link
+                    heapq.heappush(heap, (latency[b], b))
+        return latency
+
+    def hopsToNode(self, ap_id, node_id):
+        # Hops from the AP to the closest AP of the node, None if unknown or unreachable
+        a = self.apRow.get(str(ap_id), None)
+        j = self.nodeCol.get(str(node_id), None)
+        if a is None or j is None or np.isinf(self.apNodeHops[a, j]):
+            return None
+        return int(self.apNodeHops[a, j])
+
+    def latencyToNode(self, ap_id, node_id):
+        # Path latency from the AP to the closest AP of the node, None if unknown or unreachable
+        a = self.apRow.get(str(ap_id), None)
+        j = self.nodeCol.get(str(node_id), None)
+        if a is None or j is None or np.isinf(self.apNodeLatency[a, j]):
+            return None
+        return float(self.apNodeLatency[a, j])
+
+    def nearestNode(self, ap_id):
+        # Node with the lowest path latency from the AP (its own node when it has one)
+        a = self.apRow.get(str(ap_id), None)
+        return None if a is None else self.apNearestNode[a]
@@ -0,0 +1,159 @@
+#
+# Recording of every input the controllers consume during a live run, for deterministic re-runs
+# (see scenarios.Replay).
+#
+# The trace is one gzip'ed JSON Lines file, one compact event per line: [t, kind, ...], with t the
+# seconds since the recording started. Kinds:
+#   'h' header    {scenario, kindConfig, mininetConfig, numCars}
+#   'w' workers   clusterName, {worker_name: worker_ip}
+#   's' sample    car_id, x, y              (telemetry sample handed to onTelemetrySample)
+#   'a' assoc     car_id, ap_id or null     (answer of the association lookup)
+#   'k' k8s call  operation, name, result, ms
+#   'f' flow mods ms, [[cmd, dpid, priority, match, ok], ...]
+#   'c' controller start  decide function name or null, handover scheduler config or null
+#   't' tick      tick index                (controllerStep, before the snapshot)
+#   'r' react                               (reactStep between ticks, woken up by the handover scheduler)
+#   'd' decision  [[node_id, app_name, ap_id], ...]
+#   'p' pod ready nodeName, appName         (deployment cache event, migrations redirect on it)
+#
+import gzip
+import json
+import time
+import threading
+
+class TraceRecorder:
+
+    def __init__(self, path='trace.jsonl.gz', batchSize=256):
+        self.path = path
+        self.batchSize = batchSize
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.events = 0
+        self.start = time.monotonic()
+        self.file = gzip.open(path, 'wt')
+
+    def now(self):
+        return round(time.monotonic() - self.start, 4)
+
+    def record(self, kind, *values):
+        with self.lock:
+            if self.file is None:
+                return
+            self.buffer.append(json.dumps([self.now(), kind, *values], separators=(',', ':')))
+            self.events += 1
+            if len(self.buffer) >= self.batchSize:
+                self.__flush()
+
+    def header(self, scenario, kindConfig, mininetConfig, numCars):
+        self.record('h', {'scenario': scenario, 'kindConfig': kindConfig, 'mininetConfig': mininetConfig, 'numCars': numCars})
+
+    def workers(self, clusterName, workers):
+        self.record('w', clusterName, workers)
+
+    def sample(self, car_id, x, y):
+        self.record('s', car_id, x, y)
+
+    def association(self, car_id, ap_id):
+        self.record('a', car_id, ap_id)
+
+    def call(self, operation, name, result, seconds):
+        self.record('k', operation, name, result, round(1000 * seconds, 3))
+
+    def flowMods(self, flowMods, results, seconds):
+        mods = [[cmd, payload['dpid'], payload.get('priority', 0), payload.get('match', {}), ok] for ((cmd, payload), ok) in zip(flowMods, results)]
+        self.record('f', round(1000 * seconds, 3), mods)
+
+    def controllerStart(self, decide=None, scheduler=None):
+        self.record('c', None if decide is None else decide.__name__, scheduler)
+
+    def tick(self, i):
+        self.record('t', i)
+
+    def react(self):
+        self.record('r')
+
+    def podReady(self, nodeName, appName, podIP=None, t=None):
+        # Deployment cache listener
+        self.record('p', nodeName, appName)
+
+    def decision(self, decisions):
+        self.record('d', [list(decision) for decision in decisions])
+
+    def __flush(self):
+        if len(self.buffer) > 0:
+            self.file.write('\n'.join(self.buffer) + '\n')
+            self.buffer = []
+
+    def flush(self):
+        with self.lock:
+            self.__flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.__flush()
+                self.file.close()
+                self.file = None
+
+    def getMetrics(self):
+        with self.lock:
+            return {'path': self.path, 'events': self.events}
+
+    @staticmethod
+    def readEvents(path):
+        # Iterate the events of a trace, in recording order
+        with gzip.open(path, 'rt') as file:
+            for line in file:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+class RecordingKubernetesController:
+    # Forwards to a KubernetesController and records the result and latency of the mutating calls
+
+    def __init__(self, controller, recorder):
+        self.controller = controller
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self.controller, name)
+
+    def __call(self, operation, name, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        self.recorder.call(operation, name, result, time.perf_counter() - start)
+        return result
+
+    def createDeployment(self, deployment):
+        return self.__call('createDeployment', deployment.metadata.name, self.controller.createDeployment, deployment)
+
+    def deleteDeployment(self, deploymentName):
+        return self.__call('deleteDeployment', deploymentName, self.controller.deleteDeployment, deploymentName)
+
+    def createService(self, service):
+        return self.__call('createService', service.metadata.name, self.controller.createService, service)
+
+class RecordingSDNClient:
+    # Forwards to an SDNFlowClient and records the result of every flow mod
+
+    def __init__(self, client, recorder):
+        self.client = client
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def modFlows(self, flowMods):
+        start = time.perf_counter()
+        results = self.client.modFlows(flowMods)
+        self.recorder.flowMods(flowMods, results, time.perf_counter() - start)
+        return results
+
+    def modFlow(self, cmd, payload):
+        return self.modFlows([(cmd, payload)])[0]
+
+    def addFlow(self, payload):
+        return self.modFlow('add', payload)
+
+    def deleteFlow(self, payload):
+        return self.modFlow('delete', payload)
@@ -0,0 +1,118 @@
+#
+# Columnar per-tick vehicle state shared by the position tracker and the controllers.
+#
+# Each column is a NumPy array with one row per car (row = car_id - 1). The tracker writes
+# single rows under a short lock; the controllers take a copy of all columns (snapshot)
+# and run their decision logic on it without holding any lock.
+#
+import threading
+import numpy as np
+
+class VehicleSnapshot:
+
+    def __init__(self, carIds, position, direction, associatedAp, servingNode, version):
+        self.carIds = carIds # (N,) car ids
+        self.position = position # (N, 2) x, y; NaN until the first sample
+        self.direction = direction # (N, 2) dx, dy; NaN until the car has moved once
+        self.associatedAp = associatedAp # (N,) AP index in the Scenario's APIndex, -1 if unknown
+        self.servingNode = servingNode # (N,) worker id serving the car, -1 if unknown
+        self.version = version
+
+    def __len__(self):
+        return len(self.carIds)
+
+    @property
+    def hasPosition(self):
+        return ~np.isnan(self.position).any(axis=1)
+
+    @property
+    def hasDirection(self):
+        return ~np.isnan(self.direction).any(axis=1)
+
+    @property
+    def hasAp(self):
+        return self.associatedAp >= 0
+
+    def toDict(self, apIds):
+        # Same layout as the old vehicleData dictionary: { car_id: { position, direction, associated_ap, ... } }
+        data = {}
+        hasPosition = self.hasPosition
+        hasDirection = self.hasDirection
+        for row, car_id in enumerate(self.carIds.tolist()):
+            car = {}
+            if hasPosition[row]:
+                car['position'] = tuple(self.position[row].tolist())
+            if hasDirection[row]:
+                car['direction'] = tuple(self.direction[row].tolist())
+            if self.associatedAp[row] >= 0:
+                car['associated_ap'] = apIds[self.associatedAp[row]]
+            if self.servingNode[row] >= 0:
+                car['using_node'] = str(self.servingNode[row])
+            data[car_id] = car
+        return data
+
+class VehicleStore:
+
+    def __init__(self, numCars):
+        self.lock = threading.Lock()
+        self.version = 0
+
+        self.carIds = np.arange(1, numCars + 1)
+        self.position = np.full((numCars, 2), np.nan)
+        self.direction = np.full((numCars, 2), np.nan)
+        self.associatedAp = np.full(numCars, -1, dtype=np.int64)
+        self.servingNode = np.full(numCars, -1, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.carIds)
+
+    def updatePosition(self, car_id, x, y):
+        # Store the new position of a car and derive its direction from the previous one.
+        # Returns True if the car moved (or this is its first sample).
+        row = car_id - 1
+        with self.lock:
+            px, py = self.position[row]
+            if px == x and py == y:
+                return False
+            if not np.isnan(px):
+                self.direction[row] = (x - px, y - py)
+            self.position[row] = (x, y)
+            self.version += 1
+            return True
+
+    def setAssociatedAp(self, car_id, apIndex):
+        with self.lock:
+            self.associatedAp[car_id - 1] = -1 if apIndex is None else apIndex
+            self.version += 1
+
+    def setServingNode(self, car_id, nodeId):
+        with self.lock:
+            self.servingNode[car_id - 1] = -1 if nodeId is None else int(nodeId)
+            self.version += 1
+
+    def get(self, car_id):
+        # Copy of a single car's row: (position, direction, associatedAp, servingNode)
+        row = car_id - 1
+        with self.lock:
+            return (tuple(self.position[row].tolist()), tuple(self.direction[row].tolist()),
+                    int(self.associatedAp[row]), int(self.servingNode[row]))
+
+    def snapshot(self):
+        with self.lock:
+            return VehicleSnapshot(self.carIds,
+                                   self.position.copy(),
+                                   self.direction.copy(),
+                                   self.associatedAp.copy(),
+                                   self.servingNode.copy(),
+                                   self.version)
+
+def groupInOrder(keys):
+    # Group the rows of an int array by value, in order of first appearance.
+    # Returns [(key, rows)], rows being the (ascending) row numbers holding that key.
+    keys = np.asarray(keys)
+    if len(keys) == 0:
+        return []
+    uniqueKeys, firstRows, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(inverse, kind='stable')
+    splits = np.split(order, np.cumsum(np.bincount(inverse))[:-1])
+    return [(int(uniqueKeys[k]), splits[k]) for k in np.argsort(firstRows, kind='stable')]
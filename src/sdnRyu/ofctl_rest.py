@@ -155,6 +155,12 @@ supported_ofctl = {
 # delete all flow entries of the switch
 # DELETE /stats/flowentry/clear/<dpid>
 #
+# apply a list of flow entry commands, possibly for many switches, in one request
+# POST /stats/flowentry/batch
+# Note: the body is a JSON list of flow entries, each with its own "dpid" and a
+#       "cmd" key (add, modify, modify_strict, delete or delete_strict; default add).
+#       The reply is a JSON list with the HTTP status of each entry.
+#
 # add a meter entry
 # POST /stats/meterentry/add
 #
@@ -435,6 +441,62 @@ class StatsController(ControllerBase):
 
         ofctl.mod_flow_entry(dp, flow, mod_cmd)
 
+    def mod_flow_entries(self, req, **kwargs):
+        try:
+            flows = json.loads(req.body.decode('utf-8')) if req.body else []
+        except ValueError:
+            LOG.exception('Invalid syntax: %s', req.body)
+            return Response(status=400)
+        if not isinstance(flows, list):
+            LOG.error('Batch body must be a list of flow entries')
+            return Response(status=400)
+
+        results = []
+        for flow in flows:
+            results.append(self._mod_flow_entry_in_batch(dict(flow)))
+
+        return Response(content_type='application/json',
+                        body=json.dumps(results))
+
+    def _mod_flow_entry_in_batch(self, flow):
+        cmd = flow.pop('cmd', 'add')
+        try:
+            dp = self.dpset.get(int(str(flow.get('dpid')), 0))
+        except ValueError:
+            LOG.exception('Invalid dpid: %s', flow.get('dpid'))
+            return 400
+        if dp is None:
+            LOG.error('No such Datapath: %s', flow.get('dpid'))
+            return 404
+
+        ofctl = supported_ofctl.get(dp.ofproto.OFP_VERSION)
+        if ofctl is None:
+            LOG.error('Unsupported OF version: %s', dp.ofproto.OFP_VERSION)
+            return 501
+
+        cmd_convert = {
+            'add': dp.ofproto.OFPFC_ADD,
+            'modify': dp.ofproto.OFPFC_MODIFY,
+            'modify_strict': dp.ofproto.OFPFC_MODIFY_STRICT,
+            'delete': dp.ofproto.OFPFC_DELETE,
+            'delete_strict': dp.ofproto.OFPFC_DELETE_STRICT,
+        }
+        mod_cmd = cmd_convert.get(cmd, None)
+        if mod_cmd is None:
+            LOG.error('No such command : %s', cmd)
+            return 404
+
+        try:
+            ofctl.mod_flow_entry(dp, flow, mod_cmd)
+        except ValueError:
+            LOG.exception('Invalid syntax: %s', flow)
+            return 400
+        except AttributeError:
+            LOG.exception('Unsupported OF request in this version: %s',
+                          dp.ofproto.OFP_VERSION)
+            return 501
+        return 200
+
     @command_method
     def delete_flow_entry(self, req, dp, ofctl, flow, **kwargs):
         if ofproto_v1_0.OFP_VERSION == dp.ofproto.OFP_VERSION:
@@ -683,6 +745,12 @@ class RestStatsApi(app_manager.RyuApp):
                        controller=StatsController, action='get_role',
                        conditions=dict(method=['GET']))
 
+        # Must be connected before '/flowentry/{cmd}', which would match it
+        uri = path + '/flowentry/batch'
+        mapper.connect('stats', uri,
+                       controller=StatsController, action='mod_flow_entries',
+                       conditions=dict(method=['POST']))
+
         uri = path + '/flowentry/{cmd}'
         mapper.connect('stats', uri,
                        controller=StatsController, action='mod_flow_entry',
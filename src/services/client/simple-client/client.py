@@ -27,6 +27,7 @@ def main(SERVER_IP):
         try:
             start_time = time.perf_counter()
             response = requests.get("http://" + SERVER_IP + ":30001/getPodIP")
+            served_time = time.time() # Epoch seconds, matched with the migration spans (scenarios.MigrationTracer)
 
             time.sleep(SLEEP_TIME)
 
@@ -40,7 +41,7 @@ def main(SERVER_IP):
             continue
         
         with open("client.log", "a") as f:
-            f.write(f'{response.text}\n')
+            f.write(f'{served_time:.3f} {response.text}\n')
         print(response.text)
 
 if __name__ == '__main__':